@@ -1,10 +1,24 @@
+import time
+STARTED = time.perf_counter()  # origin for --startup-bench
 import customtkinter as ctk
 import tkinter as tk
 from tkinter import messagebox
 import sqlite3
-from datetime import datetime, timedelta
+import threading
+import os
+import sys
+import argparse
+import json
+import logging
+import functools
+from collections import deque, OrderedDict
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 import re
 import math
+import bisect
+import heapq
 
 # --- Configuration & Assets ---
 ctk.set_appearance_mode("Dark")
@@ -27,13 +41,239 @@ FINE_THRESHOLD_MINUTES = 45
 FINE_AMOUNT = 500.0
 PRICING = {"Student": 20.0, "Faculty": 0.0, "Guest": 50.0, "Bike": 10.0}
 
+# "Book best slot": each block costs distance_weight x gate distance of its nearest free slot (from the layout)
+# + the role's penalty for that block + spread_weight x how full the block is (0-1).
+ALLOCATION = {"distance_weight": 1.0, "spread_weight": 10.0,
+              "block_penalty": {"Faculty": {"B": 5}, "Student": {"A": 5}}}
+
+# Seeded into an empty database when no layout file is configured (see Layout)
+DEFAULT_LAYOUT = {"blocks": [{"block": "A", "type": "Car", "slots": 15}, {"block": "B", "type": "Car", "slots": 15},
+                             {"block": "C", "type": "Bike", "slots": 25}, {"block": "D", "type": "Bike", "slots": 25}]}
+
+# --- Instrumentation ---
+class Metrics:
+    # Statement/view timings, row and widget counters and a slow-operation log. Disabled by default
+    # (BU_PARKING_METRICS=1 or --metrics); when off, connections are plain sqlite3 ones and views skip straight through.
+    enabled = os.environ.get("BU_PARKING_METRICS") == "1"
+    slow_ms = float(os.environ.get("BU_PARKING_SLOW_MS", 100))
+    export_path = os.environ.get("BU_PARKING_METRICS_FILE")
+    lock = threading.Lock()
+    timings = {}            # (kind, name) -> [count, total_ms, max_ms]
+    counters = {}           # name -> value
+    slow = deque(maxlen=200)  # (time, kind, name, ms)
+    log = logging.getLogger("bu_parking")
+    widgets_built = None    # Tk widgets constructed so far; None until the first timed view hooks construction
+
+    @staticmethod
+    def observe(kind, name, ms):
+        with Metrics.lock:
+            t = Metrics.timings.setdefault((kind, name), [0, 0.0, 0.0])
+            t[0] += 1
+            t[1] += ms
+            t[2] = max(t[2], ms)
+            if ms >= Metrics.slow_ms: Metrics.slow.append((time.time(), kind, name, ms))
+        if ms >= Metrics.slow_ms: Metrics.log.warning("slow %s %.1f ms: %s", kind, ms, name)
+
+    @staticmethod
+    def count(name, n=1):
+        with Metrics.lock: Metrics.counters[name] = Metrics.counters.get(name, 0) + n
+
+    @staticmethod
+    def prometheus():
+        esc = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+        out = ["# HELP bu_parking_op_seconds Time spent in SQL statements and view builds.", "# TYPE bu_parking_op_seconds summary"]
+        with Metrics.lock:
+            timings, counters = dict(Metrics.timings), dict(Metrics.counters)
+        for (kind, name), (n, total, _) in sorted(timings.items()):
+            out.append(f'bu_parking_op_seconds_count{{kind="{kind}",name="{esc(name)}"}} {n}')
+            out.append(f'bu_parking_op_seconds_sum{{kind="{kind}",name="{esc(name)}"}} {total / 1000:.6f}')
+        out.append("# TYPE bu_parking_op_max_seconds gauge")
+        for (kind, name), (_, _, mx) in sorted(timings.items()):
+            out.append(f'bu_parking_op_max_seconds{{kind="{kind}",name="{esc(name)}"}} {mx / 1000:.6f}')
+        for name, v in sorted(counters.items()):
+            out += [f"# TYPE bu_parking_{name} counter", f"bu_parking_{name} {v}"]
+        return "\n".join(out) + "\n"
+
+    @staticmethod
+    def export(path=None):
+        path = path or Metrics.export_path
+        with open(path + ".tmp", "w") as f: f.write(Metrics.prometheus())
+        os.replace(path + ".tmp", path)
+        return path
+
+    @staticmethod
+    def count_widgets():
+        # Counts Tk widgets as they are constructed (every CTk widget is built from tk ones), so views never walk the tree.
+        if Metrics.widgets_built is not None: return
+        Metrics.widgets_built = 0
+        init = tk.BaseWidget.__init__
+        def counted(self, *args, **kw):
+            Metrics.widgets_built += 1  # Tk thread only
+            return init(self, *args, **kw)
+        tk.BaseWidget.__init__ = counted
+
+class InstrumentedCursor(sqlite3.Cursor):
+    def fetchall(self):
+        rows = super().fetchall()
+        Metrics.count("db_rows_fetched_total", len(rows))
+        return rows
+
+    def fetchmany(self, *args):
+        rows = super().fetchmany(*args)
+        Metrics.count("db_rows_fetched_total", len(rows))
+        return rows
+
+    def fetchone(self):
+        row = super().fetchone()
+        if row is not None: Metrics.count("db_rows_fetched_total")
+        return row
+
+    def __next__(self):
+        row = super().__next__()
+        Metrics.count("db_rows_fetched_total")
+        return row
+
+class InstrumentedConnection(sqlite3.Connection):
+    # Used as the connection factory only while Metrics.enabled; times every statement run through Database.
+    def _timed(self, method, sql, *args):
+        t = time.perf_counter()
+        try: return getattr(self.cursor(InstrumentedCursor), method)(sql, *args)
+        finally: Metrics.observe("sql", " ".join(sql.split())[:80], (time.perf_counter() - t) * 1000)
+
+    def execute(self, sql, *args):
+        return self._timed("execute", sql, *args)
+
+    def executemany(self, sql, *args):
+        return self._timed("executemany", sql, *args)
+
+def timed_view(fn):
+    # Times a Dashboard view build and counts the widgets that call created (rows added by an incremental render,
+    # not the ones already on screen).
+    @functools.wraps(fn)
+    def wrapper(self, *args, **kw):
+        if not Metrics.enabled: return fn(self, *args, **kw)
+        Metrics.count_widgets()
+        t, built = time.perf_counter(), Metrics.widgets_built
+        result = fn(self, *args, **kw)
+        Metrics.observe("view", fn.__name__, (time.perf_counter() - t) * 1000)
+        Metrics.count("widgets_created_total", Metrics.widgets_built - built)
+        return result
+    return wrapper
+
 # --- Database Manager ---
 class Database:
     DB_NAME = "bennett_smart_parking.db"
+    # Applied once per connection. WAL lets kiosks read while another one writes.
+    PRAGMAS = {"journal_mode": "WAL", "synchronous": "NORMAL", "busy_timeout": 5000,
+               "cache_size": -16000, "temp_store": "MEMORY"}
+    STATEMENT_CACHE = 128
+    _local = threading.local()
+    _writer = (None, None)  # (pid, token) naming this process in commit_counts
+
+    # Migration 2: integer epoch start/end from the text start_time (local time) and duration in hours.
+    EPOCH_BACKFILL = """UPDATE reservations SET start_ts=CAST(strftime('%s', start_time, 'utc') AS INTEGER),
+                                     end_ts=CAST(strftime('%s', start_time, 'utc') AS INTEGER) + CAST(round(duration * 3600) AS INTEGER)"""
+
+    # Ordered schema migrations: (version, statements). Each runs once, at startup, and is recorded in schema_version.
+    MIGRATIONS = [
+        (1, [# Active sessions: slot grid join, patrol list, slot -> reservation lookups
+             "CREATE INDEX IF NOT EXISTS idx_res_active_slot ON reservations(slot_id, user_id) WHERE status='active'",
+             # Gate control queue
+             "CREATE INDEX IF NOT EXISTS idx_res_cash_pending ON reservations(user_id) WHERE payment_status='Cash_Pending'",
+             # My Bookings (user_id=? ORDER BY start_time DESC)
+             "CREATE INDEX IF NOT EXISTS idx_res_user_start ON reservations(user_id, start_time)"]),
+        (2, [# Integer epoch start/end so ordering and overdue checks happen in SQL; start_time stays for display.
+             "ALTER TABLE reservations ADD COLUMN start_ts INTEGER",
+             "ALTER TABLE reservations ADD COLUMN end_ts INTEGER",
+             EPOCH_BACKFILL,
+             "DROP INDEX IF EXISTS idx_res_user_start",
+             "CREATE INDEX IF NOT EXISTS idx_res_user_start_ts ON reservations(user_id, start_ts)",
+             "CREATE INDEX IF NOT EXISTS idx_res_active_end ON reservations(end_ts) WHERE status='active'"]),
+        (3, [# Cold storage for finished reservations (same ids) and per-day/block/role rollups; see Archiver.
+             """CREATE TABLE IF NOT EXISTS reservations_archive (
+                id INTEGER PRIMARY KEY, user_id INTEGER, slot_id INTEGER,
+                vehicle_number TEXT, start_time TIMESTAMP, duration REAL,
+                fare REAL, fine_amount REAL DEFAULT 0,
+                payment_method TEXT, payment_status TEXT, status TEXT,
+                start_ts INTEGER, end_ts INTEGER)""",
+             "CREATE INDEX IF NOT EXISTS idx_arch_user_start_ts ON reservations_archive(user_id, start_ts)",
+             """CREATE TABLE IF NOT EXISTS daily_rollups (
+                day TEXT, block TEXT, role TEXT, bookings INTEGER DEFAULT 0, revenue REAL DEFAULT 0,
+                fines REAL DEFAULT 0, total_hours REAL DEFAULT 0,
+                PRIMARY KEY (day, block, role))""",
+             "CREATE INDEX IF NOT EXISTS idx_res_completed ON reservations(end_ts) WHERE status='completed'"]),
+        (4, [# Time-range scans for Analytics
+             "CREATE INDEX IF NOT EXISTS idx_res_start_ts ON reservations(start_ts)",
+             "CREATE INDEX IF NOT EXISTS idx_arch_start_ts ON reservations_archive(start_ts)"]),
+        (5, [# Normalised plate (see GateIngest.normalize) and camera-observed entry/exit times; raw ANPR/barrier event log.
+             "ALTER TABLE reservations ADD COLUMN plate TEXT",
+             "ALTER TABLE reservations ADD COLUMN entry_ts INTEGER",
+             "ALTER TABLE reservations ADD COLUMN exit_ts INTEGER",
+             "ALTER TABLE reservations_archive ADD COLUMN plate TEXT",
+             "ALTER TABLE reservations_archive ADD COLUMN entry_ts INTEGER",
+             "ALTER TABLE reservations_archive ADD COLUMN exit_ts INTEGER",
+             "UPDATE reservations SET plate=normalize_plate(vehicle_number)",
+             "UPDATE reservations_archive SET plate=normalize_plate(vehicle_number)",
+             "CREATE INDEX IF NOT EXISTS idx_res_active_plate ON reservations(plate) WHERE status='active'",
+             """CREATE TABLE IF NOT EXISTS gate_events (
+                id INTEGER PRIMARY KEY, ts INTEGER, gate TEXT, kind TEXT, plate TEXT, reservation_id INTEGER)"""]),
+        (6, [# Layout-driven slots (see Layout): floor, distance from the gate, and retirement without deleting history.
+             "ALTER TABLE parking_slots ADD COLUMN floor INTEGER DEFAULT 0",
+             "ALTER TABLE parking_slots ADD COLUMN gate_distance REAL",
+             "ALTER TABLE parking_slots ADD COLUMN active INTEGER DEFAULT 1",
+             "UPDATE parking_slots SET gate_distance=slot_number"]),
+        (7, []),  # Salted password hashes (see Accounts) for the plaintext rows: all done by PREPARE[7]
+        (8, [# Analytics selects bookings overlapping its range by end_ts, which replaces migration 4's start_ts indexes.
+             "DROP INDEX IF EXISTS idx_res_start_ts",
+             "DROP INDEX IF EXISTS idx_arch_start_ts",
+             "CREATE INDEX IF NOT EXISTS idx_res_end_ts ON reservations(end_ts)",
+             "CREATE INDEX IF NOT EXISTS idx_arch_end_ts ON reservations_archive(end_ts)"]),
+    ]
+    # Work a migration needs done before its locked step, without holding the write lock (hashing every password takes
+    # minutes). Runs on each kiosk that finds the step unapplied, so it must be safe to repeat and to run concurrently.
+    PREPARE = {7: lambda: Accounts.hash_plaintext()}
 
     @staticmethod
     def get_connection():
-        return sqlite3.connect(Database.DB_NAME)
+        # One long-lived connection per (process, thread, db file); reused by every screen.
+        pool = getattr(Database._local, "pool", None)
+        if pool is None or pool[0] != os.getpid():
+            pool = Database._local.pool = (os.getpid(), {})
+        conn = pool[1].get(Database.DB_NAME)
+        if conn is None:
+            conn = sqlite3.connect(Database.DB_NAME, timeout=Database.PRAGMAS["busy_timeout"] / 1000, cached_statements=Database.STATEMENT_CACHE,
+                                   factory=InstrumentedConnection if Metrics.enabled else sqlite3.Connection)
+            for k, v in Database.PRAGMAS.items(): conn.execute(f"PRAGMA {k}={v}")
+            conn.create_function("normalize_plate", 1, GateIngest.normalize, deterministic=True)
+            pool[1][Database.DB_NAME] = conn
+        return conn
+
+    @staticmethod
+    def close():
+        pool = getattr(Database._local, "pool", None)
+        if pool and pool[0] == os.getpid():
+            for conn in pool[1].values(): conn.close()
+            pool[1].clear()
+
+    @staticmethod
+    @contextmanager
+    def transaction():
+        # BEGIN IMMEDIATE takes the write lock up front, so check-then-write sequences can't interleave across kiosks.
+        conn = Database.get_connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            # Tagged with the writing process so ChangeWatcher can tell other kiosks' commits from this one's.
+            conn.execute("INSERT INTO commit_counts VALUES (?, 1) ON CONFLICT(writer) DO UPDATE SET commits=commits+1", (Database.writer(),))
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+    @staticmethod
+    def writer():
+        if Database._writer[0] != os.getpid(): Database._writer = (os.getpid(), f"{os.getpid()}-{os.urandom(4).hex()}")
+        return Database._writer[1]
 
     @staticmethod
     def initialize():
@@ -62,23 +302,2043 @@ class Database:
                 FOREIGN KEY (user_id) REFERENCES users (id),
                 FOREIGN KEY (slot_id) REFERENCES parking_slots (id))""")
 
-            # Initialize Slots (30 Cars, 50 Bikes)
-            cursor.execute("SELECT count(*) FROM parking_slots")
-            if cursor.fetchone()[0] == 0:
-                # Cars: A (1-15), B (1-15)
-                for i in range(1, 16): cursor.execute("INSERT INTO parking_slots (block, slot_number, type) VALUES (?, ?, 'Car')", ('A', i))
-                for i in range(1, 16): cursor.execute("INSERT INTO parking_slots (block, slot_number, type) VALUES (?, ?, 'Car')", ('B', i))
-                # Bikes: C (1-25), D (1-25)
-                for i in range(1, 26): cursor.execute("INSERT INTO parking_slots (block, slot_number, type) VALUES (?, ?, 'Bike')", ('C', i))
-                for i in range(1, 26): cursor.execute("INSERT INTO parking_slots (block, slot_number, type) VALUES (?, ?, 'Bike')", ('D', i))
+            # Transactions per writing process (see Database.transaction / ChangeWatcher)
+            cursor.execute("CREATE TABLE IF NOT EXISTS commit_counts (writer TEXT PRIMARY KEY, commits INTEGER)")
             conn.commit()
+        Database.migrate()
+        # Slots come from the layout: the configured file on every start (idempotent), else the default campus once.
+        if Layout.path: Layout.apply(Layout.load(Layout.path))
+        elif not Database.get_connection().execute("SELECT 1 FROM parking_slots LIMIT 1").fetchone(): Layout.apply(DEFAULT_LAYOUT)
+
+    @staticmethod
+    def migrate():
+        conn = Database.get_connection()
+        conn.execute("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER PRIMARY KEY, applied_at TIMESTAMP)")
+        for version, steps in Database.MIGRATIONS:
+            if version in Database.PREPARE and not conn.execute("SELECT 1 FROM schema_version WHERE version=?", (version,)).fetchone():
+                Database.PREPARE[version]()
+            # Re-checked under the write lock so kiosks starting together apply each step once.
+            with Database.transaction() as conn:
+                if conn.execute("SELECT 1 FROM schema_version WHERE version=?", (version,)).fetchone(): continue
+                for sql in steps: sql(conn) if callable(sql) else conn.execute(sql)
+                conn.execute("INSERT INTO schema_version VALUES (?, datetime('now', 'localtime'))", (version,))
+
+    @staticmethod
+    def epoch_bench(n=1_000_000, db=None, runs=5):
+        # n reservations over three years on 10 000 slots (one active booking per slot), 2000 users. Before: the
+        # pre-epoch patrol and history queries on text start_time (idx_res_user_start recreated, strptime per row);
+        # after: the same lists on start_ts/end_ts, the first pages the views now load, and the overdue check in SQL.
+        import tempfile, datetime, statistics
+        Database.DB_NAME = db or os.path.join(tempfile.mkdtemp(prefix="bu_epoch_"), Database.DB_NAME)
+        Layout.path = None
+        Database.initialize()
+        AllocBench.seed(AllocBench.SLOTS)
+        conn = Database.get_connection()
+        sids = [r for r, in conn.execute("SELECT id FROM parking_slots WHERE active=1")]
+        users, now, span = 2000, int(time.time()), 3 * 365 * 86400
+        t = time.perf_counter()
+        with Database.transaction() as conn:
+            conn.executemany("INSERT INTO users (username, full_name, phone, role) VALUES (?, 'Bench', '0', 'Student')",
+                             ((f"epoch{u}",) for u in range(users)))
+            conn.executemany("""INSERT INTO reservations (user_id, slot_id, vehicle_number, start_time, duration, fare, status)
+                                VALUES (?, ?, 'X', datetime(?, 'unixepoch', 'localtime'), 2, 40, ?)""",
+                             ((i % users + 1, sids[i % len(sids)], s, st) for i in range(n)
+                              for st in ["active" if i >= n - len(sids) else "completed"]
+                              for s in [now - 3600 * (i % 4) if st == "active" else now - span + i * (span // n)]))
+        result = {"config": {"rows": n, "active": len(sids), "rows_per_user": n // users, "db": Database.DB_NAME},
+                  "seed_s": round(time.perf_counter() - t, 1)}
+        # Migration 2's backfill, rerun over the seeded rows.
+        t = time.perf_counter()
+        with Database.transaction() as conn: conn.execute(Database.EPOCH_BACKFILL)
+        result["backfill_s"] = round(time.perf_counter() - t, 1)
+        conn.execute("ANALYZE")
+
+        def timed(fn, *args, **kw):
+            samples = []
+            for _ in range(runs):
+                t = time.perf_counter()
+                count = fn(*args, **kw)
+                samples.append((time.perf_counter() - t) * 1000)
+            return {"ms": round(statistics.median(samples), 2), "rows": count}
+
+        fmt = "%Y-%m-%d %H:%M:%S"
+        def old_patrol():
+            rows = conn.execute("""SELECT r.vehicle_number, ps.block, ps.slot_number, u.full_name, u.phone, r.start_time, r.duration
+                                   FROM reservations r JOIN users u ON r.user_id=u.id JOIN parking_slots ps ON r.slot_id=ps.id
+                                   WHERE r.status='active'""").fetchall()
+            now_dt = datetime.datetime.now()
+            late = [r for r in rows if datetime.datetime.strptime(r[5], fmt) + datetime.timedelta(hours=r[6]) < now_dt]
+            return len(rows)
+        def old_history(uid):
+            rows = conn.execute("""SELECT r.id, r.vehicle_number, ps.block, ps.slot_number, r.start_time, r.duration, r.fare, r.status, r.payment_status
+                                   FROM reservations r JOIN parking_slots ps ON r.slot_id = ps.id WHERE r.user_id=? ORDER BY r.start_time DESC""",
+                                (uid,)).fetchall()
+            now_dt = datetime.datetime.now()
+            late = [r for r in rows if r[7] == "active" and datetime.datetime.strptime(r[4], fmt) + datetime.timedelta(hours=r[5]) < now_dt]
+            return len(rows)
+        def patrol():
+            return len(conn.execute("""SELECT r.id, r.vehicle_number, ps.block, ps.slot_number, u.full_name, u.phone, r.end_ts
+                                       FROM reservations r JOIN users u ON r.user_id=u.id JOIN parking_slots ps ON r.slot_id=ps.id
+                                       WHERE r.status='active' ORDER BY r.end_ts, r.id""").fetchall())
+        def history(uid):
+            return len(conn.execute("""SELECT r.id, r.vehicle_number, ps.block, ps.slot_number, r.end_ts, r.fare, r.status, r.payment_status,
+                                              r.status='active' AND r.end_ts + ? < CAST(strftime('%s', 'now') AS INTEGER)
+                                       FROM reservations r JOIN parking_slots ps ON r.slot_id = ps.id WHERE r.user_id=? ORDER BY r.start_ts DESC, r.id DESC""",
+                                    (FINE_THRESHOLD_MINUTES * 60, uid)).fetchall())
+        def overdue():
+            return conn.execute("SELECT count(*) FROM reservations WHERE status='active' AND end_ts < ?", (int(time.time()),)).fetchone()[0]
+        def page(*args, **kw):
+            return len(KeysetPager(*args, **kw).next_page())
+
+        uid = users // 2
+        conn.execute("CREATE INDEX idx_res_user_start ON reservations(user_id, start_time)")
+        try: result["before"] = {"patrol": timed(old_patrol), "history": timed(old_history, uid)}
+        finally: conn.execute("DROP INDEX idx_res_user_start")
+        result["after"] = {
+            "patrol": timed(patrol), "history": timed(history, uid), "overdue_count": timed(overdue),
+            "patrol_page": timed(page, "r.id, r.vehicle_number, ps.block, ps.slot_number, u.full_name, u.phone",
+                                 "FROM reservations r JOIN users u ON r.user_id=u.id JOIN parking_slots ps ON r.slot_id=ps.id",
+                                 "r.status='active'", key="r.end_ts", desc=False),
+            "history_page": timed(page, "r.id, r.vehicle_number, ps.block, ps.slot_number, r.end_ts, r.fare, r.status, r.payment_status",
+                                  "FROM {table} r JOIN parking_slots ps ON r.slot_id = ps.id", "r.user_id=?", (uid,),
+                                  tables=("reservations", "reservations_archive"))}
+        Database.close()
+        return result
+
+    @staticmethod
+    def bench(n=2_000):
+        # Book + checkout round trips, first the way the connection layer used to work (a new connection per call,
+        # rollback journal, default pragmas), then through the pooled WAL connections; each on its own scratch database.
+        import tempfile
+        tmp = tempfile.mkdtemp(prefix="bu_conn_")
+        pooled = Database.__dict__["get_connection"]
+        result = {"config": {"ops": n, "dir": tmp}}
+        for mode in ("before", "after"):
+            Database.DB_NAME = os.path.join(tmp, f"{mode}.db")
+            Database.initialize()
+            uid = Accounts.register("conn_bench", "pw", "Conn Bench", "conn@example.com", "0", "Student", Accounts.BENCH_ITERATIONS)
+            OCCUPANCY.load()
+            sids = sorted(OCCUPANCY.slots)
+            if mode == "before":
+                Database.get_connection().execute("PRAGMA journal_mode=DELETE")
+                Database.close()
+                Database.get_connection = staticmethod(lambda: sqlite3.connect(Database.DB_NAME))
+            book, checkout = [], []
+            try:
+                for i in range(n):
+                    t = time.perf_counter()
+                    rid = ParkingEngine.book(uid, sids[i % len(sids)], "HR26DK0001", 1, 20.0)
+                    book.append(time.perf_counter() - t)
+                    t = time.perf_counter()
+                    ParkingEngine.pay_upi(rid, 20.0, 0)
+                    checkout.append(time.perf_counter() - t)
+            finally: Database.get_connection = pooled
+            Database.close()
+            result[mode] = {"book_ops_s": round(n / sum(book), 1), "checkout_ops_s": round(n / sum(checkout), 1),
+                            "book_p50_ms": round(sorted(book)[n // 2] * 1000, 3), "checkout_p50_ms": round(sorted(checkout)[n // 2] * 1000, 3)}
+        result["speedup"] = {k: round(result["after"][k] / result["before"][k], 1) for k in ("book_ops_s", "checkout_ops_s")}
+        return result
+
+# --- Campus Layout ---
+class Layout:
+    # A layout file is JSON: {"blocks": [{"block": "A", "type": "Car", "slots": 15, "floor": 0, "gate_distance": 0, "spacing": 1}, ...]}.
+    # Slot n of a block sits gate_distance + n * spacing from the gate. apply() diffs it against parking_slots in one
+    # transaction: new slots are added, changed ones updated, missing ones retired (active=0). Occupied slots are left
+    # alone and reported as deferred, so a later apply picks them up once the vehicle has left.
+    TYPES = ("Car", "Bike")
+    path = os.environ.get("BU_PARKING_LAYOUT")
+
+    @staticmethod
+    def load(path):
+        with open(path) as f: return json.load(f)
+
+    @staticmethod
+    def expand(spec):
+        # {(block, slot_number): (type, floor, gate_distance)}; raises ValueError on a malformed layout.
+        slots, seen = {}, set()
+        for b in spec["blocks"]:
+            try: block, v_type, count = str(b["block"]), b["type"], int(b["slots"])
+            except (KeyError, TypeError): raise ValueError(f"layout entry {b!r} needs block, type and slots")
+            if v_type not in Layout.TYPES: raise ValueError(f"block {block}: type must be one of {Layout.TYPES}")
+            if count < 0 or not block: raise ValueError(f"block {block!r}: needs a name and slots >= 0")
+            if block in seen: raise ValueError(f"block {block} listed twice")
+            seen.add(block)
+            floor, base, step = int(b.get("floor", 0)), float(b.get("gate_distance", 0)), float(b.get("spacing", 1))
+            for n in range(1, count + 1): slots[(block, n)] = (v_type, floor, base + n * step)
+        return slots
+
+    @staticmethod
+    def apply(spec):
+        want = Layout.expand(spec)
+        with Database.transaction() as conn:
+            have = {(b, n): (sid, t, fl, d, act, st) for sid, b, n, t, fl, d, act, st in
+                    conn.execute("SELECT id, block, slot_number, type, floor, gate_distance, active, status FROM parking_slots")}
+            add = [(b, n) + v for (b, n), v in want.items() if (b, n) not in have]
+            update, retire, deferred = [], [], 0
+            for key, (sid, t, fl, d, act, st) in have.items():
+                if key in want:
+                    if (t, fl, d, act) == want[key] + (1,): continue
+                    if st == "occupied" and t != want[key][0]: deferred += 1
+                    else: update.append(want[key] + (sid,))
+                elif act:
+                    if st == "occupied": deferred += 1
+                    else: retire.append((sid,))
+            conn.executemany("INSERT INTO parking_slots (block, slot_number, type, floor, gate_distance) VALUES (?, ?, ?, ?, ?)", add)
+            conn.executemany("UPDATE parking_slots SET type=?, floor=?, gate_distance=?, active=1 WHERE id=?", update)
+            conn.executemany("UPDATE parking_slots SET active=0 WHERE id=?", retire)
+        return {"added": len(add), "updated": len(update), "retired": len(retire), "deferred": deferred, "slots": len(want)}
+
+    @staticmethod
+    def campus(buildings=20, floors=5, per_floor=500):
+        # Synthetic multi-building campus for --layout-bench: B01-F1 ... with cars on lower floors, bikes on the top one.
+        return {"blocks": [{"block": f"B{b:02d}-F{f}", "type": "Bike" if f == floors else "Car", "slots": per_floor,
+                            "floor": f, "gate_distance": 40 * b + 15 * f, "spacing": 2.5}
+                           for b in range(1, buildings + 1) for f in range(1, floors + 1)]}
+
+    @staticmethod
+    def bench(db=None, budget=1.0):
+        # Seeds a 50 000-slot campus into a fresh database, then re-applies it; fails (exit 1) if the seed is over budget
+        # or the re-apply is not a no-op.
+        import tempfile
+        Database.DB_NAME = db or os.path.join(tempfile.mkdtemp(prefix="bu_layout_"), Database.DB_NAME)
+        Layout.path = None
+        Database.initialize()
+        spec = Layout.campus()
+        t = time.perf_counter()
+        seed = Layout.apply(spec)
+        seed_s = time.perf_counter() - t
+        t = time.perf_counter()
+        again = Layout.apply(spec)
+        again_s = time.perf_counter() - t
+        spec["blocks"][0]["slots"] -= 100
+        spec["blocks"][1]["type"] = "Bike"
+        t = time.perf_counter()
+        edit = Layout.apply(spec)
+        edit_s = time.perf_counter() - t
+        t = time.perf_counter()
+        OCCUPANCY.load()
+        load_s = time.perf_counter() - t
+        result = {"seed": dict(seed, seconds=round(seed_s, 3)), "reapply": dict(again, seconds=round(again_s, 3)),
+                  "edit": dict(edit, seconds=round(edit_s, 3)), "index_load_s": round(load_s, 3), "db": Database.DB_NAME}
+        result["ok"] = seed_s < budget and again["added"] + again["updated"] + again["retired"] == 0
+        return result
+
+# --- Accounts ---
+class Accounts:
+    # Passwords are stored as "pbkdf2_sha256$iterations$salt$hash". ITERATIONS (OWASP's figure, ~0.3 s per hash on a
+    # kiosk core) applies everywhere, bulk imports included; a hash below it (ITERATIONS was raised) is upgraded at the
+    # next login. BENCH_ITERATIONS is only for the synthetic users of the scratch-database benchmarks.
+    SCHEME = "pbkdf2_sha256"
+    ITERATIONS = int(os.environ.get("BU_PARKING_HASH_ITERATIONS", 600_000))
+    BENCH_ITERATIONS = 1_000
+    # A verified (username, password) pair is trusted for SESSION_TTL s, so kiosk re-logins at checkout don't re-hash.
+    # Keyed by an HMAC under a per-process secret; the plaintext is never kept.
+    SESSION_TTL = 300
+    SESSION_MAX = 10_000
+    FIELDS = ("username", "password", "full_name", "email", "phone", "role")
+    ROLES = ("Student", "Faculty", "Staff")
+    STAFF_EMAIL = re.compile(r"@bennett\.edu\.in$")
+    _sessions = OrderedDict()
+    _lock = threading.Lock()
+    _secret = os.urandom(32)
+
+    @staticmethod
+    def hash(password, iterations=None):
+        import hashlib
+        iterations = iterations or Accounts.ITERATIONS
+        salt = os.urandom(16)
+        digest = hashlib.pbkdf2_hmac("sha256", password.encode(), salt, iterations)
+        return f"{Accounts.SCHEME}${iterations}${salt.hex()}${digest.hex()}"
+
+    @staticmethod
+    def hash_plaintext(batch=100):
+        # Migration 7: hashes plaintext passwords in parallel on AUTH with no lock held, then writes each batch back in
+        # a short transaction. A row changed meanwhile (another kiosk got there first) is skipped and re-read next pass.
+        conn = Database.get_connection()
+        while True:
+            rows = conn.execute("SELECT id, password FROM users WHERE password IS NOT NULL AND substr(password, 1, 14) != 'pbkdf2_sha256$'").fetchall()
+            if not rows: return
+            for i in range(0, len(rows), batch):
+                chunk = rows[i:i + batch]
+                hashed = list(AUTH.map(Accounts.hash, [pw for _, pw in chunk]))
+                with Database.transaction() as conn:
+                    conn.executemany("UPDATE users SET password=? WHERE id=? AND password=?", [(h, uid, pw) for h, (uid, pw) in zip(hashed, chunk)])
+
+    @staticmethod
+    def verify(password, stored):
+        # (ok, below_cost). pbkdf2_hmac releases the GIL, so verifications on AUTH/WORKER threads run in parallel.
+        import hashlib, hmac
+        scheme, _, rest = (stored or "").partition("$")
+        if scheme != Accounts.SCHEME: return False, True
+        iterations, salt, digest = rest.split("$")
+        ok = hmac.compare_digest(hashlib.pbkdf2_hmac("sha256", password.encode(), bytes.fromhex(salt), int(iterations)).hex(), digest)
+        return ok, int(iterations) < Accounts.ITERATIONS
+
+    @staticmethod
+    def dummy(password):
+        # A full-cost verify that never matches, so failures answer in the same time whatever the account.
+        Accounts.verify(password, f"{Accounts.SCHEME}${Accounts.ITERATIONS}${'00' * 16}$")
+
+    @staticmethod
+    def login(username, password):
+        # (id, username, role, full_name, is_member) or None. Role and membership always come fresh from the row;
+        # a cached session only holds while the stored hash is unchanged.
+        import hmac
+        row = Database.get_connection().execute("SELECT id, username, role, full_name, is_member, password FROM users WHERE username=?",
+                                                (username,)).fetchone()
+        if row is None:
+            Accounts.dummy(password)  # no probing usernames by timing
+            return None
+        key = hmac.new(Accounts._secret, f"{username}\0{password}".encode(), "sha256").digest()
+        now = time.monotonic()
+        with Accounts._lock: hit = Accounts._sessions.get(key)
+        if hit and hit[0] == row[5] and hit[1] > now: return row[:5]
+        ok, stale = Accounts.verify(password, row[5])
+        if not ok:
+            if stale: Accounts.dummy(password)  # a cheaper (older) hash must not fail faster than an unknown username
+            return None
+        stored = row[5]
+        if stale:
+            stored = Accounts.hash(password)
+            with Database.get_connection() as conn:
+                conn.execute("UPDATE users SET password=? WHERE id=? AND password=?", (stored, row[0], row[5]))
+        with Accounts._lock:
+            Accounts._sessions[key] = (stored, now + Accounts.SESSION_TTL)
+            Accounts._sessions.move_to_end(key)
+            while len(Accounts._sessions) > Accounts.SESSION_MAX: Accounts._sessions.popitem(last=False)
+        return row[:5]
+
+    @staticmethod
+    def profile(uid):
+        return Database.get_connection().execute("SELECT id, username, role, full_name, is_member FROM users WHERE id=?", (uid,)).fetchone()
+
+    @staticmethod
+    def register(username, password, full_name, email, phone, role, iterations=None):
+        # Raises sqlite3.IntegrityError for a duplicate username.
+        stored = Accounts.hash(password, iterations)
+        with Database.get_connection() as conn:
+            return conn.execute("INSERT INTO users (username, password, full_name, email, phone, role) VALUES (?, ?, ?, ?, ?, ?)",
+                                (username, stored, full_name, email, phone, role)).lastrowid
+
+    @staticmethod
+    def check(username, password, full_name, email, phone, role):
+        # Registration rules shared by the form and the bulk import; the problem, or None.
+        if not all((username, password, full_name, email, phone, role)): return "all fields required"
+        if role not in Accounts.ROLES: return f"unknown role {role!r}"
+        if role == "Staff" and not Accounts.STAFF_EMAIL.search(email): return "staff email must end with @bennett.edu.in"
+
+    @staticmethod
+    def import_csv(path, batch=2000):
+        # Semester provisioning from a CSV whose header names FIELDS (extra columns are ignored). Rows are checked like
+        # the registration form, de-duplicated against the file and the database (before hashing), hashed at full cost
+        # across AUTH and inserted one transaction per batch; a username taken by a kiosk meanwhile is skipped.
+        import csv
+        stats = {"rows": 0, "imported": 0, "duplicates": 0, "invalid": 0}
+        rejected, seen = [], set()
+        start = time.perf_counter()
+
+        def reject(line, kind, reason):
+            stats[kind] += 1
+            if len(rejected) < 20: rejected.append({"line": line, "reason": reason})
+
+        def flush(rows):
+            conn = Database.get_connection()
+            names, taken = [r[1] for r in rows], set()
+            for i in range(0, len(names), 500):
+                chunk = names[i:i + 500]
+                taken.update(u for u, in conn.execute(f"SELECT username FROM users WHERE username IN ({','.join('?' * len(chunk))})", chunk))
+            fresh = []
+            for line, *r in rows:
+                if r[0] in taken: reject(line, "duplicates", f"username {r[0]!r} already exists")
+                else: fresh.append(r)
+            fresh = [(r[0], h, *r[2:]) for r, h in zip(fresh, AUTH.map(Accounts.hash, [r[1] for r in fresh]))]
+            with Database.transaction() as conn:
+                before = conn.total_changes
+                conn.executemany("""INSERT INTO users (username, password, full_name, email, phone, role) VALUES (?, ?, ?, ?, ?, ?)
+                                    ON CONFLICT(username) DO NOTHING""", fresh)
+                added = conn.total_changes - before
+            stats["imported"] += added
+            stats["duplicates"] += len(fresh) - added
+
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            reader = csv.DictReader(f)
+            missing = [c for c in Accounts.FIELDS if c not in (reader.fieldnames or [])]
+            if missing: raise ValueError(f"missing column(s): {', '.join(missing)}")
+            rows = []
+            for rec in reader:
+                stats["rows"] += 1
+                r = [(rec[c] or "").strip() for c in Accounts.FIELDS]
+                r[5] = r[5].capitalize()
+                problem = Accounts.check(*r)
+                if problem: reject(reader.line_num, "invalid", problem)
+                elif r[0] in seen: reject(reader.line_num, "duplicates", f"username {r[0]!r} repeated in file")
+                else:
+                    seen.add(r[0])
+                    rows.append((reader.line_num, *r))
+                if len(rows) >= batch:
+                    flush(rows)
+                    rows = []
+            if rows: flush(rows)
+        wall = time.perf_counter() - start
+        return dict(stats, wall_s=round(wall, 2), rows_s=round(stats["rows"] / wall, 1) if wall else 0, rejected=rejected)
+
+    @staticmethod
+    def bench(n=100_000, db=None, seed=1):
+        # Imports n generated users (1% repeated, 0.5% invalid) into a scratch database, imports the file again (all
+        # duplicates), then measures concurrent logins on AUTH: cold (full-cost verify), cached re-logins, and the
+        # failure paths, which must cost the same for a wrong password and an unknown username.
+        import csv, random, tempfile
+        rnd = random.Random(seed)
+        tmp = tempfile.mkdtemp(prefix="bu_auth_")
+        Database.DB_NAME = db or os.path.join(tmp, Database.DB_NAME)
+        Database.initialize()
+        path = os.path.join(tmp, "users.csv")
+        with open(path, "w", newline="") as f:
+            w = csv.writer(f)
+            w.writerow(Accounts.FIELDS)
+            for i in range(n):
+                u = f"s{rnd.randrange(i)}" if i and rnd.random() < 0.01 else f"s{i}"
+                role = rnd.choices(["Student", "Faculty", "Staff", "Visitor"], [85, 10, 4.5, 0.5])[0]
+                w.writerow((u, f"pw{i}", f"User {i}", f"{u}@bennett.edu.in", f"9{i:09d}", role))
+        first = Accounts.import_csv(path)
+        again = Accounts.import_csv(path)
+
+        creds = {}
+        with open(path, newline="") as f:
+            for rec in csv.DictReader(f):
+                if rec["role"] != "Visitor": creds.setdefault(rec["username"], rec["password"])  # the row that was imported
+        workers = AUTH._max_workers
+        sample = rnd.sample(list(creds), max(32, 8 * workers))
+
+        def timed(u, password=None):
+            t = time.perf_counter()
+            ok = Accounts.login(u, password or creds[u]) is not None
+            return ok, (time.perf_counter() - t) * 1000
+
+        def phase(users, password=None):
+            start = time.perf_counter()
+            results = list(AUTH.map(lambda u: timed(u, password), users))
+            wall = time.perf_counter() - start
+            lat = sorted(ms for _, ms in results)
+            return {"logins": len(users), "succeeded": sum(ok for ok, _ in results), "logins_s": round(len(users) / wall, 1),
+                    "p50_ms": round(lat[len(lat) // 2], 3), "max_ms": round(lat[-1], 3)}
+
+        logins = {"cold": phase(sample), "cached": phase(sample * 50),
+                  "wrong_password": phase(sample, "wrong"), "unknown_user": phase([f"nobody{i}" for i in range(len(sample))], "wrong")}
+        return {"config": {"users": n, "hash_iterations": Accounts.ITERATIONS, "auth_threads": workers, "db": Database.DB_NAME},
+                "import": {k: v for k, v in first.items() if k != "rejected"}, "reimport": {k: v for k, v in again.items() if k != "rejected"},
+                "logins": logins}
+
+# Password hashing pool (sized to the cores; pbkdf2 releases the GIL): bulk-import hashing and API logins.
+AUTH = ThreadPoolExecutor(max_workers=os.cpu_count() or 1, thread_name_prefix="auth")
+
+# --- Occupancy Index (in-memory slot availability) ---
+class OccupancyIndex:
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.slots = {}    # slot_id -> (block, slot_number, type)
+        self.blocks = {}   # block -> [slot_id, ...] in slot_number order
+        self.free = {}     # block -> set of free slot ids
+        self.owner = {}    # occupied slot_id -> user_id (None when not known)
+        self.distance = {} # slot_id -> gate distance
+        self.heaps = {}    # block -> heap of (distance, slot_id) over free slots; occupied entries are dropped lazily
+        self.journal = None  # occupy/release calls made while reconcile() reads the DB
+        self.reloading = threading.Lock()
+
+    def read(self):
+        # Fresh (slots, blocks, free, owner, distance, heaps) from the DB; the live maps are untouched.
+        # Retired slots (active=0) are invisible to the grid and the allocator.
+        rows = Database.get_connection().execute("""SELECT ps.id, ps.block, ps.slot_number, ps.type, ps.status, r.user_id, ps.gate_distance
+                                                    FROM parking_slots ps LEFT JOIN reservations r ON ps.id=r.slot_id AND r.status='active'
+                                                    WHERE ps.active=1 ORDER BY ps.block, ps.slot_number""").fetchall()
+        slots, blocks, free, owner, distance = {}, {}, {}, {}, {}
+        for sid, block, num, v_type, status, uid, dist in rows:
+            slots[sid] = (block, num, v_type)
+            distance[sid] = num if dist is None else dist
+            blocks.setdefault(block, []).append(sid)
+            free.setdefault(block, set())
+            if status == "occupied": owner[sid] = uid
+            else: free[block].add(sid)
+        heaps = {b: sorted((distance[sid], sid) for sid in f) for b, f in free.items()}
+        return slots, blocks, free, owner, distance, heaps
+
+    def load(self):
+        maps = self.read()
+        with self.lock:
+            self.slots, self.blocks, self.free, self.owner, self.distance, self.heaps = maps
+
+    def reconcile(self):
+        # Reloads from the DB and returns the slot ids whose state had drifted (e.g. booked from another kiosk).
+        # The SQL runs without the lock, so claims and availability reads carry on; this process's own
+        # occupy/release calls made meanwhile are journalled and replayed onto the fresh maps.
+        with self.reloading:
+            with self.lock: self.journal = []
+            try: maps = self.read()
+            except BaseException:
+                with self.lock: self.journal = None
+                raise
+            with self.lock:
+                before, journal, self.journal = self.owner, self.journal, None
+                self.slots, self.blocks, self.free, self.owner, self.distance, self.heaps = maps
+                for op, sid, uid in journal:
+                    if op == "occupy": self.occupy(sid, uid)
+                    else: self.release(sid)
+                return sorted(sid for sid in set(before) | set(self.owner) if before.get(sid, 0) != self.owner.get(sid, 0))
+
+    def occupy(self, sid, uid=None):
+        with self.lock:
+            if self.journal is not None: self.journal.append(("occupy", sid, uid))
+            if sid not in self.slots: return
+            self.free[self.slots[sid][0]].discard(sid)
+            self.owner[sid] = uid
+
+    def release(self, sid):
+        with self.lock:
+            if self.journal is not None: self.journal.append(("release", sid, None))
+            if sid not in self.slots: return
+            block = self.slots[sid][0]
+            self.free[block].add(sid)
+            self.owner.pop(sid, None)
+            heap = self.heaps[block]
+            heapq.heappush(heap, (self.distance[sid], sid))
+            if len(heap) > 2 * len(self.blocks[block]):  # too many stale/duplicate entries: rebuild from the free set
+                self.heaps[block] = sorted((self.distance[s], s) for s in self.free[block])
+
+    def claim_best(self, v_type, role, uid=None):
+        # Picks the cheapest block per ALLOCATION and pops its nearest free slot: O(blocks + log n).
+        # The slot is marked occupied here so concurrent callers in this process never get the same one;
+        # the conditional UPDATE in ParkingEngine.book settles races with other processes.
+        penalty = ALLOCATION["block_penalty"].get(role, {})
+        with self.lock:
+            best = None
+            for b in self.type_blocks(v_type):
+                heap = self.heaps[b]
+                while heap and (heap[0][1] in self.owner): heapq.heappop(heap)
+                if not heap: continue
+                cost = (ALLOCATION["distance_weight"] * heap[0][0] + penalty.get(b, 0)
+                        + ALLOCATION["spread_weight"] * (1 - len(self.free[b]) / len(self.blocks[b])))
+                if best is None or cost < best[0]: best = (cost, b)
+            if best is None: return None
+            sid = heapq.heappop(self.heaps[best[1]])[1]
+            self.occupy(sid, uid)
+            return sid
+
+    def is_free(self, sid):
+        return sid in self.slots and sid not in self.owner
+
+    def owner_of(self, sid):
+        return self.owner.get(sid)
+
+    def free_count(self, block):
+        return len(self.free.get(block, ()))
+
+    def free_slots(self, block):
+        with self.lock:
+            return [sid for sid in self.blocks.get(block, []) if sid not in self.owner]
+
+    def type_blocks(self, v_type):
+        return [b for b, ids in self.blocks.items() if ids and self.slots[ids[0]][2] == v_type]
+
+    def block_slots(self, block):
+        # [(slot_id, slot_number), ...] for rendering the grid
+        return [(sid, self.slots[sid][1]) for sid in self.blocks.get(block, [])]
+
+OCCUPANCY = OccupancyIndex()
+
+# --- Archival (hot/cold split of reservations) ---
+class Archiver:
+    # Moves completed reservations to reservations_archive in small batches, folding each batch into daily_rollups
+    # in the same short transaction, so the hot table only holds live sessions and bookings never wait long.
+    BATCH = 500
+    INTERVAL = 60
+    COLUMNS = "id, user_id, slot_id, vehicle_number, start_time, duration, fare, fine_amount, payment_method, payment_status, status, start_ts, end_ts, plate, entry_ts, exit_ts"
+
+    @staticmethod
+    def run_batch(limit=BATCH):
+        with Database.transaction() as conn:
+            ids = [r[0] for r in conn.execute("SELECT id FROM reservations WHERE status='completed' ORDER BY end_ts LIMIT ?", (limit,))]
+            if not ids: return 0
+            marks = ",".join("?" * len(ids))
+            conn.execute(f"""INSERT INTO daily_rollups (day, block, role, bookings, revenue, fines, total_hours)
+                             SELECT date(r.start_ts, 'unixepoch', 'localtime'), ps.block, coalesce(u.role, '?'),
+                                    count(*), sum(r.fare), sum(r.fine_amount), sum(r.duration)
+                             FROM reservations r JOIN parking_slots ps ON ps.id=r.slot_id LEFT JOIN users u ON u.id=r.user_id
+                             WHERE r.id IN ({marks}) GROUP BY 1, 2, 3
+                             ON CONFLICT(day, block, role) DO UPDATE SET bookings=bookings+excluded.bookings, revenue=revenue+excluded.revenue,
+                                fines=fines+excluded.fines, total_hours=total_hours+excluded.total_hours""", ids)
+            conn.execute(f"INSERT INTO reservations_archive ({Archiver.COLUMNS}) SELECT {Archiver.COLUMNS} FROM reservations WHERE id IN ({marks})", ids)
+            conn.execute(f"DELETE FROM reservations WHERE id IN ({marks})", ids)
+            return len(ids)
+
+    @staticmethod
+    def run(budget=0.5):
+        # Archives batches until caught up or the time budget runs out; the write lock is released between batches.
+        moved, deadline = 0, time.monotonic() + budget
+        while time.monotonic() < deadline:
+            n = Archiver.run_batch()
+            moved += n
+            if n < Archiver.BATCH: break
+            time.sleep(0)
+        return moved
+
+    @staticmethod
+    def bench(years=5, per_day=1000, db=None, runs=200):
+        # `years` of finished bookings (per_day a day) in the hot table, half the lot parked and a few cash payments
+        # waiting. Times the queries that run every few seconds with all that history, archives it in batches while a
+        # kiosk keeps booking and paying (booking latency, longest batch), and times the same queries afterwards.
+        import random, tempfile, threading
+        rnd = random.Random(1)
+        Database.DB_NAME = db or os.path.join(tempfile.mkdtemp(prefix="bu_archive_"), Database.DB_NAME)
+        Layout.path = None
+        Database.initialize()
+        OCCUPANCY.load()
+        users = [Accounts.register(f"arch{i}", "pw", "Bench", f"arch{i}@example.com", "0", rnd.choice(Analytics.ROLES[:-1]), Accounts.BENCH_ITERATIONS)
+                 for i in range(200)]
+        sids = sorted(OCCUPANCY.slots)
+        now, n = int(time.time()), years * 365 * per_day
+        t = time.perf_counter()
+        with Database.transaction() as conn:
+            conn.executemany("""INSERT INTO reservations (user_id, slot_id, vehicle_number, start_ts, end_ts, duration, fare, fine_amount,
+                                                          payment_method, payment_status, status)
+                                VALUES (?, ?, 'X', ?, ?, 2, 40, ?, 'UPI', 'Paid', 'completed')""",
+                             ((rnd.choice(users), rnd.choice(sids), s, s + 7200, FINE_AMOUNT if i % 10 == 0 else 0)
+                              for i in range(n) for s in [now - years * 365 * 86400 + i * 86400 // per_day]))
+        result = {"config": {"years": years, "rows": n, "db": Database.DB_NAME}, "seed_s": round(time.perf_counter() - t, 1)}
+        for sid in sids[::2]:
+            rid = ParkingEngine.book(rnd.choice(users), sid, "HR26DK0001", 2, 40)
+            if sid % 5 == 0: ParkingEngine.request_cash(rid, 40, 0)
+        conn = Database.get_connection()
+        conn.execute("ANALYZE")
+
+        pct = lambda xs, q: round(sorted(xs)[min(len(xs) - 1, int(q * len(xs)))], 3)
+        def active_queries():
+            # What the gate queue, patrol list, slot grid and overstay check read, and a scan of the hot table.
+            queries = {"gate": lambda: conn.execute("""SELECT r.id, r.vehicle_number, r.fare, r.fine_amount, u.full_name
+                                                       FROM reservations r JOIN users u ON r.user_id=u.id
+                                                       WHERE r.payment_status='Cash_Pending'""").fetchall(),
+                       "patrol_page": lambda: KeysetPager("r.id, r.vehicle_number, ps.block, ps.slot_number, u.full_name, u.phone",
+                                                          "FROM reservations r JOIN users u ON r.user_id=u.id JOIN parking_slots ps ON r.slot_id=ps.id",
+                                                          "r.status='active'", key="r.end_ts", desc=False).next_page(),
+                       "slot_grid": OCCUPANCY.read,
+                       "overdue": lambda: conn.execute("SELECT id FROM reservations WHERE status='active' AND end_ts < ?", (now,)).fetchall(),
+                       # Anything not covered by a partial index (ad-hoc admin queries, a dropped index) reads the whole table.
+                       "active_scan": lambda: conn.execute("SELECT count(*) FROM reservations NOT INDEXED WHERE status='active'").fetchone()}
+            out = {}
+            for name, fn in queries.items():
+                lat = []
+                for _ in range(runs):
+                    t = time.perf_counter()
+                    fn()
+                    lat.append((time.perf_counter() - t) * 1000)
+                out[name] = {"p50_ms": pct(lat, .5), "p95_ms": pct(lat, .95)}
+            return out
+
+        result["before"] = active_queries()
+        # Archiving in the background while a kiosk books and pays on the main thread.
+        batches, done = [], threading.Event()
+        def archive():
+            try:
+                while True:
+                    t = time.perf_counter()
+                    moved = Archiver.run_batch()
+                    batches.append((moved, time.perf_counter() - t))
+                    if moved < Archiver.BATCH: break
+                    time.sleep(0)
+            finally: done.set()
+        worker = threading.Thread(target=archive)
+        t = time.perf_counter()
+        worker.start()
+        lat = []
+        while not done.is_set():
+            s = time.perf_counter()
+            rid, _ = ParkingEngine.book_best(rnd.choice(users), "Student", 0, "Car", "HR26DK0002", 1)
+            if rid: ParkingEngine.pay_upi(rid, 20, 0)
+            lat.append((time.perf_counter() - s) * 1000)
+        worker.join()
+        wall = time.perf_counter() - t
+        moved = sum(m for m, _ in batches)
+        result["archive"] = {"moved": moved, "s": round(wall, 1), "rows_s": round(moved / wall), "batches": len(batches),
+                             "longest_batch_ms": round(max(s for _, s in batches) * 1000, 1),
+                             "book_and_pay": {"ops": len(lat), "p50_ms": pct(lat, .5), "p99_ms": pct(lat, .99), "max_ms": pct(lat, 1)}}
+        conn.execute("ANALYZE")
+        result["after"] = active_queries()
+        result["hot_rows"], result["archived_rows"], result["rollup_rows"] = (
+            conn.execute(f"SELECT count(*) FROM {t}").fetchone()[0] for t in ("reservations", "reservations_archive", "daily_rollups"))
+        Database.close()
+        return result
+
+# --- Analytics (staff reporting) ---
+class Analytics:
+    # Occupancy, peak-hour, revenue and overstay reports over reservations + archive. Rows are streamed from SQLite in
+    # CHUNK-sized NumPy batches and folded into fixed-size accumulators, so memory depends on the report range only.
+    # Occupancy covers every booking overlapping the range (cars already parked when it opens included); the other
+    # reports cover the bookings that started within it.
+    CHUNK = 50_000
+    BIN = 3600
+    ROLES = ["Student", "Faculty", "Staff", "Guest", "Other"]
+    METHODS = ["UPI", "Cash", "Unpaid"]
+    DAYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+
+    @staticmethod
+    def numpy():
+        # Imported lazily: only staff reporting needs it.
+        try: import numpy
+        except ImportError: raise RuntimeError("Analytics requires NumPy (pip install numpy)")
+        return numpy
+
+    @staticmethod
+    def chunks(since, until):
+        np = Analytics.numpy()
+        role = "CASE u.role " + " ".join(f"WHEN '{r}' THEN {i}" for i, r in enumerate(Analytics.ROLES[:-1])) + f" ELSE {len(Analytics.ROLES) - 1} END"
+        method = "CASE r.payment_method WHEN 'UPI' THEN 0 WHEN 'Cash' THEN 1 ELSE 2 END"
+        conn = Database.get_connection()
+        for table in ("reservations", "reservations_archive"):
+            cur = conn.execute(f"""SELECT r.start_ts, r.end_ts, r.slot_id, {role}, coalesce(u.is_member, 0), coalesce(r.fare, 0),
+                                           coalesce(r.fine_amount, 0), {method}, ps.type='Bike', coalesce(r.duration, 0)
+                                    FROM {table} r JOIN parking_slots ps ON ps.id=r.slot_id LEFT JOIN users u ON u.id=r.user_id
+                                    WHERE r.end_ts > ? AND +r.start_ts < ?""", (since, until))  # range on idx_*_end_ts
+            while True:
+                rows = cur.fetchmany(Analytics.CHUNK)
+                if not rows: break
+                yield np.array(rows, dtype=np.float64)
+
+    @staticmethod
+    def report(days=30, until=None):
+        np = Analytics.numpy()
+        until = int(until or time.time())
+        since = until - days * 86400
+        slots = Database.get_connection().execute("SELECT id, block FROM parking_slots").fetchall()
+        blocks = sorted({b for _, b in slots})
+        block_of = np.zeros(max((sid for sid, _ in slots), default=0) + 1, dtype=np.int64)
+        for sid, b in slots: block_of[sid] = blocks.index(b)
+
+        nbins = days * 86400 // Analytics.BIN
+        occ = np.zeros((len(blocks), nbins + 1))
+        heat = np.zeros((7, 24))
+        revenue = np.zeros((len(Analytics.ROLES), len(Analytics.METHODS)))
+        tariff = np.zeros_like(revenue)
+        bookings, overstays = np.zeros(len(blocks)), np.zeros(len(blocks))
+        # Tariff rule as in show_booking (membership is the user's current status, not the one at booking time)
+        role_rate = np.array([PRICING.get(r, 20) for r in Analytics.ROLES])
+        offset = time.localtime(until).tm_gmtoff
+
+        for c in Analytics.chunks(since, until):
+            start, end = c[:, 0], c[:, 1]
+            blk = block_of[c[:, 2].astype(np.int64)]
+
+            # Occupancy: +1 at the start bin (bin 0 if parked before the range), -1 at the end bin, prefix-summed at the end
+            np.add.at(occ, (blk, np.clip((start - since) // Analytics.BIN, 0, nbins).astype(np.int64)), 1)
+            np.add.at(occ, (blk, np.clip(np.ceil((end - since) / Analytics.BIN), 0, nbins).astype(np.int64)), -1)
+
+            new = start >= since
+            c, start, blk = c[new], start[new], blk[new]
+            dur, fare, fine = c[:, 9], c[:, 5], c[:, 6]
+            role, method = c[:, 3].astype(np.int64), c[:, 7].astype(np.int64)
+            local = start + offset
+            np.add.at(heat, (((local // 86400 + 3) % 7).astype(np.int64), ((local // 3600) % 24).astype(np.int64)), 1)  # 1970-01-01 was a Thursday
+
+            np.add.at(revenue, (role, method), fare)
+            rate = np.where(c[:, 8] > 0, PRICING["Bike"], role_rate[role]) * np.where(c[:, 4] > 0, 0.5, 1.0)
+            np.add.at(tariff, (role, method), rate * dur + np.where(fine > 0, FINE_AMOUNT, 0))
+
+            bookings += np.bincount(blk, minlength=len(blocks))
+            overstays += np.bincount(blk, weights=fine > 0, minlength=len(blocks))
+
+        return {"since": since, "until": until, "bin": Analytics.BIN, "blocks": blocks,
+                "occupancy": np.cumsum(occ, axis=1)[:, :nbins], "heatmap": heat,
+                "revenue": revenue, "tariff": tariff, "bookings": bookings,
+                "overstay_rate": overstays / np.maximum(bookings, 1)}
+
+    @staticmethod
+    def export_csv(rep, out_dir):
+        import csv
+        os.makedirs(out_dir, exist_ok=True)
+        def write(name, header, rows):
+            with open(os.path.join(out_dir, name), "w", newline="") as f:
+                w = csv.writer(f)
+                w.writerow(header)
+                w.writerows(rows)
+        write("occupancy.csv", ["hour"] + rep["blocks"],
+              ([time.strftime("%Y-%m-%d %H:%M", time.localtime(rep["since"] + i * rep["bin"]))] + [int(v) for v in col]
+               for i, col in enumerate(rep["occupancy"].T)))
+        write("peak_hours.csv", ["day"] + [f"{h:02d}:00" for h in range(24)],
+              ([d] + [int(v) for v in row] for d, row in zip(Analytics.DAYS, rep["heatmap"])))
+        write("revenue.csv", ["role", "payment_method", "collected", "tariff"],
+              ([r, m, round(rep["revenue"][i, j], 2), round(rep["tariff"][i, j], 2)]
+               for i, r in enumerate(Analytics.ROLES) for j, m in enumerate(Analytics.METHODS) if rep["revenue"][i, j] or rep["tariff"][i, j]))
+        write("overstay.csv", ["block", "bookings", "overstay_rate"],
+              ([b, int(n), round(r, 4)] for b, n, r in zip(rep["blocks"], rep["bookings"], rep["overstay_rate"])))
+        return out_dir
+
+    @staticmethod
+    def measure(job):
+        # Runs in a fresh pool process: one report, with its wall time and how far it raised the peak RSS.
+        import resource
+        db, days, until = job
+        Database.DB_NAME = db
+        with open("/proc/self/statm") as f: start_kb = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+        t = time.perf_counter()
+        rep = Analytics.report(days, until)
+        return time.perf_counter() - t, int(rep["bookings"].sum()), resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - start_kb
+
+    @staticmethod
+    def bench(n=10_000_000, db=None, days=365, seed=1):
+        # A year of reservations, 95% already archived, reported at n/10 and at n rows over the same range:
+        # the peak RSS a report adds should stay put while the row count grows tenfold.
+        import random, tempfile, multiprocessing
+        rnd = random.Random(seed)
+        Database.DB_NAME = db or os.path.join(tempfile.mkdtemp(prefix="bu_analytics_"), Database.DB_NAME)
+        Layout.path = None
+        Database.initialize()
+        with Database.transaction() as conn:
+            conn.executemany("INSERT INTO users (username, full_name, phone, role, is_member) VALUES (?, 'Bench', '0', ?, ?)",
+                             ((f"an{i}", rnd.choice(Analytics.ROLES), int(rnd.random() < 0.2)) for i in range(5000)))
+        sids = [r for r, in Database.get_connection().execute("SELECT id FROM parking_slots")]
+        until = int(time.time())
+        since = until - days * 86400
+        result = {"config": {"rows": n, "days": days, "chunk": Analytics.CHUNK, "db": Database.DB_NAME}}
+        seeded = 0
+        for size in (n // 10, n):
+            t = time.perf_counter()
+            while seeded < size:
+                batch = min(size - seeded, 1_000_000)
+                for table, share in (("reservations_archive", 0.95), ("reservations", 0.05)):
+                    rows = ((rnd.randint(1, 5000), rnd.choice(sids), s, s + round(h * 3600), h, 20 * h, FINE_AMOUNT if rnd.random() < 0.05 else 0,
+                             rnd.choice(("UPI", "Cash")), "completed")
+                            for _ in range(round(batch * share)) for s, h in [(rnd.randrange(since, until), rnd.choice((1, 2, 3, 4, 8)))])
+                    with Database.transaction() as conn:
+                        conn.executemany(f"""INSERT INTO {table} (user_id, slot_id, vehicle_number, start_ts, end_ts, duration, fare, fine_amount,
+                                                                  payment_method, status) VALUES (?, ?, 'X', ?, ?, ?, ?, ?, ?, ?)""", rows)
+                seeded += batch
+            seed_s = time.perf_counter() - t
+            Database.close()
+            with multiprocessing.Pool(1) as pool: seconds, rows, peak_kb = pool.apply(Analytics.measure, ((Database.DB_NAME, days, until),))
+            result[size] = {"seed_s": round(seed_s, 1), "report_s": round(seconds, 1), "rows_reported": rows,
+                            "rows_s": round(rows / seconds), "peak_rss_added_mb": round(peak_kb / 1024, 1)}
+        return result
+
+# --- Overstay Scheduler ---
+class OverstayScheduler:
+    # Min-heap of deadlines for active reservations: end time ("late") and end + FINE_THRESHOLD_MINUTES ("fine").
+    # tick() pops only the entries that are due, so its cost follows the number of transitions, not of active rows.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.heap = []     # (deadline, rid, state, end)
+        self.ends = {}     # rid -> end (epoch seconds)
+        self.states = {}   # rid -> "ok" | "late" | "fine"
+        self.max_rid = 0
+
+    def load(self):
+        rows = Database.get_connection().execute("SELECT id, end_ts FROM reservations WHERE status='active'").fetchall()
+        with self.lock:
+            self.heap, self.ends, self.states, self.max_rid = [], {}, {}, 0
+            for rid, end in rows: self.heap += self._track(rid, end)
+            heapq.heapify(self.heap)
+
+    def _track(self, rid, end):
+        self.ends[rid], self.states[rid] = end, "ok"
+        self.max_rid = max(self.max_rid, rid)
+        return [(end, rid, "late", end), (end + FINE_THRESHOLD_MINUTES * 60, rid, "fine", end)]
+
+    def add(self, rid, end):
+        with self.lock:
+            for entry in self._track(rid, end): heapq.heappush(self.heap, entry)
+
+    def remove(self, rid):
+        # Heap entries are dropped lazily when they surface in tick().
+        with self.lock:
+            self.ends.pop(rid, None)
+            self.states.pop(rid, None)
+
+    def sync(self):
+        # Picks up bookings/checkouts made by other kiosks.
+        # Only ids at or below `top` are pruned, so bookings this process adds mid-sync are not mistaken for closed ones.
+        conn = Database.get_connection()
+        top = conn.execute("SELECT max(id) FROM reservations").fetchone()[0] or 0
+        new = conn.execute("SELECT id, end_ts FROM reservations WHERE status='active' AND id>?", (self.max_rid,)).fetchall()
+        active = {r[0] for r in conn.execute("SELECT id FROM reservations WHERE status='active'")}
+        for rid, end in new: self.add(rid, end)
+        with self.lock: gone = [rid for rid in self.ends if rid <= top and rid not in active]
+        for rid in gone: self.remove(rid)
+
+    def next_due(self):
+        return self.heap[0][0] if self.heap else None
+
+    def state(self, rid):
+        return self.states.get(rid)
+
+    def end(self, rid):
+        return self.ends.get(rid)
+
+    def tick(self, now=None):
+        now = time.time() if now is None else now
+        fired = []
+        with self.lock:
+            while self.heap and self.heap[0][0] <= now:
+                _, rid, state, end = heapq.heappop(self.heap)
+                if self.ends.get(rid) != end: continue  # closed or rescheduled since
+                self.states[rid] = state
+                fired.append((rid, state))
+        fines = [(FINE_AMOUNT, rid) for rid, state in fired if state == "fine"]
+        if fines:
+            with Database.transaction() as conn:
+                conn.executemany("UPDATE reservations SET fine_amount=? WHERE id=? AND status='active'", fines)
+        for rid, state in fired: BUS.publish("overstay", rid=rid, state=state)
+        return fired
+
+    @staticmethod
+    def bench(n=50_000, db=None):
+        # At n/10 and n active reservations (ends a few seconds apart): load time, an idle tick, and ticks firing 1..1000
+        # transitions (fines written included), against the old per-render pass that parsed every active row.
+        import tempfile, datetime
+        Database.DB_NAME = db or os.path.join(tempfile.mkdtemp(prefix="bu_overstay_"), Database.DB_NAME)
+        Database.initialize()
+        now = int(time.time())
+        result = {"config": {"db": Database.DB_NAME}}
+        for size in (n // 10, n):
+            step = max(1, 36_000 // size)
+            with Database.transaction() as conn:
+                conn.execute("DELETE FROM reservations")
+                conn.executemany("""INSERT INTO reservations (user_id, slot_id, vehicle_number, start_time, start_ts, end_ts, duration, fare)
+                                    VALUES (1, ?, 'X', datetime(?, 'unixepoch', 'localtime'), ?, ?, 2, 40)""",
+                                 ((i % 80 + 1, e - 7200, e - 7200, e) for i in range(size) for e in [now + 60 + i * step]))
+            sched = OverstayScheduler()
+            t = time.perf_counter()
+            sched.load()
+            row = {"load_ms": round((time.perf_counter() - t) * 1000, 1)}
+            t = time.perf_counter()
+            for _ in range(1000): sched.tick(now)
+            row["idle_tick_us"] = round((time.perf_counter() - t) * 1000, 2)
+            ticks, pos = {}, 0
+            for k in (1, 10, 100, 1000):
+                pos += k
+                t = time.perf_counter()
+                fired = sched.tick(now + 60 + (pos - 1) * step)
+                ms = (time.perf_counter() - t) * 1000
+                ticks[k] = {"fired": len(fired), "ms": round(ms, 3), "us_per_transition": round(ms * 1000 / max(1, len(fired)), 1)}
+            row["ticks"] = ticks
+            t = time.perf_counter()
+            rows = Database.get_connection().execute("SELECT start_time, duration FROM reservations WHERE status='active'").fetchall()
+            late = sum(1 for st, d in rows if datetime.datetime.strptime(st, "%Y-%m-%d %H:%M:%S") + datetime.timedelta(hours=d) < datetime.datetime.now())
+            row["old_full_pass_ms"], row["old_full_pass_late"] = round((time.perf_counter() - t) * 1000, 1), late
+            result[size] = row
+        return result
+
+SCHEDULER = OverstayScheduler()
+
+# --- Keyset Paging ---
+class KeysetPager:
+    # Pages "SELECT r.id, ... ORDER BY key, r.id" by remembering the last (key, id) instead of using OFFSET,
+    # so page 1000 costs the same as page 1. The key is fetched as a trailing column and stripped from results.
+    # `source` may contain "{table}"; each of `tables` is then paged with the same cursor and the results merged,
+    # which is how history reads across reservations and reservations_archive.
+    def __init__(self, columns, source, where, params=(), key="r.start_ts", desc=True, page_size=50, tables=("reservations",)):
+        self.columns, self.source, self.where, self.params, self.tables = columns, source, where, tuple(params), tables
+        self.key, self.desc, self.page_size = key, desc, page_size
+        self.cursor, self.done = None, False
+        self.lock = threading.RLock()
+
+    def _fetch(self, bound=None, limit=None):
+        order = "DESC" if self.desc else "ASC"
+        sql = f"SELECT {self.columns}, {self.key} {self.source} WHERE {self.where}"
+        params = self.params
+        if bound:
+            sql += f" AND ({self.key}, r.id) {bound} (?, ?)"
+            params += self.cursor
+        sql += f" ORDER BY {self.key} {order}, r.id {order}"
+        if limit:
+            sql += " LIMIT ?"
+            params += (limit,)
+        conn = Database.get_connection()
+        if len(self.tables) == 1: return conn.execute(sql.format(table=self.tables[0]), params).fetchall()
+        # One read transaction (one WAL snapshot) across the tables, so a row Archiver moves between the reads is
+        # neither seen twice nor missed.
+        own = not conn.in_transaction
+        if own: conn.execute("BEGIN")
+        try: rows = [row for t in self.tables for row in conn.execute(sql.format(table=t), params)]
+        finally:
+            if own: conn.commit()
+        rows.sort(key=lambda r: (r[-1], r[0]), reverse=self.desc)
+        return rows[:limit] if limit else rows
+
+    def next_page(self):
+        with self.lock:
+            if self.done: return []
+            rows = self._fetch(("<" if self.desc else ">") if self.cursor else None, self.page_size)
+            self.done = len(rows) < self.page_size
+            if rows: self.cursor = (rows[-1][-1], rows[-1][0])
+            return [r[:-1] for r in rows]
+
+    def loaded(self):
+        # Re-reads everything up to the cursor (for refreshing a list in place); once exhausted, the tail is included too.
+        with self.lock:
+            if self.cursor is None:
+                self.done = False
+                return self.next_page()
+            rows = self._fetch(None if self.done else ("<=" if not self.desc else ">="))
+            if rows: self.cursor = (rows[-1][-1], rows[-1][0])
+            return [r[:-1] for r in rows]
+
+# --- Change Notifications ---
+class EventBus:
+    # In-process pub/sub. Events: slot_booked, slot_freed, slots_changed, cash_pending_added, cash_pending_cleared, db_changed
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.handlers = {}
+
+    def subscribe(self, event, fn):
+        with self.lock: self.handlers.setdefault(event, []).append(fn)
+        return fn
+
+    def unsubscribe(self, event, fn):
+        with self.lock:
+            if fn in self.handlers.get(event, []): self.handlers[event].remove(fn)
+
+    def publish(self, event, **data):
+        with self.lock: handlers = list(self.handlers.get(event, []))
+        for fn in handlers: fn(**data)
+
+BUS = EventBus()
+
+class ChangeWatcher:
+    # Cross-process notifications. PRAGMA data_version (per connection, so the watcher keeps its own) moves on a commit
+    # from any other connection, this process's pooled ones included; only when commit_counts shows transactions from
+    # another writer is it another kiosk's change. Local writes already reach the index and the bus directly.
+    def __init__(self):
+        self.version = self.foreign = None
+        self.conn = None
+
+    def poll(self):
+        if self.conn is None: self.conn = sqlite3.connect(Database.DB_NAME, check_same_thread=False)
+        v = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        if v == self.version: return
+        self.version = v
+        foreign = self.conn.execute("SELECT total(commits) FROM commit_counts WHERE writer != ?", (Database.writer(),)).fetchone()[0]
+        if self.foreign is not None and foreign != self.foreign:
+            drift = OCCUPANCY.reconcile()
+            SCHEDULER.sync()
+            if drift: BUS.publish("slots_changed", slot_ids=drift)
+            BUS.publish("db_changed")
+        self.foreign = foreign
+
+    def close(self):
+        if self.conn is not None: self.conn.close()
+        self.conn = None
+
+# --- Booking Engine (headless, shared by every terminal) ---
+class ParkingEngine:
+    @staticmethod
+    def rate(role, v_type, is_member):
+        rate = PRICING["Bike"] if v_type == "Bike" else PRICING.get(role, 20)
+        return rate * 0.5 if is_member else rate
+
+    @staticmethod
+    def bill(rid):
+        # Final bill as (total, fine): booked fare plus FINE_AMOUNT once past end + FINE_THRESHOLD_MINUTES.
+        # None once the booking is closed (or already archived).
+        row = Database.get_connection().execute("SELECT fare, end_ts + ? < CAST(strftime('%s', 'now') AS INTEGER) FROM reservations WHERE id=? AND status='active'",
+                                                (FINE_THRESHOLD_MINUTES * 60, rid)).fetchone()
+        if row is None: return None
+        fare, late = row
+        fine = FINE_AMOUNT if late else 0
+        return fare + fine, fine
+
+    @staticmethod
+    def book(uid, slot_id, vehicle, hrs, fare):
+        # Returns the new reservation id, or None when the slot was already taken by another terminal.
+        start = int(time.time())
+        end = start + round(hrs * 3600)
+        with Database.transaction() as conn:
+            if conn.execute("UPDATE parking_slots SET status='occupied' WHERE id=? AND status='available' AND active=1", (slot_id,)).rowcount == 0:
+                rid = None
+            else:
+                rid = conn.execute("""INSERT INTO reservations (user_id, slot_id, vehicle_number, plate, start_time, start_ts, end_ts, duration, fare)
+                                      VALUES (?, ?, ?, ?, datetime(?, 'unixepoch', 'localtime'), ?, ?, ?, ?)""",
+                                   (uid, slot_id, vehicle, GateIngest.normalize(vehicle), start, start, end, hrs, fare)).lastrowid
+        # Either way the slot is now occupied; a lost race means our index was stale.
+        if rid:
+            OCCUPANCY.occupy(slot_id, uid)
+            SCHEDULER.add(rid, end)
+        elif OCCUPANCY.is_free(slot_id): OCCUPANCY.occupy(slot_id)
+        BUS.publish("slot_booked", slot_id=slot_id, rid=rid)
+        return rid
+
+    @staticmethod
+    def book_best(uid, role, is_member, v_type, vehicle, hrs, attempts=8):
+        # (rid, slot_id), or (None, None) when nothing is free. A slot lost to another kiosk stays marked occupied
+        # and the next best one is tried.
+        fare = hrs * ParkingEngine.rate(role, v_type, is_member)
+        for _ in range(attempts):
+            sid = OCCUPANCY.claim_best(v_type, role, uid)
+            if sid is None: break
+            try: rid = ParkingEngine.book(uid, sid, vehicle, hrs, fare)
+            except BaseException:
+                OCCUPANCY.release(sid)
+                raise
+            if rid: return rid, sid
+            OCCUPANCY.occupy(sid)
+        return None, None
+
+    @staticmethod
+    def _release(conn, rid):
+        sid = conn.execute("SELECT slot_id FROM reservations WHERE id=?", (rid,)).fetchone()[0]
+        conn.execute("UPDATE parking_slots SET status='available' WHERE id=?", (sid,))
+        return sid
+
+    @staticmethod
+    def pay_upi(rid, total, fine):
+        # Completes the reservation and frees its slot in one transaction. False if it was already closed.
+        with Database.transaction() as conn:
+            if conn.execute("UPDATE reservations SET status='completed', payment_method='UPI', payment_status='Paid', fare=?, fine_amount=? WHERE id=? AND status='active'",
+                            (total, fine, rid)).rowcount == 0:
+                return False
+            sid = ParkingEngine._release(conn, rid)
+        OCCUPANCY.release(sid)
+        SCHEDULER.remove(rid)
+        BUS.publish("slot_freed", slot_id=sid, rid=rid)
+        return True
+
+    @staticmethod
+    def request_cash(rid, total, fine):
+        with Database.transaction() as conn:
+            ok = conn.execute("UPDATE reservations SET payment_method='Cash', payment_status='Cash_Pending', fare=?, fine_amount=? WHERE id=? AND status='active'",
+                              (total, fine, rid)).rowcount > 0
+        if ok: BUS.publish("cash_pending_added", rid=rid)
+        return ok
+
+    @staticmethod
+    def collect_cash(rid):
+        # Only one staff terminal can confirm a given receipt; the loser gets False.
+        with Database.transaction() as conn:
+            if conn.execute("UPDATE reservations SET status='completed', payment_status='Paid' WHERE id=? AND status='active' AND payment_status='Cash_Pending'",
+                            (rid,)).rowcount == 0:
+                return False
+            sid = ParkingEngine._release(conn, rid)
+        OCCUPANCY.release(sid)
+        SCHEDULER.remove(rid)
+        BUS.publish("cash_pending_cleared", rid=rid)
+        BUS.publish("slot_freed", slot_id=sid, rid=rid)
+        return True
+
+# --- Load Generator (headless peak-hour benchmark) ---
+class LoadTest:
+    # Drives register/login/book/checkout/staff_collect_cash through the same headless code the kiosks use,
+    # from N kiosk processes against a scratch database, and reports per-operation latency percentiles as JSON.
+    DAY = (7, 21)  # simulated clock hours covered by one run
+
+    @staticmethod
+    def curve(hour):
+        # Relative arrival / departure intensity: 8:45 class-start surge, lunch churn, evening exodus.
+        arrive = 0.1 + math.exp(-((hour - 8.75) / 0.35) ** 2) + 0.3 * math.exp(-((hour - 13) / 1.0) ** 2)
+        leave = 0.1 + math.exp(-((hour - 17.5) / 0.6) ** 2) + 0.3 * math.exp(-((hour - 13.5) / 1.0) ** 2)
+        return arrive, leave
+
+    @staticmethod
+    def kiosk(job):
+        import random
+        db, kiosk, users, seconds, rate, seed = job
+        Database.DB_NAME = db
+        Accounts.ITERATIONS = Accounts.BENCH_ITERATIONS  # hashing cost is --auth-bench's subject; here it would drown the SQL timings
+        rnd = random.Random(seed)
+        lat, errors = {}, {}
+
+        def timed(op, fn, *args):
+            t = time.perf_counter()
+            try: result = fn(*args)
+            except Exception:
+                errors[op] = errors.get(op, 0) + 1
+                return None
+            lat.setdefault(op, []).append((time.perf_counter() - t) * 1000)
+            return result
+
+        names = [f"load{kiosk}_{i}" for i in range(users)]
+        for n in names: timed("register", Accounts.register, n, "pw", f"Load {n}", f"{n}@example.com", "0000000000", rnd.choice(["Student", "Faculty"]))
+        OCCUPANCY.load()
+        watcher = ChangeWatcher()  # as on a real kiosk, other kiosks' bookings reach the index through data_version
+        parked, idle = {}, list(names)
+        peak = max(sum(LoadTest.curve(h / 10)) for h in range(LoadTest.DAY[0] * 10, LoadTest.DAY[1] * 10))
+        start = time.perf_counter()
+        while (elapsed := time.perf_counter() - start) < seconds:
+            hour = LoadTest.DAY[0] + (LoadTest.DAY[1] - LoadTest.DAY[0]) * elapsed / seconds
+            arrive, leave = LoadTest.curve(hour)
+            time.sleep(rnd.expovariate(max(rate * (arrive + leave) / peak, 1e-3)))  # open-loop Poisson arrivals
+            if idle and (not parked or rnd.random() < arrive / (arrive + leave)):
+                name = idle.pop(rnd.randrange(len(idle)))
+                user = timed("login", Accounts.login, name, "pw")
+                if not user: continue
+                v_type = rnd.choice(["Car", "Bike"])
+                watcher.poll()
+                free = [sid for b in OCCUPANCY.type_blocks(v_type) for sid in OCCUPANCY.free_slots(b)]
+                if not free:
+                    OCCUPANCY.reconcile()
+                    idle.append(name)
+                    continue
+                hrs = rnd.choice([1, 2, 3, 4])
+                rid = timed("book", ParkingEngine.book, user[0], rnd.choice(free), f"HR{kiosk:02d}X{rnd.randrange(10000):04d}", hrs,
+                            hrs * ParkingEngine.rate(user[2], v_type, user[4]))
+                if rid: parked[name] = rid
+                else:
+                    errors["book_conflict"] = errors.get("book_conflict", 0) + 1
+                    idle.append(name)
+            elif parked:
+                name = rnd.choice(list(parked))
+                rid = parked.pop(name)
+                idle.append(name)
+                if not timed("login", Accounts.login, name, "pw"): continue
+                total, fine = timed("bill", ParkingEngine.bill, rid) or (0, 0)
+                if rnd.random() < 0.7: timed("checkout_upi", ParkingEngine.pay_upi, rid, total, fine)
+                else:
+                    timed("checkout_cash", ParkingEngine.request_cash, rid, total, fine)
+                    timed("staff_collect_cash", ParkingEngine.collect_cash, rid)
+        return lat, errors, time.perf_counter() - start
+
+    @staticmethod
+    def run(kiosks=4, users=500, seconds=30, rate=50.0, db=None, seed=1):
+        import tempfile, multiprocessing
+        db = db or os.path.join(tempfile.mkdtemp(prefix="bu_load_"), Database.DB_NAME)
+        Database.DB_NAME = db
+        Database.initialize()
+        Database.close()
+        jobs = [(db, k, users, seconds, rate / kiosks, seed + k) for k in range(kiosks)]
+        with multiprocessing.Pool(kiosks) as pool: results = pool.map(LoadTest.kiosk, jobs)
+
+        lat, errors = {}, {}
+        for l, e, _ in results:
+            for op, v in l.items(): lat.setdefault(op, []).extend(v)
+            for op, n in e.items(): errors[op] = errors.get(op, 0) + n
+        wall = max(r[2] for r in results)
+        pct = lambda v, q: round(v[min(len(v) - 1, int(q * len(v)))], 3)
+        ops = {}
+        for op, v in sorted(lat.items()):
+            v.sort()
+            ops[op] = {"count": len(v), "errors": errors.get(op, 0), "p50_ms": pct(v, .50), "p95_ms": pct(v, .95), "p99_ms": pct(v, .99), "max_ms": round(v[-1], 3)}
+        return {"config": {"kiosks": kiosks, "users_per_kiosk": users, "seconds": seconds, "peak_rate": rate, "db": db},
+                "wall_s": round(wall, 2),
+                "throughput_ops_s": round(sum(len(v) for op, v in lat.items() if op != "register") / wall, 1),
+                "errors": errors, "ops": ops}
+
+    @staticmethod
+    def compare(new, old):
+        # {op: {metric: new - old}} for the latency percentiles, plus the throughput delta.
+        diff = {"throughput_ops_s": round(new["throughput_ops_s"] - old["throughput_ops_s"], 1)}
+        for op, m in new["ops"].items():
+            if op in old["ops"]:
+                diff[op] = {k: round(m[k] - old["ops"][op][k], 3) for k in ("p50_ms", "p95_ms", "p99_ms")}
+        return diff
+
+class AllocBench:
+    # "Book best slot" at campus scale: SLOTS slots, several kiosk processes with many requester threads each.
+    # Every requester holds a few bookings and pays off the oldest, so the lot churns near full.
+    SLOTS = 10_000
+
+    @staticmethod
+    def seed(total):
+        # Car blocks A, B, E and bike blocks C, D, `total` slots in all.
+        blocks = [("A", "Car"), ("B", "Car"), ("E", "Car"), ("C", "Bike"), ("D", "Bike")]
+        Layout.apply({"blocks": [{"block": b, "type": t, "slots": total // len(blocks)} for b, t in blocks]})
+
+    @staticmethod
+    def kiosk(job):
+        import random
+        db, kiosk, threads, hold, seconds, seed = job
+        Database.DB_NAME = db
+        OCCUPANCY.load()
+        lat, full, locked = [], [0], [0]
+        stop = time.monotonic() + seconds
+        watcher = ChangeWatcher()
+
+        def requester(n):
+            rnd = random.Random(seed * 1000 + n)
+            uid = Accounts.register(f"k{kiosk}t{n}", "pw", "Bench", f"k{kiosk}t{n}@example.com", "0", rnd.choice(["Student", "Faculty"]),
+                                    Accounts.BENCH_ITERATIONS)
+            role = "Faculty" if uid % 2 else "Student"
+            held = []
+            while time.monotonic() < stop:
+                t = time.perf_counter()
+                try:
+                    rid, sid = ParkingEngine.book_best(uid, role, 0, rnd.choice(["Car", "Bike"]), f"HR{uid:06d}", 1)
+                    lat.append((time.perf_counter() - t) * 1000)
+                    if rid: held.append(rid)
+                    else: full[0] += 1
+                    if len(held) > hold or (held and rid is None): ParkingEngine.pay_upi(held.pop(0), 20, 0)
+                except sqlite3.OperationalError: locked[0] += 1  # busy_timeout ran out under contention
+
+        workers = [threading.Thread(target=requester, args=(n,)) for n in range(threads)]
+        for w in workers: w.start()
+        while any(w.is_alive() for w in workers):
+            watcher.poll()
+            time.sleep(0.2)
+        return lat, full[0], locked[0]
+
+    @staticmethod
+    def run(kiosks=4, threads=16, seconds=10, slots=SLOTS, db=None):
+        import tempfile, multiprocessing
+        db = db or os.path.join(tempfile.mkdtemp(prefix="bu_alloc_"), Database.DB_NAME)
+        Database.DB_NAME = db
+        Database.initialize()
+        AllocBench.seed(slots)
+        total = Database.get_connection().execute("SELECT count(*) FROM parking_slots").fetchone()[0]
+
+        # In-memory allocator cost alone: claim/release cycles on a full-size index.
+        OCCUPANCY.load()
+        n, t = 20_000, time.perf_counter()
+        for i in range(n): OCCUPANCY.release(OCCUPANCY.claim_best("Car" if i % 2 else "Bike", "Student"))
+        claim_us = (time.perf_counter() - t) / n * 1e6
+        Database.close()
+
+        hold = max(1, int(0.9 * total / (kiosks * threads)))
+        jobs = [(db, k, threads, hold, seconds, k + 1) for k in range(kiosks)]
+        start = time.perf_counter()
+        with multiprocessing.Pool(kiosks) as pool: results = pool.map(AllocBench.kiosk, jobs)
+        wall = time.perf_counter() - start
+        lat = sorted(v for l, _, _ in results for v in l)
+        conn = Database.get_connection()
+        collisions = conn.execute("SELECT count(*) FROM (SELECT slot_id FROM reservations WHERE status='active' GROUP BY slot_id HAVING count(*) > 1)").fetchone()[0]
+        active = conn.execute("SELECT count(*) FROM reservations WHERE status='active'").fetchone()[0]
+        occupied = conn.execute("SELECT count(*) FROM parking_slots WHERE status='occupied'").fetchone()[0]
+        pct = lambda q: round(lat[min(len(lat) - 1, int(q * len(lat)))], 3)
+        return {"config": {"slots": total, "kiosks": kiosks, "threads_per_kiosk": threads, "holdings_per_thread": hold, "seconds": seconds, "db": db},
+                "claim_release_us": round(claim_us, 2),
+                "allocations": len(lat), "allocations_s": round(len(lat) / wall, 1), "lot_full": sum(r[1] for r in results), "lock_timeouts": sum(r[2] for r in results),
+                "latency_ms": {"p50": pct(.50), "p95": pct(.95), "p99": pct(.99), "max": round(lat[-1], 3)},
+                "double_allocations": collisions, "active": active, "occupied_slots": occupied}
+
+# --- Startup (warm-up behind the splash, time-to-login benchmark) ---
+class Startup:
+    # Everything the first login needs, run on WORKER while Tk builds the login form and shows the splash.
+    splash = os.environ.get("BU_PARKING_SPLASH", "1") != "0"
+    probe = False
+    phases = {}
+
+    @staticmethod
+    def run():
+        Startup.phases["import_ms"] = round((time.perf_counter() - STARTED) * 1000, 1)
+        for name, fn in (("schema_ms", Database.initialize), ("occupancy_ms", OCCUPANCY.load),
+                         ("overstay_ms", SCHEDULER.load), ("warm_ms", Startup.warm)):
+            t = time.perf_counter()
+            fn()
+            Startup.phases[name] = round((time.perf_counter() - t) * 1000, 1)
+
+    @staticmethod
+    def warm():
+        # Pull the login lookup and the active-booking index into the page cache before the first click.
+        conn = Database.get_connection()
+        conn.execute("SELECT count(*) FROM users").fetchone()
+        conn.execute("SELECT count(*) FROM reservations WHERE status='active'").fetchone()
+
+    @staticmethod
+    def report():
+        # Called by a --startup-probe window once the login form is on screen and accepting input.
+        print(json.dumps(dict(Startup.phases, interactive_ms=round((time.perf_counter() - STARTED) * 1000, 1))), flush=True)
+
+    @staticmethod
+    def bench(runs=5):
+        # Fresh interpreter per run so imports, Tk init and the SQLite open are all cold-path costs.
+        import subprocess, statistics
+        result = {}
+        for mode, extra in (("splash", []), ("no_splash", ["--no-splash"])):
+            samples = []
+            for _ in range(runs):
+                t = time.perf_counter()
+                out = subprocess.run([sys.executable, os.path.abspath(__file__), "--startup-probe"] + extra,
+                                     capture_output=True, text=True, check=True).stdout
+                sample = json.loads(out.strip().splitlines()[-1])
+                sample["wall_ms"] = round((time.perf_counter() - t) * 1000, 1)
+                samples.append(sample)
+            result[mode] = {k: {"median": round(statistics.median(s[k] for s in samples), 1), "max": max(s[k] for s in samples)} for k in samples[0]}
+        return {"runs": runs, **result}
+
+# --- HTTP API (asyncio, stdlib only: kiosks, gate barriers, mobile clients) ---
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+class ApiServer:
+    # One process serves every client. Reads run on WORKER (pooled per-thread connections); every write is queued
+    # to a single writer task, so this process never has two SQLite writers contending for the lock.
+    # Gate/patrol clients follow BUS events over server-sent events (GET /events) or long-poll (GET /events/poll).
+    # asyncio is imported where used: it costs kiosks ~40 ms of startup and only the server needs it.
+    EVENTS = ("slot_booked", "slot_freed", "slots_changed", "cash_pending_added", "cash_pending_cleared", "db_changed", "overstay")
+    STATUS = {200: "OK", 201: "Created", 400: "Bad Request", 401: "Unauthorized", 403: "Forbidden", 404: "Not Found",
+              405: "Method Not Allowed", 409: "Conflict", 413: "Payload Too Large", 500: "Internal Server Error"}
+    MAX_BODY = 64 * 1024
+    BACKLOG = 50  # events kept for long-poll / Last-Event-ID catch-up
+    POLL_S = 1.0
+    WRITE_BATCH = 64
+    TOKEN_TTL = 3600  # s from login; then the client logs in again
+    TOKEN_MAX = 100_000  # least recently used tokens beyond this are dropped
+
+    def __init__(self):
+        self.sessions = OrderedDict()  # token -> (user id, expires at), most recently used last
+        self.streams = set()
+        self.recent = deque(maxlen=self.BACKLOG)
+        self.seq = 0
+        self.watcher = ChangeWatcher()
+        self.routes = [(m, re.compile(p + "$"), fn) for m, p, fn in [
+            ("POST", r"/login", self.login),
+            ("POST", r"/logout", self.logout),
+            ("GET", r"/availability", self.availability),
+            ("GET", r"/bookings", self.bookings),
+            ("POST", r"/bookings", self.book),
+            ("POST", r"/bookings/best", self.book_best),
+            ("GET", r"/bookings/(\d+)/bill", self.bill),
+            ("POST", r"/bookings/(\d+)/pay", self.pay),
+            ("GET", r"/cash-pending", self.cash_pending),
+            ("POST", r"/cash-pending/(\d+)/collect", self.collect),
+            ("GET", r"/patrol", self.patrol),
+            ("GET", r"/events/poll", self.poll_events)]]
+
+    async def start(self, host="127.0.0.1", port=8080):
+        # Returns the bound port (pass port=0 for an ephemeral one, as the test client and benchmark do).
+        import asyncio
+        self.loop = asyncio.get_running_loop()
+        self.writes = asyncio.Queue()
+        self.conns = {}  # handler task -> stream writer
+        self.claimed = set()  # slot ids with a booking already queued to the writer
+        self.writer_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer")
+        self.handlers = [(e, BUS.subscribe(e, lambda e=e, **kw: self.loop.call_soon_threadsafe(self.fanout, e, kw))) for e in self.EVENTS]
+        self.tasks = [asyncio.create_task(self.writer()), asyncio.create_task(self.housekeeping())]
+        self.server = await asyncio.start_server(self.handle, host, port, backlog=1024)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        # Handlers are ended rather than cancelled: idle keep-alive sockets are closed and SSE streams told to stop.
+        import asyncio
+        self.server.close()
+        for q in self.streams: q.put_nowait(None)
+        for w in self.conns.values(): w.close()
+        await asyncio.gather(*self.conns, return_exceptions=True)
+        for t in self.tasks: t.cancel()
+        for e, fn in self.handlers: BUS.unsubscribe(e, fn)
+        self.writer_pool.shutdown()
+
+    @staticmethod
+    def serve(host, port):
+        import asyncio
+        async def main():
+            server = ApiServer()
+            print(f"Serving on http://{host}:{await server.start(host, port)}", flush=True)
+            await server.server.serve_forever()
+        Database.initialize()
+        OCCUPANCY.load()
+        SCHEDULER.load()
+        asyncio.run(main())
+
+    # --- plumbing ---
+    async def read(self, fn, *args):
+        return await self.loop.run_in_executor(WORKER, fn, *args)
+
+    async def write(self, fn, *args):
+        fut = self.loop.create_future()
+        self.writes.put_nowait((fn, args, fut))
+        return await fut
+
+    async def writer(self):
+        # Drains whatever has queued up and runs it in one hop to the writer thread; each call keeps its own transaction.
+        while True:
+            batch = [await self.writes.get()]
+            while len(batch) < self.WRITE_BATCH and not self.writes.empty(): batch.append(self.writes.get_nowait())
+            results = await self.loop.run_in_executor(self.writer_pool, self.run_writes, batch)
+            for (_, _, fut), (ok, res) in zip(batch, results):
+                if fut.done(): continue
+                if ok: fut.set_result(res)
+                else: fut.set_exception(res)
+
+    @staticmethod
+    def run_writes(batch):
+        results = []
+        for fn, args, _ in batch:
+            try: results.append((True, fn(*args)))
+            except Exception as e: results.append((False, e))
+        return results
+
+    async def housekeeping(self):
+        # The server's equivalent of Dashboard.on_pump: notice other kiosks' commits, apply fines, archive.
+        import asyncio
+        next_archive = 0
+        while True:
+            try:
+                await self.read(self.watcher.poll)
+                due = SCHEDULER.next_due()
+                if due is not None and due <= time.time(): await self.write(SCHEDULER.tick)
+                if time.monotonic() >= next_archive:
+                    next_archive = time.monotonic() + Archiver.INTERVAL
+                    await self.write(Archiver.run)
+            except Exception: Metrics.log.exception("api housekeeping failed")
+            await asyncio.sleep(self.POLL_S)
+
+    def fanout(self, event, data):
+        self.seq += 1
+        item = (self.seq, event, data)
+        self.recent.append(item)
+        for q in self.streams: q.put_nowait(item)
+
+    async def user(self, headers, role=None):
+        # The caller's current (id, username, role, full_name, is_member). Only the id lives in the session; role and
+        # membership are re-read per request, so an upgrade or role change applies at once.
+        auth = headers.get("authorization", "")
+        token = auth[7:] if auth.startswith("Bearer ") else None
+        session = self.sessions.get(token)
+        if session is None or session[1] < time.monotonic():
+            self.sessions.pop(token, None)
+            raise ApiError(401, "login required")
+        self.sessions.move_to_end(token)
+        user = await self.read(Accounts.profile, session[0])
+        if user is None: raise ApiError(401, "login required")
+        if role and user[2] != role: raise ApiError(403, f"{role} only")
+        return user
+
+    async def handle(self, reader, writer):
+        import asyncio
+        task = asyncio.current_task()
+        self.conns[task] = writer
+        try:
+            while True:
+                try: head = await reader.readuntil(b"\r\n\r\n")
+                except Exception: return
+                lines = head.decode("latin-1").split("\r\n")
+                method, target, version = lines[0].split(" ", 2)
+                headers = dict((k.strip().lower(), v.strip()) for k, _, v in (l.partition(":") for l in lines[1:] if l))
+                n = int(headers.get("content-length", 0))
+                if n > self.MAX_BODY: return await self.respond(writer, 413, {"error": "body too large"}, close=True)
+                body = await reader.readexactly(n) if n else b""
+                path, _, qs = target.partition("?")
+                query = dict(p.partition("=")[::2] for p in qs.split("&") if p)
+                if method == "GET" and path == "/events": return await self.sse(writer, headers)
+                status, payload = await self.dispatch(method, path, query, headers, body)
+                keep = headers.get("connection", "keep-alive" if version == "HTTP/1.1" else "close").lower() != "close"
+                await self.respond(writer, status, payload, close=not keep)
+                if not keep: return
+        except (ConnectionError, ValueError): pass
+        finally:
+            self.conns.pop(task, None)
+            writer.close()
+
+    async def dispatch(self, method, path, query, headers, body):
+        allowed = False
+        for m, pattern, fn in self.routes:
+            match = pattern.match(path)
+            if not match: continue
+            if m != method:
+                allowed = True
+                continue
+            try:
+                data = json.loads(body) if body else {}
+                return await fn(headers, query, data, *(int(g) for g in match.groups()))
+            except ApiError as e: return e.status, {"error": str(e)}
+            except (ValueError, KeyError, TypeError) as e: return 400, {"error": f"bad request: {e}"}
+            except Exception:
+                Metrics.log.exception("api %s %s failed", method, path)
+                return 500, {"error": "internal error"}
+        return (405, {"error": "method not allowed"}) if allowed else (404, {"error": "not found"})
+
+    async def respond(self, writer, status, payload, close=False):
+        body = json.dumps(payload).encode()
+        writer.write(f"HTTP/1.1 {status} {self.STATUS[status]}\r\nContent-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+                     f"Connection: {'close' if close else 'keep-alive'}\r\n\r\n".encode() + body)
+        await writer.drain()
+
+    # --- endpoints ---
+    async def login(self, headers, query, data):
+        import secrets
+        user = await self.loop.run_in_executor(AUTH, Accounts.login, data["username"], data["password"])
+        if not user: raise ApiError(401, "invalid credentials")
+        token = secrets.token_urlsafe(24)
+        self.sessions[token] = (user[0], time.monotonic() + self.TOKEN_TTL)
+        while len(self.sessions) > self.TOKEN_MAX: self.sessions.popitem(last=False)
+        return 200, {"token": token, "user": dict(zip(("id", "username", "role", "full_name", "is_member"), user))}
+
+    async def logout(self, headers, query, data):
+        auth = headers.get("authorization", "")
+        self.sessions.pop(auth[7:] if auth.startswith("Bearer ") else None, None)
+        return 200, {}
+
+    async def availability(self, headers, query, data):
+        # Straight from the in-memory occupancy index; no SQL on this path.
+        v_type = query.get("type", "Car")
+        return 200, {"type": v_type, "blocks": {b: {"free": OCCUPANCY.free_count(b), "slots": OCCUPANCY.free_slots(b)} for b in OCCUPANCY.type_blocks(v_type)}}
+
+    async def book(self, headers, query, data):
+        uid, _, role, _, is_member = await self.user(headers)
+        sid, vehicle, hrs = int(data["slot_id"]), str(data["vehicle"]).strip(), float(data["hours"])
+        if sid not in OCCUPANCY.slots or not vehicle or not 0 < hrs <= 24: raise ApiError(400, "slot_id, vehicle and 0 < hours <= 24 required")
+        # The index (kept current by the writer and the watcher) plus the claimed set turn same-slot races into an
+        # immediate 409 instead of a queued transaction that would only find the slot taken.
+        if not OCCUPANCY.is_free(sid) or sid in self.claimed: raise ApiError(409, "slot already taken")
+        fare = hrs * ParkingEngine.rate(role, OCCUPANCY.slots[sid][2], is_member)
+        self.claimed.add(sid)
+        try: rid = await self.write(ParkingEngine.book, uid, sid, vehicle, hrs, fare)
+        finally: self.claimed.discard(sid)
+        if rid is None: raise ApiError(409, "slot already taken")
+        return 201, {"id": rid, "slot_id": sid, "fare": fare}
+
+    async def book_best(self, headers, query, data):
+        uid, _, role, _, is_member = await self.user(headers)
+        v_type, vehicle, hrs = data.get("type", "Car"), str(data["vehicle"]).strip(), float(data["hours"])
+        if v_type not in ("Car", "Bike") or not vehicle or not 0 < hrs <= 24: raise ApiError(400, "type, vehicle and 0 < hours <= 24 required")
+        rid, sid = await self.write(ParkingEngine.book_best, uid, role, is_member, v_type, vehicle, hrs)
+        if rid is None: raise ApiError(409, f"no free {v_type} slots")
+        return 201, {"id": rid, "slot_id": sid, "block": OCCUPANCY.slots[sid][0], "slot": OCCUPANCY.slots[sid][1],
+                     "fare": hrs * ParkingEngine.rate(role, v_type, is_member)}
+
+    async def bookings(self, headers, query, data):
+        uid = (await self.user(headers))[0]
+        pager = KeysetPager("r.id, r.vehicle_number, ps.block, ps.slot_number, r.start_ts, r.end_ts, r.fare, r.status, r.payment_status",
+                            "FROM {table} r JOIN parking_slots ps ON r.slot_id = ps.id", "r.user_id=?", (uid,),
+                            key="r.start_ts", tables=("reservations", "reservations_archive"))
+        if "cursor" in query: pager.cursor = tuple(int(v) for v in query["cursor"].split(":"))
+        rows = await self.read(pager.next_page)
+        cols = ("id", "vehicle", "block", "slot", "start_ts", "end_ts", "fare", "status", "payment_status")
+        return 200, {"bookings": [dict(zip(cols, r)) for r in rows], "cursor": None if pager.done else "%d:%d" % pager.cursor}
+
+    def owned_bill(self, rid, uid):
+        row = Database.get_connection().execute("SELECT user_id, status FROM reservations WHERE id=?", (rid,)).fetchone()
+        if not row or row[0] != uid: raise ApiError(404, "no such booking")
+        bill = ParkingEngine.bill(rid) if row[1] == "active" else None
+        if bill is None: raise ApiError(409, "booking already closed")
+        return bill
+
+    async def bill(self, headers, query, data, rid):
+        total, fine = await self.read(self.owned_bill, rid, (await self.user(headers))[0])
+        return 200, {"id": rid, "total": total, "fine": fine}
+
+    async def pay(self, headers, query, data, rid):
+        # The bill is recomputed server-side; clients never supply amounts.
+        method = data.get("method")
+        if method not in ("upi", "cash"): raise ApiError(400, "method must be 'upi' or 'cash'")
+        total, fine = await self.read(self.owned_bill, rid, (await self.user(headers))[0])
+        ok = await self.write(ParkingEngine.pay_upi if method == "upi" else ParkingEngine.request_cash, rid, total, fine)
+        if not ok: raise ApiError(409, "booking already closed")
+        return 200, {"id": rid, "total": total, "fine": fine, "payment_status": "Paid" if method == "upi" else "Cash_Pending"}
+
+    async def cash_pending(self, headers, query, data):
+        await self.user(headers, "Staff")
+        rows = await self.read(lambda: Database.get_connection().execute("""
+            SELECT r.id, r.vehicle_number, r.fare, r.fine_amount, u.full_name
+            FROM reservations r JOIN users u ON r.user_id=u.id
+            WHERE r.payment_status='Cash_Pending'""").fetchall())
+        return 200, {"pending": [dict(zip(("id", "vehicle", "fare", "fine", "name"), r)) for r in rows]}
+
+    async def collect(self, headers, query, data, rid):
+        await self.user(headers, "Staff")
+        if not await self.write(ParkingEngine.collect_cash, rid): raise ApiError(409, "already collected")
+        return 200, {"id": rid, "payment_status": "Paid"}
+
+    async def patrol(self, headers, query, data):
+        await self.user(headers, "Staff")
+        pager = KeysetPager("r.id, r.vehicle_number, ps.block, ps.slot_number, u.full_name, u.phone",
+                            "FROM reservations r JOIN users u ON r.user_id=u.id JOIN parking_slots ps ON r.slot_id=ps.id",
+                            "r.status='active'", key="r.end_ts", desc=False)
+        if "cursor" in query: pager.cursor = tuple(int(v) for v in query["cursor"].split(":"))
+        rows = await self.read(pager.next_page)
+        return 200, {"active": [dict(zip(("id", "vehicle", "block", "slot", "name", "phone"), r), end_ts=SCHEDULER.end(r[0]), state=SCHEDULER.state(r[0]))
+                                for r in rows], "cursor": None if pager.done else "%d:%d" % pager.cursor}
+
+    async def poll_events(self, headers, query, data):
+        # Long-poll: returns everything after ?after=<seq>, waiting up to ?timeout= seconds (max 30) for something new.
+        import asyncio
+        after = int(query.get("after", 0))
+        events = [e for e in self.recent if e[0] > after]
+        if not events:
+            q = asyncio.Queue()
+            self.streams.add(q)
+            try:
+                item = await asyncio.wait_for(q.get(), min(float(query.get("timeout", 25)), 30))
+                events = [item] if item else []
+            except asyncio.TimeoutError: pass
+            finally: self.streams.discard(q)
+        return 200, {"events": [{"id": s, "event": e, "data": d} for s, e, d in events], "last": events[-1][0] if events else max(after, self.seq)}
+
+    async def sse(self, writer, headers):
+        import asyncio
+        q = asyncio.Queue()
+        self.streams.add(q)
+        try:
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\nConnection: close\r\n\r\n")
+            last = int(headers.get("last-event-id", 0) or 0)
+            for item in [e for e in self.recent if e[0] > last] if last else []: q.put_nowait(item)
+            while True:
+                try: item = await asyncio.wait_for(q.get(), 15)
+                except asyncio.TimeoutError:
+                    writer.write(b": keep-alive\n\n")
+                    await writer.drain()
+                    continue
+                if item is None: return
+                seq, event, data = item
+                writer.write(f"id: {seq}\nevent: {event}\ndata: {json.dumps(data)}\n\n".encode())
+                await writer.drain()
+        except ConnectionError: pass
+        finally:
+            self.streams.discard(q)
+            writer.close()
+
+class ApiClient:
+    # In-process test client: one keep-alive connection per instance, JSON in and out.
+    def __init__(self, port, host="127.0.0.1"):
+        self.host, self.port = host, port
+        self.token = None
+        self.reader = self.writer = None
+
+    async def request(self, method, path, data=None):
+        import asyncio
+        if self.writer is None: self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        body = json.dumps(data).encode() if data is not None else b""
+        auth = f"Authorization: Bearer {self.token}\r\n" if self.token else ""
+        self.writer.write(f"{method} {path} HTTP/1.1\r\nHost: {self.host}\r\n{auth}Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body)
+        await self.writer.drain()
+        head = (await self.reader.readuntil(b"\r\n\r\n")).decode("latin-1").split("\r\n")
+        headers = dict((k.strip().lower(), v.strip()) for k, _, v in (l.partition(":") for l in head[1:] if l))
+        payload = json.loads(await self.reader.readexactly(int(headers["content-length"])))
+        if headers.get("connection") == "close": await self.close()
+        return int(head[0].split()[1]), payload
+
+    async def login(self, username, password):
+        status, payload = await self.request("POST", "/login", {"username": username, "password": password})
+        if status == 200: self.token = payload["token"]
+        return status, payload
+
+    async def logout(self):
+        status, payload = await self.request("POST", "/logout")
+        self.token = None
+        return status, payload
+
+    async def events(self):
+        # Async iterator over (id, event, data) from the SSE stream, on its own connection.
+        import asyncio
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        writer.write(b"GET /events HTTP/1.1\r\nHost: x\r\nAccept: text/event-stream\r\n\r\n")
+        await writer.drain()
+        await reader.readuntil(b"\r\n\r\n")
+        try:
+            while True:
+                block = (await reader.readuntil(b"\n\n")).decode()
+                fields = dict(l.split(": ", 1) for l in block.strip().split("\n") if not l.startswith(":"))
+                if fields: yield int(fields["id"]), fields["event"], json.loads(fields["data"])
+        finally: writer.close()
+
+    async def close(self):
+        if self.writer: self.writer.close()
+        self.reader = self.writer = None
+
+class ApiBench:
+    # Hundreds of simulated clients against one in-process server: each logs in, polls availability and now and then
+    # books, bills and pays; one SSE listener counts the gate/slot events it receives. 409s (lost slot races) are
+    # reported as conflicts, not errors.
+    @staticmethod
+    def client(port, n, stop, lat, errors, conflicts):
+        import asyncio, random
+        async def go():
+            rnd = random.Random(n)
+            c = ApiClient(port)
+
+            async def timed(op, method, path, data=None):
+                t = time.perf_counter()
+                status, payload = await c.request(method, path, data)
+                lat.setdefault(op, []).append((time.perf_counter() - t) * 1000)
+                if status == 409: conflicts[op] = conflicts.get(op, 0) + 1
+                elif status >= 400: errors[op] = errors.get(op, 0) + 1
+                return status, payload
+
+            t = time.perf_counter()
+            await c.login(f"api{n}", "pw")
+            lat.setdefault("login", []).append((time.perf_counter() - t) * 1000)
+            rid = None
+            while time.monotonic() < stop:
+                v_type = "Car" if rnd.random() < 0.6 else "Bike"
+                _, avail = await timed("availability", "GET", f"/availability?type={v_type}")
+                if rid is None and rnd.random() < 0.3:
+                    free = [sid for b in avail["blocks"].values() for sid in b["slots"]]
+                    if free:
+                        status, payload = await timed("book", "POST", "/bookings", {"slot_id": rnd.choice(free), "vehicle": f"HR{n:04d}", "hours": 1})
+                        if status == 201: rid = payload["id"]
+                elif rid is not None and rnd.random() < 0.3:
+                    await timed("bill", "GET", f"/bookings/{rid}/bill")
+                    await timed("pay", "POST", f"/bookings/{rid}/pay", {"method": "upi"})
+                    rid = None
+                await asyncio.sleep(rnd.uniform(0, 0.05))
+            await c.close()
+        return go()
+
+    @staticmethod
+    def run(clients=200, seconds=10, db=None):
+        import asyncio, tempfile
+        db = db or os.path.join(tempfile.mkdtemp(prefix="bu_api_"), Database.DB_NAME)
+        Database.DB_NAME = db
+        Database.initialize()
+        Accounts.ITERATIONS = Accounts.BENCH_ITERATIONS  # as in LoadTest: request handling, not password hashing
+        pw = Accounts.hash("pw")
+        with Database.transaction() as conn:
+            conn.executemany("INSERT OR IGNORE INTO users (username, password, full_name, email, phone, role) VALUES (?, ?, ?, ?, '0', 'Student')",
+                             [(f"api{n}", pw, f"API {n}", f"api{n}@example.com") for n in range(clients)])
+        OCCUPANCY.load()
+        SCHEDULER.load()
+
+        async def main():
+            server = ApiServer()
+            port = await server.start(port=0)
+            lat, errors, conflicts, events = {}, {}, {}, [0]
+
+            async def listen():
+                async for _ in ApiClient(port).events(): events[0] += 1
+            sse = asyncio.create_task(listen())
+            stop = time.monotonic() + seconds
+            start = time.perf_counter()
+            await asyncio.gather(*(ApiBench.client(port, n, stop, lat, errors, conflicts) for n in range(clients)))
+            wall = time.perf_counter() - start
+            await asyncio.sleep(0.1)
+            sse.cancel()
+            await server.close()
+            return lat, errors, conflicts, events[0], wall
+        lat, errors, conflicts, events, wall = asyncio.run(main())
+
+        pct = lambda v, q: round(v[min(len(v) - 1, int(q * len(v)))], 3)
+        ops = {}
+        for op, v in sorted(lat.items()):
+            v.sort()
+            ops[op] = {"count": len(v), "errors": errors.get(op, 0), "conflicts": conflicts.get(op, 0), "p50_ms": pct(v, .50), "p95_ms": pct(v, .95), "p99_ms": pct(v, .99), "max_ms": round(v[-1], 3)}
+        return {"config": {"clients": clients, "seconds": seconds, "db": db}, "wall_s": round(wall, 2),
+                "throughput_req_s": round(sum(len(v) for op, v in lat.items() if op != "login") / wall, 1),
+                "sse_events": events, "ops": ops}
+
+# --- Gate Events (ANPR / barrier ingestion) ---
+class GateIngest:
+    # Entry/exit events arrive as JSON lines, e.g. {"ts": 1718000000, "gate": "G1", "kind": "entry", "plate": "HR 26 DK 8337", "conf": 0.93},
+    # from a tailed log file or a local TCP socket. Producers hand the consumer chunks of (lines, received_at); the consumer
+    # matches a whole batch against active reservations through idx_res_active_plate and commits it in one transaction.
+    BATCH = 2000
+    FLUSH_S = 0.25
+    MIN_CONF = 0.6
+    KINDS = ("entry", "exit", "ping")  # ping = barrier sensor without a plate read
+    # Indian format: state letters, district digits, 0-3 series letters, 4 digits; OCR swaps are undone per position.
+    PLATE = re.compile(r"([A-Z01258]{2})([0-9OIZBS]{1,2})([A-Z01258]{0,3}?)([0-9OIZBS]{4})")
+    TO_ALPHA = str.maketrans("01258", "OIZBS")
+    TO_DIGIT = str.maketrans("OIZBS", "01258")
+
+    @staticmethod
+    @functools.lru_cache(maxsize=65536)
+    def normalize(raw):
+        s = re.sub(r"[^0-9A-Z]", "", (raw or "").upper())
+        m = GateIngest.PLATE.fullmatch(s)
+        if not m: return s
+        state, district, series, number = m.groups()
+        return state.translate(GateIngest.TO_ALPHA) + district.translate(GateIngest.TO_DIGIT) + series.translate(GateIngest.TO_ALPHA) + number.translate(GateIngest.TO_DIGIT)
+
+    @staticmethod
+    def parse(line):
+        # (ts, gate, kind, plate or None); raises ValueError/KeyError/TypeError for malformed input.
+        e = json.loads(line)
+        kind = e["kind"]
+        if kind not in GateIngest.KINDS: raise ValueError(kind)
+        plate = GateIngest.normalize(e.get("plate")) if kind != "ping" and e.get("conf", 1) >= GateIngest.MIN_CONF else None
+        return int(e["ts"]), str(e.get("gate", "")), kind, plate or None
+
+    @staticmethod
+    def commit(events):
+        # One transaction per batch: log every event, then stamp entry (first sighting only) and exit on the matched reservations.
+        plates = list({e[3] for e in events if e[3]})
+        with Database.transaction() as conn:
+            match = {}
+            for i in range(0, len(plates), 500):
+                chunk = plates[i:i + 500]
+                match.update(conn.execute(f"SELECT plate, id FROM reservations WHERE status='active' AND plate IN ({','.join('?' * len(chunk))}) ORDER BY id", chunk))
+            rows = [(ts, gate, kind, plate, match.get(plate)) for ts, gate, kind, plate in events]
+            conn.executemany("INSERT INTO gate_events (ts, gate, kind, plate, reservation_id) VALUES (?, ?, ?, ?, ?)", rows)
+            conn.executemany("UPDATE reservations SET entry_ts=? WHERE id=? AND entry_ts IS NULL", [(r[0], r[4]) for r in rows if r[4] and r[2] == "entry"])
+            conn.executemany("UPDATE reservations SET exit_ts=? WHERE id=?", [(r[0], r[4]) for r in rows if r[4] and r[2] == "exit"])
+        return sum(1 for r in rows if r[4])
+
+    @staticmethod
+    def consume(chunks, stats=None):
+        # Drains a queue of [(line, received_at), ...] chunks until a None sentinel, committing every BATCH events
+        # or FLUSH_S seconds, whichever comes first. Returns per-event latency samples as (commit - received) seconds.
+        stats = stats if stats is not None else {}
+        for k in ("events", "matched", "pings", "malformed", "batches"): stats.setdefault(k, 0)
+        batch, received, lat = [], [], []
+        deadline, done = None, False
+        while not done:
+            try: chunk = chunks.get(timeout=max(0, deadline - time.monotonic()) if deadline else None)
+            except queue.Empty: chunk = []
+            if chunk is None: done = True
+            for line, at in chunk or ():
+                try: batch.append(GateIngest.parse(line))
+                except (ValueError, KeyError, TypeError):
+                    stats["malformed"] += 1
+                    continue
+                received.append(at)
+            if batch and deadline is None: deadline = time.monotonic() + GateIngest.FLUSH_S
+            if batch and (done or len(batch) >= GateIngest.BATCH or time.monotonic() >= deadline):
+                stats["matched"] += GateIngest.commit(batch)
+                now = time.perf_counter()
+                lat.extend(now - at for at in received)
+                stats["events"] += len(batch)
+                stats["pings"] += sum(1 for e in batch if e[2] == "ping")
+                stats["batches"] += 1
+                batch, received, deadline = [], [], None
+        return lat
+
+    @staticmethod
+    def tail(path, chunks, follow=True, failed=None):
+        # Producer: like `tail -F` (waits for the file to appear, reopens on rotation) when following, otherwise reads
+        # to EOF once. Always ends with the None sentinel; an I/O error (e.g. a missing replay file) goes to `failed`.
+        f = None
+        try:
+            while f is None:
+                try: f = open(path)
+                except FileNotFoundError:
+                    if not follow: raise
+                    time.sleep(0.5)
+            inode = os.fstat(f.fileno()).st_ino
+            while True:
+                lines = f.readlines(1 << 16)
+                if lines:
+                    chunks.put([(l, time.perf_counter()) for l in lines if l.strip()])
+                    continue
+                if not follow: break
+                time.sleep(0.05)
+                try:
+                    if os.stat(path).st_ino != inode:
+                        rotated = open(path)
+                        f.close()
+                        f = rotated
+                        inode = os.fstat(f.fileno()).st_ino
+                except FileNotFoundError: pass
+        except OSError as e:
+            if failed is not None: failed.append(e)
+        finally:
+            if f: f.close()
+            chunks.put(None)
+
+    @staticmethod
+    def listen(host, port, chunks):
+        # Producer: local TCP socket, one JSON event per line, any number of cameras/barriers connected at once.
+        import socketserver
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile: chunks.put([(line, time.perf_counter())])
+        server = socketserver.ThreadingTCPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+    @staticmethod
+    def run(source, follow=True):
+        # source is a log path or tcp:HOST:PORT. Blocks until the source ends (replay) or Ctrl+C; returns the stats.
+        # Raises OSError when the log can't be read.
+        chunks, stats, failed = queue.Queue(maxsize=8), {}, []  # backpressure: a fast replay must not hide latency in the queue
+        if source.startswith("tcp:"):
+            host, _, port = source[4:].rpartition(":")
+            GateIngest.listen(host or "127.0.0.1", int(port), chunks)
+        else: threading.Thread(target=GateIngest.tail, args=(source, chunks, follow, failed), daemon=True).start()
+        start = time.perf_counter()
+        try: lat = GateIngest.consume(chunks, stats)
+        except KeyboardInterrupt: lat = []
+        if failed: raise failed[0]
+        wall = time.perf_counter() - start
+        lat.sort()
+        pct = lambda q: round(lat[min(len(lat) - 1, int(q * len(lat)))] * 1000, 3) if lat else None
+        return dict(stats, wall_s=round(wall, 2), events_s=round(stats["events"] / wall, 1) if wall else 0,
+                    latency_ms={"p50": pct(.50), "p95": pct(.95), "p99": pct(.99), "max": pct(1)})
+
+    @staticmethod
+    def bench(n=1_000_000, db=None, seed=1):
+        # Books every slot with a plate, records n camera/barrier events (60% of reads are booked vehicles in messy
+        # formats with OCR swaps, the rest visitors or low-confidence reads), then replays the file.
+        import random, tempfile
+        rnd = random.Random(seed)
+        tmp = tempfile.mkdtemp(prefix="bu_gate_")
+        Database.DB_NAME = db or os.path.join(tmp, Database.DB_NAME)
+        Database.initialize()
+        OCCUPANCY.load()
+        uid = Accounts.register("anpr_bench", "pw", "ANPR Bench", "anpr@example.com", "0", "Student", Accounts.BENCH_ITERATIONS)
+        states = ["HR", "DL", "UP", "MH", "KA", "RJ"]
+        plate = lambda: f"{rnd.choice(states)}{rnd.randint(1, 99):02d}{''.join(rnd.choice('ABCDEFGHJKLMNPRSTUVWXY') for _ in range(2))}{rnd.randint(0, 9999):04d}"
+        booked = [plate() for _ in OCCUPANCY.slots]
+        for sid, p in zip(OCCUPANCY.slots, booked): ParkingEngine.book(uid, sid, p, 2, 40)
+        ocr = str.maketrans("0O1I8B", "O0I18B")
+        def messy(p):
+            p = p.translate(ocr) if rnd.random() < 0.1 else p
+            return rnd.choice([p, p.lower(), f"{p[:2]} {p[2:4]} {p[4:-4]} {p[-4:]}", f"{p[:2]}-{p[2:4]}-{p[4:-4]}-{p[-4:]}"])
+        path = os.path.join(tmp, "events.jsonl")
+        ts = int(time.time())
+        with open(path, "w") as f:
+            for i in range(n):
+                r = rnd.random()
+                e = {"ts": ts + i // 50, "gate": f"G{rnd.randint(1, 4)}", "kind": rnd.choice(("entry", "exit"))}
+                if r < 0.05: e["kind"] = "ping"
+                else: e.update(plate=messy(rnd.choice(booked)) if r < 0.65 else plate(), conf=round(rnd.uniform(0.5, 1), 2))
+                f.write(json.dumps(e) + "\n")
+        Database.close()
+        return dict(GateIngest.run(path, follow=False), db=Database.DB_NAME, events_file=path)
+
+# --- Background Work (keeps SQL off the Tk thread) ---
+WORKER = ThreadPoolExecutor(max_workers=4, thread_name_prefix="db")
+
+class BackgroundTasks:
+    # Mixin for CTk windows: runs work on WORKER and delivers callbacks on the Tk thread via a single after() pump.
+    # Callbacks belonging to a view are dropped once cancel_bg() (called from clear()) moves to the next view;
+    # keep=True jobs (a payment dialog outlives the view that opened it) are neither cancelled nor dropped.
+    PUMP_MS = 30
+    FRAME_BUDGET = 0.012
+
+    def init_background(self):
+        self.ui_queue = queue.Queue()
+        self.view_gen = 0
+        self.view_jobs = []
+        self.pump_job = None
+        self.pump()
+
+    def run_bg(self, fn, *args, on_done=None, on_error=None, keep=False):
+        gen = None if keep else self.view_gen
+        def finish(fut):
+            if fut.cancelled(): return
+            err = fut.exception()
+            if err: self.ui_queue.put((gen, on_error or self.bg_failed, err))
+            elif on_done: self.ui_queue.put((gen, on_done, fut.result()))
+        fut = WORKER.submit(fn, *args)
+        fut.add_done_callback(finish)
+        if not keep: self.view_jobs = [f for f in self.view_jobs if not f.done()] + [fut]
+        return fut
+
+    def post(self, fn, arg):
+        # Thread-safe: queue fn(arg) for the Tk thread, tied to the current view.
+        self.ui_queue.put((self.view_gen, fn, arg))
+
+    def cancel_bg(self):
+        self.view_gen += 1
+        for fut in self.view_jobs: fut.cancel()
+        self.view_jobs = []
+
+    def stop_background(self):
+        # Before destroy(): a pending pump would otherwise fire into its deleted Tcl command ("invalid command name").
+        self.cancel_bg()
+        if self.pump_job: self.after_cancel(self.pump_job)
+        self.pump_job = None
+
+    def bg_failed(self, err):
+        messagebox.showerror("Error", f"Operation failed: {err}")
+
+    def pump(self):
+        # Runs queued callbacks but yields back to Tk once the frame budget is spent.
+        deadline = time.perf_counter() + self.FRAME_BUDGET
+        while time.perf_counter() < deadline:
+            try: gen, fn, arg = self.ui_queue.get_nowait()
+            except queue.Empty: break
+            if gen is None or gen == self.view_gen: fn(arg)
+        try:
+            self.on_pump()
+            self.pump_job = self.after(self.PUMP_MS, self.pump)
+        except tk.TclError: pass  # a callback above destroyed the window
+
+    def on_pump(self):
+        pass
 
 # =========================================
 # --- SPLASH SCREEN (Animation) ---
 # =========================================
-class SplashScreen(ctk.CTk):
-    def __init__(self):
-        super().__init__()
+class SplashScreen(ctk.CTkToplevel):
+    def __init__(self, master):
+        super().__init__(master)
         self.overrideredirect(True)
         w, h = 700, 400
         x = (self.winfo_screenwidth()/2) - (w/2)
@@ -92,7 +2352,7 @@ class SplashScreen(ctk.CTk):
         self.canvas = tk.Canvas(self, width=700, height=150, bg=COLORS["brand"], highlightthickness=0)
         self.canvas.place(relx=0.5, rely=0.6, anchor="center")
         self.car_parts = []
-        self.after(500, self.animate_intro)
+        self.after(50, self.animate_intro)
 
     def draw_car(self, x, y):
         w1 = self.canvas.create_oval(x+25, y+40, x+55, y+70, fill="#111")
@@ -112,18 +2372,23 @@ class SplashScreen(ctk.CTk):
             self.after(20, self.animate_move)
         else:
             self.sub_lbl.place(relx=0.5, rely=0.8, anchor="center")
-            self.after(2000, lambda: [self.destroy(), AuthWindow().mainloop()])
 
 # =========================================
 # --- AUTHENTICATION ---
 # =========================================
-class AuthWindow(ctk.CTk):
+class AuthWindow(BackgroundTasks, ctk.CTk):
+    # The process's only Tk root: the dashboard opens as a Toplevel over it and logout brings it back.
     def __init__(self):
         super().__init__()
+        self.startup_job, self.started = WORKER.submit(Startup.run), False
         self.title("Bennett Portal - Login")
         self.geometry("900x650")
         self.resizable(False, False)
         self.eval('tk::PlaceWindow . center')
+        self.splash = None
+        if Startup.splash:
+            self.withdraw()
+            self.splash = SplashScreen(self)
         
         left = ctk.CTkFrame(self, width=400, corner_radius=0, fg_color=COLORS["brand_light"])
         left.pack(side="left", fill="both")
@@ -131,11 +2396,35 @@ class AuthWindow(ctk.CTk):
         
         self.right = ctk.CTkFrame(self, fg_color="transparent")
         self.right.pack(side="right", fill="both", expand=True, padx=40, pady=40)
+        self.init_background()
         self.show_login()
 
+    def on_pump(self):
+        if self.started or not self.startup_job.done(): return
+        self.started = True
+        err = self.startup_job.exception()
+        if err:
+            messagebox.showerror("Startup failed", str(err))
+            return self.destroy()
+        if self.splash:
+            self.splash.destroy()
+            self.splash = None
+            self.deiconify()
+        if Startup.probe: self.after_idle(lambda: (self.update_idletasks(), Startup.report(), self.destroy()))
+
+    def when_ready(self, fn, *args):
+        # Worker side: logins/registrations made during warm-up queue behind it instead of racing schema init.
+        self.startup_job.result()
+        return fn(*args)
+
     def clear(self):
+        self.cancel_bg()
         for w in self.right.winfo_children(): w.destroy()
 
+    def show_auth(self):
+        self.show_login()
+        self.deiconify()
+
     def show_login(self):
         self.clear()
         ctk.CTkLabel(self.right, text="Secure Login", font=("Roboto", 32, "bold")).pack(pady=30)
@@ -143,7 +2432,8 @@ class AuthWindow(ctk.CTk):
         self.u_ent.pack(pady=10)
         self.p_ent = ctk.CTkEntry(self.right, placeholder_text="Password", show="•", width=300, height=45)
         self.p_ent.pack(pady=10)
-        ctk.CTkButton(self.right, text="LOGIN", command=self.do_login, width=300, height=45, fg_color=COLORS["brand_light"]).pack(pady=20)
+        self.btn_login = ctk.CTkButton(self.right, text="LOGIN", command=self.do_login, width=300, height=45, fg_color=COLORS["brand_light"])
+        self.btn_login.pack(pady=20)
         ctk.CTkButton(self.right, text="Create Account", fg_color="transparent", text_color="gray", command=self.show_reg).pack()
 
     def show_reg(self):
@@ -164,12 +2454,16 @@ class AuthWindow(ctk.CTk):
 
     def do_login(self):
         u, p = self.u_ent.get(), self.p_ent.get()
-        with Database.get_connection() as conn:
-            user = conn.execute("SELECT id, username, role, full_name, is_member FROM users WHERE username=? AND password=?", (u, p)).fetchone()
-            if user:
-                self.destroy()
-                Dashboard(user).mainloop()
-            else: messagebox.showerror("Error", "Invalid Credentials")
+        self.btn_login.configure(state="disabled", text="Signing in...")
+        self.run_bg(self.when_ready, Accounts.login, u, p, on_done=self.login_done)
+
+    def login_done(self, user):
+        if user:
+            self.withdraw()
+            Dashboard(self, user)
+        else:
+            self.btn_login.configure(state="normal", text="LOGIN")
+            messagebox.showerror("Error", "Invalid Credentials")
 
     def do_reg(self):
         d = {k: v.get() for k, v in self.entries.items()}
@@ -178,27 +2472,187 @@ class AuthWindow(ctk.CTk):
         
         # Staff Validation Logic
         if role == "Staff":
-            if not re.search(r"@bennett\.edu\.in$", d["Email"]):
+            if not Accounts.STAFF_EMAIL.search(d["Email"]):
                 return messagebox.showerror("Security Alert", "Staff Authority denied.\nEmail must end with @bennett.edu.in")
 
-        try:
-            with Database.get_connection() as conn:
-                conn.execute("INSERT INTO users (username, password, full_name, email, phone, role) VALUES (?, ?, ?, ?, ?, ?)", 
-                             (d["Username"], d["Password"], d["Full Name"], d["Email"], d["Phone"], role))
-                conn.commit()
-            messagebox.showinfo("Success", "Account created!")
-            self.show_login()
-        except sqlite3.IntegrityError: messagebox.showerror("Error", "Username or Email already exists")
+        self.run_bg(self.when_ready, Accounts.register, d["Username"], d["Password"], d["Full Name"], d["Email"], d["Phone"], role,
+                    on_done=self.reg_done, on_error=self.reg_failed)
+
+    def reg_done(self, _):
+        messagebox.showinfo("Success", "Account created!")
+        self.show_login()
+
+    def reg_failed(self, err):
+        if isinstance(err, sqlite3.IntegrityError): messagebox.showerror("Error", "Username or Email already exists")
+        else: self.bg_failed(err)
+
+# =========================================
+# --- SLOT MAP (Canvas Widget) ---
+# =========================================
+class SlotMap(ctk.CTkFrame):
+    # Draws every slot on one canvas, but only creates items for the rows currently in view.
+    CELL_W, CELL_H, GAP, HEADER_H = 50, 40, 10, 34
+
+    def __init__(self, master, on_select, **kw):
+        super().__init__(master, **kw)
+        self.on_select = on_select
+        self.canvas = tk.Canvas(self, bg=COLORS["card_bg"], highlightthickness=0, yscrollincrement=self.CELL_H + self.GAP)
+        bar = ctk.CTkScrollbar(self, command=self.yview)
+        self.canvas.configure(yscrollcommand=bar.set)
+        bar.pack(side="right", fill="y")
+        self.canvas.pack(side="left", fill="both", expand=True)
+
+        self.blocks = []        # [(block, [(slot_id, slot_number), ...]), ...]
+        self.colors = {}        # slot_id -> fill colour
+        self.clickable = {}     # slot_id -> bool
+        self.titles = {}        # block -> header text
+        self.rows, self.row_y = [], []  # laid-out rows (y, block, slots or None for a header) and their tops
+        self.drawn = {}         # row index -> canvas items
+        self.cells = {}         # slot_id -> (rect, text) while drawn
+        self.headers = {}       # block -> text item while drawn
+        self.selected = None
+        self.cols = 0
+
+        self.canvas.bind("<Configure>", lambda e: self.layout())
+        self.canvas.bind("<Button-1>", self.click)
+        self.canvas.bind("<MouseWheel>", lambda e: self.yview("scroll", -int(e.delta / 120) or (-1 if e.delta > 0 else 1), "units"))
+        self.canvas.bind("<Button-4>", lambda e: self.yview("scroll", -1, "units"))
+        self.canvas.bind("<Button-5>", lambda e: self.yview("scroll", 1, "units"))
+
+    def set_slots(self, blocks, colors, clickable, titles):
+        self.blocks, self.colors, self.clickable, self.titles = blocks, dict(colors), dict(clickable), dict(titles)
+        self.selected, self.cols = None, 0
+        self.layout()
+
+    def update_cells(self, colors, clickable, titles):
+        # Recolours only the cells whose state changed; returns how many did.
+        changed = [sid for sid, c in colors.items() if self.colors.get(sid) != c]
+        self.clickable.update(clickable)
+        for sid in changed:
+            self.colors[sid] = colors[sid]
+            if sid in self.cells: self.canvas.itemconfigure(self.cells[sid][0], fill=colors[sid])
+        for block, text in titles.items():
+            if self.titles.get(block) != text:
+                self.titles[block] = text
+                if block in self.headers: self.canvas.itemconfigure(self.headers[block], text=text)
+        if self.selected is not None and not self.clickable.get(self.selected): self.select(None)
+        return len(changed)
+
+    def layout(self):
+        cols = max(1, (self.canvas.winfo_width() - self.GAP) // (self.CELL_W + self.GAP))
+        if cols == self.cols: return self.draw_visible()
+        self.cols, self.rows, y = cols, [], 0
+        for block, slots in self.blocks:
+            self.rows.append((y, block, None))
+            y += self.HEADER_H
+            for i in range(0, len(slots), cols):
+                self.rows.append((y, block, slots[i:i + cols]))
+                y += self.CELL_H + self.GAP
+        self.row_y = [r[0] for r in self.rows]
+        self.canvas.delete("all")
+        self.drawn.clear(); self.cells.clear(); self.headers.clear()
+        self.canvas.configure(scrollregion=(0, 0, self.GAP + cols * (self.CELL_W + self.GAP), y + self.GAP))
+        self.draw_visible()
+
+    def yview(self, *args):
+        self.canvas.yview(*args)
+        self.draw_visible()
+
+    def draw_visible(self):
+        top = self.canvas.canvasy(0)
+        first = max(0, bisect.bisect_right(self.row_y, top) - 1)
+        last = bisect.bisect_right(self.row_y, top + self.canvas.winfo_height())
+        for i in [i for i in self.drawn if not first <= i < last]:
+            for item in self.drawn.pop(i): self.canvas.delete(item)
+            _, block, slots = self.rows[i]
+            if slots is None: self.headers.pop(block, None)
+            else:
+                for sid, _ in slots: self.cells.pop(sid, None)
+        for i in range(first, last):
+            if i not in self.drawn: self.drawn[i] = self.draw_row(*self.rows[i])
+
+    def draw_row(self, y, block, slots):
+        if slots is None:
+            self.headers[block] = self.canvas.create_text(self.GAP, y + self.HEADER_H / 2, anchor="w", fill="white", font=("Roboto", 16, "bold"),
+                                                          text=self.titles.get(block, f"Block {block}"))
+            return [self.headers[block]]
+        items = []
+        for col, (sid, num) in enumerate(slots):
+            x = self.GAP + col * (self.CELL_W + self.GAP)
+            rect = self.canvas.create_rectangle(x, y, x + self.CELL_W, y + self.CELL_H, fill=self.colors[sid], outline=self.outline(sid), width=2)
+            text = self.canvas.create_text(x + self.CELL_W / 2, y + self.CELL_H / 2, text=str(num), fill="white", font=("Roboto", 12))
+            self.cells[sid] = (rect, text)
+            items += [rect, text]
+        return items
+
+    def outline(self, sid):
+        return COLORS["white"] if sid == self.selected else COLORS["card_bg"]
+
+    def select(self, sid):
+        prev, self.selected = self.selected, sid
+        for s in (prev, sid):
+            if s in self.cells: self.canvas.itemconfigure(self.cells[s][0], outline=self.outline(s))
+
+    def click(self, e):
+        # Hit-test against the row layout instead of per-slot widgets.
+        x, y = self.canvas.canvasx(e.x), self.canvas.canvasy(e.y)
+        i = bisect.bisect_right(self.row_y, y) - 1
+        if i < 0 or self.rows[i][2] is None: return
+        row_y, block, slots = self.rows[i]
+        col, off = divmod(int(x) - self.GAP, self.CELL_W + self.GAP)
+        if off > self.CELL_W or y - row_y > self.CELL_H or not 0 <= col < len(slots): return
+        sid, num = slots[col]
+        if not self.clickable.get(sid): return
+        self.select(sid)
+        self.on_select(sid, block, num)
+
+    @staticmethod
+    def bench(sizes=(100, 1_000, 10_000), runs=5):
+        # Median ms to render a map of each size (set_slots + Tk redraw), recolour 10% of it, scroll to the end and
+        # hit-test a click, plus how many canvas items exist afterwards (bounded by the viewport, not the slot count).
+        # Needs a display; on a headless box run it under xvfb-run.
+        import random, statistics, types
+        rnd = random.Random(1)
+        root = ctk.CTk()
+        root.geometry("1000x600")
+        result = {}
+        for n in sizes:
+            blocks = [(f"B{b}", [(sid, sid - b * 50 + 1) for sid in range(b * 50, min(n, b * 50 + 50))]) for b in range((n + 49) // 50)]
+            samples = {"render_ms": [], "update_10pct_ms": [], "scroll_ms": [], "click_ms": []}
+            def timed(key, fn):
+                t = time.perf_counter()
+                fn()
+                root.update()
+                samples[key].append((time.perf_counter() - t) * 1000)
+            for _ in range(runs):
+                m = SlotMap(root, on_select=lambda *a: None, height=450)
+                m.pack(fill="both", expand=True)
+                root.update()
+                colors = {sid: rnd.choice((COLORS["green"], COLORS["red"])) for _, slots in blocks for sid, _ in slots}
+                timed("render_ms", lambda: m.set_slots(blocks, colors, {sid: True for sid in colors}, {b: f"Block {b}" for b, _ in blocks}))
+                recolor = {sid: COLORS["gold"] for sid in rnd.sample(sorted(colors), max(1, n // 10))}
+                timed("update_10pct_ms", lambda: m.update_cells(recolor, {}, {}))
+                timed("scroll_ms", lambda: m.yview("moveto", 1.0))
+                timed("click_ms", lambda: m.click(types.SimpleNamespace(x=m.GAP + 5, y=m.canvas.winfo_height() - m.CELL_H)))
+                items = len(m.canvas.find_all())
+                m.destroy()
+            result[n] = {k: round(statistics.median(v), 2) for k, v in samples.items()}
+            result[n]["canvas_items"] = items
+        root.destroy()
+        return result
 
 # =========================================
 # --- MAIN DASHBOARD ---
 # =========================================
-class Dashboard(ctk.CTk):
-    def __init__(self, user_data):
-        super().__init__()
+class Dashboard(BackgroundTasks, ctk.CTkToplevel):
+    POLL_MS = 1000
+
+    def __init__(self, master, user_data):
+        super().__init__(master)
         self.uid, self.uname, self.role, self.fname, self.ismem = user_data
         self.title("Bennett Parking System")
         self.geometry("1200x800")
+        self.protocol("WM_DELETE_WINDOW", master.destroy)
         
         self.grid_columnconfigure(1, weight=1)
         self.grid_rowconfigure(0, weight=1)
@@ -215,6 +2669,8 @@ class Dashboard(ctk.CTk):
             # Staff sees ONLY management tools
             self.create_btn(side, "👮  Patrol / Fines", self.show_admin_patrol, color=COLORS["brand"])
             self.create_btn(side, "🚧  Gate Control", self.show_admin_gate, color=COLORS["brand"])
+            self.create_btn(side, "📊  Analytics", self.show_analytics, color=COLORS["brand"])
+            if Metrics.enabled: self.create_btn(side, "🩺  Diagnostics", self.show_diagnostics, color=COLORS["brand"])
             self.default_view = self.show_admin_patrol
         else:
             # Students/Faculty see Booking tools
@@ -229,21 +2685,58 @@ class Dashboard(ctk.CTk):
         self.main = ctk.CTkFrame(self, corner_radius=0)
         self.main.grid(row=0, column=1, sticky="nsew", padx=20, pady=20)
         
+        self.view_subs = []
+        self.watcher = ChangeWatcher()
+        self.watch_job, self.next_watch, self.tick_job = None, 0, None
+        self.archive_job, self.next_archive = None, 0
+        self.metrics_job, self.next_metrics = None, 0
+        self.init_background()
         self.default_view()
 
+    def on_pump(self):
+        # The pump is the dashboard's only recurring timer; it also drives the cross-process watcher off-thread.
+        now = time.monotonic()
+        if now >= self.next_watch and (self.watch_job is None or self.watch_job.done()):
+            self.next_watch = now + self.POLL_MS / 1000
+            self.watch_job = WORKER.submit(self.watcher.poll)
+        due = SCHEDULER.next_due()
+        if due is not None and due <= time.time() and (self.tick_job is None or self.tick_job.done()):
+            self.tick_job = WORKER.submit(SCHEDULER.tick)
+        if now >= self.next_archive and (self.archive_job is None or self.archive_job.done()):
+            self.next_archive = now + Archiver.INTERVAL
+            self.archive_job = WORKER.submit(Archiver.run)
+        if Metrics.enabled and Metrics.export_path and now >= self.next_metrics and (self.metrics_job is None or self.metrics_job.done()):
+            self.next_metrics = now + 15
+            self.metrics_job = WORKER.submit(Metrics.export)
+
+    def listen(self, event, fn):
+        # Subscriptions made through here belong to the current view and are dropped by clear().
+        # Events may be published from worker threads, so handlers are marshalled onto the Tk thread.
+        handler = BUS.subscribe(event, lambda **kw: self.post(lambda kw: fn(**kw), kw))
+        self.view_subs.append((event, handler))
+
     def create_btn(self, parent, text, cmd, color="transparent"):
         ctk.CTkButton(parent, text=text, height=50, fg_color=color, anchor="w", font=("Roboto", 14), command=cmd).pack(fill="x", padx=10, pady=5)
 
     def logout(self):
+        self.clear()
+        self.stop_background()
+        # The watcher's connection may be mid-poll on WORKER; close it once that poll is done.
+        if self.watch_job: self.watch_job.add_done_callback(lambda _: self.watcher.close())
+        else: self.watcher.close()
         self.destroy()
-        AuthWindow().mainloop()
+        self.master.show_auth()
 
     def clear(self):
+        self.cancel_bg()
+        for event, fn in self.view_subs: BUS.unsubscribe(event, fn)
+        self.view_subs = []
         for w in self.main.winfo_children(): w.destroy()
 
     # ==========================
     # STUDENT/FACULTY VIEWS
     # ==========================
+    @timed_view
     def show_booking(self, v_type):
         self.clear()
         self.selected_slot = None
@@ -258,31 +2751,14 @@ class Dashboard(ctk.CTk):
             ctk.CTkLabel(leg, text="●", text_color=c, font=("Arial", 20)).pack(side="left")
             ctk.CTkLabel(leg, text=t, font=("Roboto", 12)).pack(side="left", padx=(2, 15))
 
-        grid = ctk.CTkScrollableFrame(self.main, height=450)
-        grid.pack(fill="x", expand=True, pady=10)
+        self.slot_map = SlotMap(self.main, on_select=self.select, height=450)
+        self.slot_map.pack(fill="both", expand=True, pady=10)
         
-        blocks = ['A', 'B'] if v_type == 'Car' else ['C', 'D']
-        for block in blocks:
-            bf = ctk.CTkFrame(grid)
-            bf.pack(fill="x", pady=5)
-            ctk.CTkLabel(bf, text=f"Block {block}", font=("Roboto", 16, "bold")).pack(anchor="w", padx=10)
-            row_f = ctk.CTkFrame(bf, fg_color="transparent")
-            row_f.pack(fill="x")
-            
-            with Database.get_connection() as conn:
-                slots = conn.execute("""SELECT ps.id, ps.slot_number, ps.status, r.user_id 
-                                        FROM parking_slots ps LEFT JOIN reservations r ON ps.id=r.slot_id AND r.status='active'
-                                        WHERE ps.block=?""", (block,)).fetchall()
-            
-            for sid, num, status, uid in slots:
-                color, state = COLORS["green"], "normal"
-                if status == "occupied":
-                    state = "disabled"
-                    color = COLORS["red"]
-                    if uid == self.uid: color, state = COLORS["gold"], "normal"
-                
-                ctk.CTkButton(row_f, text=str(num), width=50, height=40, fg_color=color, state=state,
-                              command=lambda s=sid, b=block, n=num: self.select(s, b, n)).pack(side="left", padx=5, pady=5)
+        self.slot_blocks = OCCUPANCY.type_blocks(v_type)
+        self.slot_map.set_slots([(b, OCCUPANCY.block_slots(b)) for b in self.slot_blocks], *self.slot_states())
+        self.listen("slot_booked", lambda slot_id, **_: self.refresh_slots([slot_id]))
+        self.listen("slot_freed", lambda slot_id, **_: self.refresh_slots([slot_id]))
+        self.listen("slots_changed", lambda slot_ids: self.refresh_slots(slot_ids))
 
         # Booking Action
         form = ctk.CTkFrame(self.main, fg_color=COLORS["card_bg"])
@@ -298,10 +2774,29 @@ class Dashboard(ctk.CTk):
         self.ent_dur.insert(0, "1")
         self.ent_dur.pack(side="left", padx=10)
         
-        rate = PRICING["Bike"] if v_type == "Bike" else PRICING.get(self.role, 20)
-        if self.ismem: rate *= 0.5
+        rate = ParkingEngine.rate(self.role, v_type, self.ismem)
         
-        ctk.CTkButton(row, text=f"Book Now (@ ₹{rate}/hr)", fg_color=COLORS["green"], command=lambda: self.book(rate)).pack(side="left", padx=10)
+        self.btn_book = ctk.CTkButton(row, text=f"Book Now (@ ₹{rate}/hr)", fg_color=COLORS["green"], command=lambda: self.book(rate))
+        self.btn_book.pack(side="left", padx=10)
+        self.btn_best = ctk.CTkButton(row, text="⚡ Book best slot", fg_color=COLORS["brand_light"], command=lambda: self.book_best(rate))
+        self.btn_best.pack(side="left", padx=10)
+
+    def slot_states(self, sids=None):
+        if sids is None: sids = [sid for b in self.slot_blocks for sid, _ in OCCUPANCY.block_slots(b)]
+        colors, clickable = {}, {}
+        for sid in sids:
+            if OCCUPANCY.is_free(sid): colors[sid], clickable[sid] = COLORS["green"], True
+            elif OCCUPANCY.owner_of(sid) == self.uid: colors[sid], clickable[sid] = COLORS["gold"], True
+            else: colors[sid], clickable[sid] = COLORS["red"], False
+        titles = {b: f"Block {b}  ({OCCUPANCY.free_count(b)} free)" for b in self.slot_blocks}
+        return colors, clickable, titles
+
+    def refresh_slots(self, sids=None):
+        if sids is not None: sids = [sid for sid in sids if sid in self.slot_map.colors]
+        self.slot_map.update_cells(*self.slot_states(sids))
+        if self.slot_map.selected is None:
+            self.selected_slot = None
+            self.lbl_sel.configure(text="Select a slot", text_color=COLORS["white"])
 
     def select(self, s, b, n):
         self.selected_slot = s
@@ -309,39 +2804,73 @@ class Dashboard(ctk.CTk):
 
     def book(self, rate):
         if not self.selected_slot or not self.ent_veh.get(): return messagebox.showwarning("!", "Fill details")
-        try:
-            hrs = float(self.ent_dur.get())
-            fare = hrs * rate
-            if messagebox.askyesno("Confirm", f"Estimated Fare: ₹{fare}\nProceed?"):
-                with Database.get_connection() as conn:
-                    conn.execute("UPDATE parking_slots SET status='occupied' WHERE id=?", (self.selected_slot,))
-                    conn.execute("INSERT INTO reservations (user_id, slot_id, vehicle_number, start_time, duration, fare) VALUES (?, ?, ?, datetime('now', 'localtime'), ?, ?)", 
-                                 (self.uid, self.selected_slot, self.ent_veh.get(), hrs, fare))
-                    conn.commit()
-                self.show_booking(self.curr_v_type)
-        except: messagebox.showerror("Error", "Invalid Duration")
+        try: hrs = float(self.ent_dur.get())
+        except ValueError: return messagebox.showerror("Error", "Invalid Duration")
+        fare = hrs * rate
+        if messagebox.askyesno("Confirm", f"Estimated Fare: ₹{fare}\nProceed?"):
+            sid = self.selected_slot
+            self.btn_book.configure(state="disabled")
+            self.run_bg(ParkingEngine.book, self.uid, sid, self.ent_veh.get(), hrs, fare, on_done=lambda rid: self.booked(sid, rid))
+
+    def book_best(self, rate):
+        # No grid scanning: the allocator picks the slot (nearest the gate, role's preferred block, emptier blocks first).
+        if not self.ent_veh.get(): return messagebox.showwarning("!", "Enter vehicle number")
+        try: hrs = float(self.ent_dur.get())
+        except ValueError: return messagebox.showerror("Error", "Invalid Duration")
+        if messagebox.askyesno("Confirm", f"Estimated Fare: ₹{hrs * rate}\nBook the best free slot?"):
+            self.btn_best.configure(state="disabled")
+            self.run_bg(ParkingEngine.book_best, self.uid, self.role, self.ismem, self.curr_v_type, self.ent_veh.get(), hrs, on_done=self.best_booked)
 
+    def best_booked(self, res):
+        rid, sid = res
+        self.btn_best.configure(state="normal")
+        if rid is None: return messagebox.showerror("Full", f"No free {self.curr_v_type.lower()} slots right now.")
+        block, num, _ = OCCUPANCY.slots[sid]
+        self.refresh_slots([sid])
+        messagebox.showinfo("Booked", f"Your slot is {block}-{num}.")
+
+    def booked(self, sid, rid):
+        self.btn_book.configure(state="normal")
+        if rid is None:
+            messagebox.showerror("Slot Taken", "This slot was just booked from another terminal.\nPlease pick another one.")
+            self.run_bg(OCCUPANCY.reconcile, on_done=self.refresh_slots)
+        self.slot_map.select(None)
+        self.refresh_slots([sid])
+
+    @timed_view
     def show_history(self):
         self.clear()
         ctk.CTkLabel(self.main, text="My Parking Activity", font=("Montserrat", 26, "bold")).pack(pady=10, anchor="w")
         scroll = ctk.CTkScrollableFrame(self.main)
         scroll.pack(fill="both", expand=True)
+        loading = ctk.CTkLabel(scroll, text="Loading...", text_color="gray")
+        loading.pack(pady=20)
+        self.hist_pager = KeysetPager("""r.id, r.vehicle_number, ps.block, ps.slot_number, r.end_ts, r.fare, r.status, r.payment_status,
+                                         r.status='active' AND r.end_ts + ? < CAST(strftime('%s', 'now') AS INTEGER)""",
+                                      "FROM {table} r JOIN parking_slots ps ON r.slot_id = ps.id", "r.user_id=?",
+                                      (FINE_THRESHOLD_MINUTES * 60, self.uid), key="r.start_ts", tables=("reservations", "reservations_archive"))
+        self.hist_more = ctk.CTkButton(self.main, text="Load more", fg_color="transparent", text_color="gray",
+                                       command=lambda: self.more_history(scroll))
+        self.run_bg(self.hist_pager.next_page, on_done=lambda rows: (loading.destroy(), self.render_history(scroll, rows)))
 
-        with Database.get_connection() as conn:
-            rows = conn.execute("""
-                SELECT r.id, r.vehicle_number, ps.block, ps.slot_number, r.start_time, r.duration, r.fare, r.status, r.payment_status
-                FROM reservations r JOIN parking_slots ps ON r.slot_id = ps.id
-                WHERE r.user_id=? ORDER BY r.start_time DESC""", (self.uid,)).fetchall()
+    def more_history(self, scroll):
+        self.hist_more.configure(state="disabled", text="Loading...")
+        self.run_bg(self.hist_pager.next_page, on_done=lambda rows: self.render_history(scroll, rows))
 
-        for rid, veh, b, s, start, dur, fare, status, pay_stat in rows:
+    @timed_view
+    def render_history(self, scroll, rows):
+        if not rows and self.hist_pager.cursor is None: ctk.CTkLabel(scroll, text="No bookings yet.", text_color="gray").pack(pady=20)
+        if self.hist_pager.done: self.hist_more.pack_forget()
+        else:
+            self.hist_more.configure(state="normal", text="Load more")
+            self.hist_more.pack(pady=5)
+        for rid, veh, b, s, end, fare, status, pay_stat, is_late in rows:
             f = ctk.CTkFrame(scroll, fg_color=COLORS["card_bg"])
             f.pack(fill="x", pady=5, padx=5)
             
-            end_dt = datetime.strptime(start, "%Y-%m-%d %H:%M:%S") + timedelta(hours=dur)
-            is_late = datetime.now() > end_dt + timedelta(minutes=FINE_THRESHOLD_MINUTES)
-            fine_txt = f" + ₹{FINE_AMOUNT} FINE" if is_late and status=='active' else ""
+            fine_txt = f" + ₹{FINE_AMOUNT} FINE" if is_late else ""
             
-            info = f"{veh} | {b}-{s} | Ends: {end_dt.strftime('%H:%M')} | ₹{fare:.0f}{fine_txt}"
+            info = f"{veh} | {b}-{s} | Ends: {time.strftime('%H:%M', time.localtime(end))} | ₹{fare:.0f}{fine_txt}"
             ctk.CTkLabel(f, text=info, font=("Roboto", 14)).pack(side="left", padx=15, pady=15)
             
             if status == 'active':
@@ -354,16 +2883,13 @@ class Dashboard(ctk.CTk):
                 ctk.CTkLabel(f, text="COMPLETED", text_color="gray").pack(side="right", padx=15)
 
     def initiate_checkout(self, rid):
-        # Calculate Final Bill
-        with Database.get_connection() as conn:
-            res = conn.execute("SELECT start_time, duration, fare FROM reservations WHERE id=?", (rid,)).fetchone()
-        
-        end_dt = datetime.strptime(res[0], "%Y-%m-%d %H:%M:%S") + timedelta(hours=res[1])
-        is_late = datetime.now() > end_dt + timedelta(minutes=FINE_THRESHOLD_MINUTES)
-        
-        total = res[2]
-        if is_late: total += FINE_AMOUNT
-        
+        self.run_bg(ParkingEngine.bill, rid, on_done=lambda bill: self.show_payment(rid, bill))
+
+    def show_payment(self, rid, bill):
+        if bill is None:  # paid from another kiosk, or archived, since this list was loaded
+            messagebox.showwarning("!", "This booking is already closed.")
+            return self.show_history()
+        total, fine = bill
         # Payment Modal
         top = ctk.CTkToplevel(self)
         top.title("Payment Gateway")
@@ -373,31 +2899,32 @@ class Dashboard(ctk.CTk):
         ctk.CTkLabel(top, text=f"Total Amount: ₹{total}", font=("Montserrat", 20, "bold")).pack(pady=20)
         ctk.CTkLabel(top, text="Select Payment Method:", font=("Roboto", 14)).pack(pady=10)
         
-        # UPI Logic
-        def pay_upi():
-            with Database.get_connection() as conn:
-                conn.execute("UPDATE reservations SET status='completed', payment_method='UPI', payment_status='Paid', fare=?, fine_amount=? WHERE id=?", 
-                             (total, FINE_AMOUNT if is_late else 0, rid))
-                # Free the slot
-                slot_id = conn.execute("SELECT slot_id FROM reservations WHERE id=?", (rid,)).fetchone()[0]
-                conn.execute("UPDATE parking_slots SET status='available' WHERE id=?", (slot_id,))
-                conn.commit()
-            messagebox.showinfo("UPI Success", "Payment Verified. Gate Opening...")
-            top.destroy()
-            self.show_history()
+        # The payment goes through even if the user navigates away meanwhile, so its result is delivered regardless
+        # (keep=True); the history list is only reloaded if it is still the view on screen.
+        def finish(ok, title, msg, gen):
+            if top.winfo_exists(): top.destroy()
+            if ok: messagebox.showinfo(title, msg)
+            else: messagebox.showwarning("!", "This booking is already closed.")
+            if gen == self.view_gen: self.show_history()
 
-        # Cash Logic
-        def pay_cash():
-            with Database.get_connection() as conn:
-                conn.execute("UPDATE reservations SET payment_method='Cash', payment_status='Cash_Pending', fare=?, fine_amount=? WHERE id=?", 
-                             (total, FINE_AMOUNT if is_late else 0, rid))
-                conn.commit()
-            messagebox.showinfo("Cash Request", "Please drive to the Exit Gate.\nStaff will collect cash and open the barrier.")
-            top.destroy()
-            self.show_history()
+        def failed(err):
+            if top.winfo_exists(): top.destroy()
+            self.bg_failed(err)
+
+        def pay(engine_fn, title, msg):
+            for b in buttons: b.configure(state="disabled")
+            gen = self.view_gen
+            self.run_bg(engine_fn, rid, total, fine, on_done=lambda ok: finish(ok, title, msg, gen), on_error=failed, keep=True)
 
-        ctk.CTkButton(top, text="📱 UPI / QR Code", fg_color=COLORS["brand"], command=pay_upi).pack(pady=10, fill="x", padx=40)
-        ctk.CTkButton(top, text="💵 Cash at Gate", fg_color=COLORS["green"], command=pay_cash).pack(pady=10, fill="x", padx=40)
+        buttons = [
+            # UPI Logic
+            ctk.CTkButton(top, text="📱 UPI / QR Code", fg_color=COLORS["brand"],
+                          command=lambda: pay(ParkingEngine.pay_upi, "UPI Success", "Payment Verified. Gate Opening...")),
+            # Cash Logic
+            ctk.CTkButton(top, text="💵 Cash at Gate", fg_color=COLORS["green"],
+                          command=lambda: pay(ParkingEngine.request_cash, "Cash Request", "Please drive to the Exit Gate.\nStaff will collect cash and open the barrier.")),
+        ]
+        for b in buttons: b.pack(pady=10, fill="x", padx=40)
 
     def show_membership(self):
         self.clear()
@@ -409,72 +2936,127 @@ class Dashboard(ctk.CTk):
         ctk.CTkButton(card, text="Buy (₹500)", fg_color=COLORS["gold"], text_color="black", command=self.buy_mem).pack(pady=20)
     
     def buy_mem(self):
-        with Database.get_connection() as conn:
-            conn.execute("UPDATE users SET is_member=1 WHERE id=?", (self.uid,))
-            conn.commit()
+        def upgrade():
+            with Database.get_connection() as conn:
+                conn.execute("UPDATE users SET is_member=1 WHERE id=?", (self.uid,))
+                conn.commit()
+        self.run_bg(upgrade, on_done=lambda _: self.mem_bought())
+
+    def mem_bought(self):
         self.ismem = 1
         messagebox.showinfo("Success", "Upgraded to Gold!")
 
     # ==========================
     # STAFF VIEWS (Admin)
     # ==========================
+    @timed_view
     def show_admin_patrol(self):
         self.clear()
         ctk.CTkLabel(self.main, text="👮 Staff Patrol Dashboard", font=("Montserrat", 26, "bold"), text_color=COLORS["red"]).pack(pady=10, anchor="w")
         ctk.CTkLabel(self.main, text="Active Vehicles & Contact Details", font=("Roboto", 12)).pack(anchor="w", padx=5)
 
-        scroll = ctk.CTkScrollableFrame(self.main)
-        scroll.pack(fill="both", expand=True, pady=10)
+        self.patrol_scroll = ctk.CTkScrollableFrame(self.main)
+        self.patrol_scroll.pack(fill="both", expand=True, pady=10)
         
-        head = ctk.CTkFrame(scroll, fg_color="#333")
+        head = ctk.CTkFrame(self.patrol_scroll, fg_color="#333")
         head.pack(fill="x")
         for c, w in [("Vehicle", 100), ("Slot", 80), ("Owner", 150), ("PHONE", 120), ("Status", 150)]:
             ctk.CTkLabel(head, text=c, width=w, font=("bold", 12)).pack(side="left", padx=5)
 
-        with Database.get_connection() as conn:
-            rows = conn.execute("""
-                SELECT r.vehicle_number, ps.block, ps.slot_number, u.full_name, u.phone, r.start_time, r.duration
-                FROM reservations r JOIN users u ON r.user_id=u.id JOIN parking_slots ps ON r.slot_id=ps.id
-                WHERE r.status='active'""").fetchall()
+        self.patrol_rows = {}  # rid -> (row frame, status label)
+        self.patrol_empty = ctk.CTkLabel(self.patrol_scroll, text="Loading...")
+        self.patrol_empty.pack(pady=20)
+        self.patrol_pager = KeysetPager("r.id, r.vehicle_number, ps.block, ps.slot_number, u.full_name, u.phone",
+                                        "FROM reservations r JOIN users u ON r.user_id=u.id JOIN parking_slots ps ON r.slot_id=ps.id",
+                                        "r.status='active'", key="r.end_ts", desc=False)
+        self.patrol_more = ctk.CTkButton(self.main, text="Load more", fg_color="transparent", text_color="gray", command=self.more_patrol)
+        self.run_bg(self.patrol_pager.next_page, on_done=self.render_patrol)
+        for event in ("slot_booked", "slot_freed", "db_changed"): self.listen(event, self.sync_patrol)
+        self.listen("overstay", lambda rid, state: self.update_patrol_row(rid))
 
-        if not rows: ctk.CTkLabel(scroll, text="Premises Empty").pack(pady=20)
+    def patrol_status(self, rid):
+        # Reads the scheduler's precomputed state; only the minutes counter is derived here.
+        mins_left = (SCHEDULER.end(rid) - time.time()) / 60
+        state = SCHEDULER.state(rid)
+        if state == "fine": return "FINE APPLICABLE", COLORS["red"]
+        if state == "late": return f"LATE ({int(abs(mins_left))}m)", "orange"
+        return f"{int(mins_left)}m left", "white"
 
-        for veh, b, s, name, phone, start, dur in rows:
-            row = ctk.CTkFrame(scroll)
-            row.pack(fill="x", pady=2)
-            
-            end_dt = datetime.strptime(start, "%Y-%m-%d %H:%M:%S") + timedelta(hours=dur)
-            mins_left = (end_dt - datetime.now()).total_seconds() / 60
-            
-            stat = f"{int(mins_left)}m left"
-            clr = "white"
-            if mins_left < 0: stat, clr = f"LATE ({int(abs(mins_left))}m)", "orange"
-            if mins_left < -FINE_THRESHOLD_MINUTES: stat, clr = "FINE APPLICABLE", COLORS["red"]
+    def update_patrol_row(self, rid):
+        if rid in self.patrol_rows and SCHEDULER.state(rid):
+            stat, clr = self.patrol_status(rid)
+            self.patrol_rows[rid][1].configure(text=stat, text_color=clr)
 
-            for d, w, c in [(veh, 100, "white"), (f"{b}-{s}", 80, "white"), (name, 150, "white"), (phone, 120, "white"), (stat, 150, clr)]:
+    def sync_patrol(self, **_):
+        # Refreshes only the pages already on screen.
+        self.run_bg(self.patrol_pager.loaded, on_done=self.render_patrol)
+
+    def more_patrol(self):
+        self.patrol_more.configure(state="disabled")
+        self.run_bg(self.patrol_pager.next_page, on_done=lambda rows: self.render_patrol(rows, prune=False))
+
+    @timed_view
+    def render_patrol(self, rows, prune=True):
+        # Adds/removes only the rows that changed; surviving rows just get their status text refreshed.
+        live = {r[0] for r in rows}
+        if prune:
+            for rid in [rid for rid in self.patrol_rows if rid not in live]: self.patrol_rows.pop(rid)[0].destroy()
+        if self.patrol_pager.done: self.patrol_more.pack_forget()
+        else:
+            self.patrol_more.configure(state="normal")
+            self.patrol_more.pack(pady=5)
+
+        for rid, veh, b, s, name, phone in rows:
+            stat, clr = self.patrol_status(rid) if SCHEDULER.state(rid) else ("Syncing...", "gray")
+
+            if rid in self.patrol_rows:
+                self.patrol_rows[rid][1].configure(text=stat, text_color=clr)
+                continue
+            row = ctk.CTkFrame(self.patrol_scroll)
+            row.pack(fill="x", pady=2)
+            for d, w, c in [(veh, 100, "white"), (f"{b}-{s}", 80, "white"), (name, 150, "white"), (phone, 120, "white")]:
                 ctk.CTkLabel(row, text=d, width=w, text_color=c).pack(side="left", padx=5)
+            lbl = ctk.CTkLabel(row, text=stat, width=150, text_color=clr)
+            lbl.pack(side="left", padx=5)
             
             ctk.CTkButton(row, text="📞", width=40, fg_color=COLORS["brand_light"], 
                           command=lambda p=phone: messagebox.showinfo("Call", f"Calling {p}...")).pack(side="left")
+            self.patrol_rows[rid] = (row, lbl)
 
+        if self.patrol_rows: self.patrol_empty.pack_forget()
+        else: self.patrol_empty.configure(text="Premises Empty"); self.patrol_empty.pack(pady=20)
+
+    @timed_view
     def show_admin_gate(self):
         self.clear()
         ctk.CTkLabel(self.main, text="🚧 Gate Control (Cash Payments)", font=("Montserrat", 26, "bold"), text_color=COLORS["orange"]).pack(pady=10, anchor="w")
         
-        scroll = ctk.CTkScrollableFrame(self.main)
-        scroll.pack(fill="both", expand=True)
+        self.gate_scroll = ctk.CTkScrollableFrame(self.main)
+        self.gate_scroll.pack(fill="both", expand=True)
 
-        # Poll Database for Cash Pending status
-        with Database.get_connection() as conn:
-            rows = conn.execute("""
-                SELECT r.id, r.vehicle_number, r.fare, r.fine_amount, u.full_name
-                FROM reservations r JOIN users u ON r.user_id=u.id
-                WHERE r.payment_status='Cash_Pending'""").fetchall()
+        self.gate_rows = {}  # rid -> row frame
+        self.gate_empty = ctk.CTkLabel(self.gate_scroll, text="Loading...")
+        self.gate_empty.pack(pady=20)
+        self.sync_gate()
+        # Replaces the old 5 s self-rescheduling rebuild: rows change only when a cash event arrives.
+        self.listen("cash_pending_added", self.sync_gate)
+        self.listen("cash_pending_cleared", lambda rid: self.drop_gate_row(rid))
+        self.listen("db_changed", self.sync_gate)
+
+    def sync_gate(self, **_):
+        self.run_bg(lambda: Database.get_connection().execute("""
+            SELECT r.id, r.vehicle_number, r.fare, r.fine_amount, u.full_name
+            FROM reservations r JOIN users u ON r.user_id=u.id
+            WHERE r.payment_status='Cash_Pending'""").fetchall(), on_done=self.render_gate)
 
-        if not rows: ctk.CTkLabel(scroll, text="No vehicles waiting at gate.").pack(pady=20)
+    @timed_view
+    def render_gate(self, rows):
+        live = {r[0] for r in rows}
+        for rid in [rid for rid in self.gate_rows if rid not in live]: self.drop_gate_row(rid)
 
         for rid, veh, fare, fine, name in rows:
-            f = ctk.CTkFrame(scroll, fg_color=COLORS["card_bg"])
+            if rid in self.gate_rows: continue
+            f = ctk.CTkFrame(self.gate_scroll, fg_color=COLORS["card_bg"])
             f.pack(fill="x", pady=10)
             
             total = fare + fine
@@ -483,22 +3065,228 @@ class Dashboard(ctk.CTk):
             
             ctk.CTkButton(f, text="CONFIRM RECEIPT & OPEN GATE", fg_color=COLORS["green"], 
                           command=lambda r=rid: self.staff_collect_cash(r)).pack(side="right", padx=20)
+            self.gate_rows[rid] = f
 
-        # Auto-refresh every 5 seconds
-        self.after(5000, lambda: self.show_admin_gate() if hasattr(self, 'main') and self.main.winfo_exists() else None)
+        if self.gate_rows: self.gate_empty.pack_forget()
+        else: self.gate_empty.configure(text="No vehicles waiting at gate."); self.gate_empty.pack(pady=20)
+
+    def drop_gate_row(self, rid):
+        if rid in self.gate_rows: self.gate_rows.pop(rid).destroy()
+        if not self.gate_rows: self.gate_empty.configure(text="No vehicles waiting at gate."); self.gate_empty.pack(pady=20)
 
     def staff_collect_cash(self, rid):
-        with Database.get_connection() as conn:
-            # Mark Paid
-            conn.execute("UPDATE reservations SET status='completed', payment_status='Paid' WHERE id=?", (rid,))
-            # Free Slot
-            sid = conn.execute("SELECT slot_id FROM reservations WHERE id=?", (rid,)).fetchone()[0]
-            conn.execute("UPDATE parking_slots SET status='available' WHERE id=?", (sid,))
-            conn.commit()
-        messagebox.showinfo("Success", "Payment Recorded. Barrier Opened.")
-        self.show_admin_gate()
+        self.run_bg(ParkingEngine.collect_cash, rid, on_done=self.cash_collected)
+
+    def cash_collected(self, ok):
+        if ok: messagebox.showinfo("Success", "Payment Recorded. Barrier Opened.")
+        else:
+            messagebox.showwarning("!", "Already collected at another gate.")
+            self.sync_gate()
+
+    @timed_view
+    def show_analytics(self, days=7):
+        self.clear()
+        ctk.CTkLabel(self.main, text="📊 Occupancy & Revenue", font=("Montserrat", 26, "bold"), text_color=COLORS["gold"]).pack(pady=10, anchor="w")
+        bar = ctk.CTkFrame(self.main, fg_color="transparent")
+        bar.pack(fill="x")
+        ctk.CTkSegmentedButton(bar, values=["7", "30", "90"], command=lambda d: self.show_analytics(int(d))).pack(side="left", padx=5)
+        ctk.CTkLabel(bar, text="days").pack(side="left")
+        self.analytics_body = ctk.CTkScrollableFrame(self.main)
+        self.analytics_body.pack(fill="both", expand=True, pady=10)
+        loading = ctk.CTkLabel(self.analytics_body, text="Crunching reservations...", text_color="gray")
+        loading.pack(pady=20)
+        self.run_bg(Analytics.report, days, on_done=lambda rep: (loading.destroy(), self.render_analytics(rep, bar)))
+
+    @timed_view
+    def render_analytics(self, rep, bar):
+        from tkinter import filedialog
+        ctk.CTkButton(bar, text="Export CSV", fg_color=COLORS["brand_light"],
+                      command=lambda: (lambda d: d and messagebox.showinfo("Export", f"Saved to {Analytics.export_csv(rep, d)}"))(filedialog.askdirectory())).pack(side="right")
+        palette = ["#34C759", "#007AFF", "#FF9500", "#FF3B30", "#AF52DE", "#FFD700"]
+
+        # Occupancy curve per block
+        ctk.CTkLabel(self.analytics_body, text="Occupancy over time", font=("Roboto", 16, "bold")).pack(anchor="w", padx=10)
+        w, h = 860, 180
+        cv = tk.Canvas(self.analytics_body, width=w, height=h, bg=COLORS["card_bg"], highlightthickness=0)
+        cv.pack(padx=10, pady=5)
+        occ = rep["occupancy"]
+        top = max(occ.max(), 1) if occ.size else 1
+        for i, (block, series) in enumerate(zip(rep["blocks"], occ)):
+            if len(series) < 2: continue
+            pts = [v for k, y in enumerate(series) for v in (k * w / (len(series) - 1), h - 10 - y * (h - 20) / top)]
+            cv.create_line(*pts, fill=palette[i % len(palette)], width=2)
+            cv.create_text(10 + 60 * i, 10, text=f"Block {block}", fill=palette[i % len(palette)], anchor="w")
+
+        # Peak hours heatmap (weekday x hour of entry)
+        ctk.CTkLabel(self.analytics_body, text="Peak hours", font=("Roboto", 16, "bold")).pack(anchor="w", padx=10, pady=(10, 0))
+        cell = 30
+        hv = tk.Canvas(self.analytics_body, width=40 + 24 * cell, height=7 * cell + 20, bg=COLORS["card_bg"], highlightthickness=0)
+        hv.pack(padx=10, pady=5)
+        heat = rep["heatmap"]
+        peak = max(heat.max(), 1)
+        for d in range(7):
+            hv.create_text(20, 20 + d * cell + cell / 2, text=Analytics.DAYS[d], fill="white")
+            for hr in range(24):
+                g = int(255 * heat[d, hr] / peak)
+                hv.create_rectangle(40 + hr * cell, 20 + d * cell, 40 + (hr + 1) * cell, 20 + (d + 1) * cell, fill=f"#{g:02x}{g // 3:02x}33", outline=COLORS["card_bg"])
+        for hr in range(0, 24, 3): hv.create_text(40 + hr * cell + cell / 2, 10, text=f"{hr:02d}", fill="gray")
+
+        # Revenue by role / payment method, and overstay rate per block
+        ctk.CTkLabel(self.analytics_body, text="Revenue (collected / tariff)", font=("Roboto", 16, "bold")).pack(anchor="w", padx=10, pady=(10, 0))
+        for i, role in enumerate(Analytics.ROLES):
+            cells = [f"{m}: ₹{rep['revenue'][i, j]:.0f} / ₹{rep['tariff'][i, j]:.0f}" for j, m in enumerate(Analytics.METHODS) if rep["tariff"][i, j] or rep["revenue"][i, j]]
+            if cells: ctk.CTkLabel(self.analytics_body, text=f"{role:<8} " + "   ".join(cells), font=("Roboto", 13)).pack(anchor="w", padx=20)
+        ctk.CTkLabel(self.analytics_body, text="Overstay rate", font=("Roboto", 16, "bold")).pack(anchor="w", padx=10, pady=(10, 0))
+        for block, n, r in zip(rep["blocks"], rep["bookings"], rep["overstay_rate"]):
+            ctk.CTkLabel(self.analytics_body, text=f"Block {block}: {r:.1%} of {int(n)} bookings", font=("Roboto", 13)).pack(anchor="w", padx=20)
+
+    def show_diagnostics(self):
+        from tkinter import filedialog
+        self.clear()
+        ctk.CTkLabel(self.main, text="🩺 Diagnostics", font=("Montserrat", 26, "bold"), text_color=COLORS["gold"]).pack(pady=10, anchor="w")
+        bar = ctk.CTkFrame(self.main, fg_color="transparent")
+        bar.pack(fill="x")
+        ctk.CTkButton(bar, text="Refresh", fg_color=COLORS["brand_light"], command=self.show_diagnostics).pack(side="left", padx=5)
+        ctk.CTkButton(bar, text="Export", fg_color=COLORS["brand_light"],
+                      command=lambda: (lambda p: p and messagebox.showinfo("Export", f"Saved to {Metrics.export(p)}"))(filedialog.asksaveasfilename(defaultextension=".prom"))).pack(side="left", padx=5)
+        ctk.CTkLabel(bar, text=f"slow threshold {Metrics.slow_ms:.0f} ms", text_color="gray").pack(side="right")
+        body = ctk.CTkScrollableFrame(self.main)
+        body.pack(fill="both", expand=True, pady=10)
+        with Metrics.lock: timings, counters, slow = sorted(Metrics.timings.items(), key=lambda kv: -kv[1][1]), dict(Metrics.counters), list(Metrics.slow)
+
+        ctk.CTkLabel(body, text="   ".join(f"{k}: {v}" for k, v in sorted(counters.items())) or "No counters yet.", font=("Roboto", 13)).pack(anchor="w", padx=10, pady=5)
+        ctk.CTkLabel(body, text="Top operations by total time", font=("Roboto", 16, "bold")).pack(anchor="w", padx=10, pady=(10, 0))
+        for (kind, name), (n, total, mx) in timings[:25]:
+            ctk.CTkLabel(body, text=f"{kind:<4} {n:>6}×  avg {total / n:7.2f} ms  max {mx:7.2f} ms   {name}", font=("Courier", 12), anchor="w").pack(fill="x", padx=20)
+        ctk.CTkLabel(body, text="Slow operations", font=("Roboto", 16, "bold")).pack(anchor="w", padx=10, pady=(10, 0))
+        if not slow: ctk.CTkLabel(body, text="None over threshold.", text_color="gray").pack(anchor="w", padx=20)
+        for ts, kind, name, ms in reversed(slow):
+            ctk.CTkLabel(body, text=f"{time.strftime('%H:%M:%S', time.localtime(ts))}  {kind:<4} {ms:8.1f} ms   {name}", font=("Courier", 12), text_color=COLORS["red"], anchor="w").pack(fill="x", padx=20)
 
 if __name__ == "__main__":
-    Database.initialize()
-    app = SplashScreen()
-    app.mainloop()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Bennett Smart Parking kiosk")
+    parser.add_argument("--export-analytics", metavar="DIR", help="write occupancy/peak-hour/revenue/overstay CSVs to DIR and exit")
+    parser.add_argument("--days", type=int, default=30, help="report range for --export-analytics (default: 30)")
+    parser.add_argument("--analytics-bench", type=int, nargs="?", const=10_000_000, metavar="ROWS", help="report over ROWS/10 and ROWS (default: 10000000) reservations in a scratch database, print time and peak memory and exit")
+    parser.add_argument("--no-splash", action="store_true", help="open the login window directly (also BU_PARKING_SPLASH=0)")
+    parser.add_argument("--startup-bench", type=int, metavar="RUNS", help="launch RUNS fresh kiosks with and without the splash, report time-to-login and exit")
+    parser.add_argument("--startup-probe", action="store_true", help=argparse.SUPPRESS)
+    api = parser.add_argument_group("http api")
+    api.add_argument("--serve", metavar="HOST:PORT", nargs="?", const="127.0.0.1:8080", help="run the JSON API server instead of the kiosk UI (default: 127.0.0.1:8080)")
+    api.add_argument("--api-bench", type=int, metavar="CLIENTS", help="benchmark the API with CLIENTS concurrent simulated clients against a scratch database and exit")
+    lay = parser.add_argument_group("campus layout")
+    lay.add_argument("--layout", metavar="FILE", help="layout JSON applied (idempotently) at every start (also BU_PARKING_LAYOUT)")
+    lay.add_argument("--apply-layout", metavar="FILE", help="apply a layout JSON, print what changed and exit")
+    lay.add_argument("--layout-bench", action="store_true", help="seed a 50 000-slot campus into a scratch database, check it is under 1 s and idempotent, and exit")
+    gate = parser.add_argument_group("gate events")
+    gate.add_argument("--ingest", metavar="SOURCE", help="consume ANPR/barrier events from a JSON-lines log (followed like tail -F) or tcp:HOST:PORT")
+    gate.add_argument("--ingest-replay", metavar="FILE", help="ingest a recorded event log once, print stats and exit")
+    gate.add_argument("--ingest-bench", type=int, nargs="?", const=1_000_000, metavar="EVENTS", help="replay EVENTS synthetic events (default: 1000000) into a scratch database and exit")
+    diag = parser.add_argument_group("diagnostics")
+    diag.add_argument("--metrics", action="store_true", help="time SQL statements and view builds (also BU_PARKING_METRICS=1)")
+    diag.add_argument("--slow-ms", type=float, help=f"log operations slower than this (default: {Metrics.slow_ms:.0f})")
+    diag.add_argument("--render-bench", type=int, nargs="?", const=5, metavar="RUNS", help="time the slot map at 100, 1 000 and 10 000 slots (median of RUNS, default: 5) and exit; needs a display (e.g. xvfb-run)")
+    diag.add_argument("--epoch-bench", type=int, nargs="?", const=1_000_000, metavar="ROWS", help="time the patrol and history queries on ROWS reservations (default: 1000000) on text start_time and on the epoch columns, and exit")
+    diag.add_argument("--metrics-file", metavar="PATH", help="periodically write Prometheus text-format metrics to PATH")
+    acc = parser.add_argument_group("accounts")
+    acc.add_argument("--import-users", metavar="CSV", help=f"bulk-create users from a CSV with columns {','.join(Accounts.FIELDS)}, print counts and exit")
+    acc.add_argument("--auth-bench", type=int, nargs="?", const=100_000, metavar="USERS", help="import USERS generated users (default: 100000) into a scratch database, benchmark logins and exit")
+    load = parser.add_argument_group("load test")
+    load.add_argument("--loadtest", action="store_true", help="run the headless peak-hour benchmark against a scratch database and exit")
+    load.add_argument("--kiosks", type=int, default=4, help="concurrent kiosk processes (default: 4)")
+    load.add_argument("--users", type=int, default=500, help="users registered per kiosk (default: 500)")
+    load.add_argument("--seconds", type=float, default=30, help="length of the simulated 07:00-21:00 day, or of --api-bench (default: 30)")
+    load.add_argument("--peak-rate", type=float, default=50, help="total operations/s at the 8:45 peak (default: 50)")
+    load.add_argument("--db", help="scratch database path for the benchmarks (default: a new temp dir); target of --ingest/--ingest-replay/--import-users")
+    load.add_argument("--out", help="write the JSON report here instead of stdout")
+    load.add_argument("--compare", metavar="JSON", help="previous report to diff against")
+    load.add_argument("--conn-bench", type=int, nargs="?", const=2_000, metavar="OPS", help="book and check out OPS times (default: 2000) with a connection per call (the old layer) and with the pooled WAL connections, and exit")
+    load.add_argument("--overstay-bench", type=int, nargs="?", const=50_000, metavar="ACTIVE", help="time overstay ticks with ACTIVE (default: 50000) and ACTIVE/10 active reservations and exit")
+    load.add_argument("--archive-bench", type=int, nargs="?", const=5, metavar="YEARS", help="time the active-session queries with YEARS (default: 5) of history, archive it while booking, time them again, and exit")
+    load.add_argument("--alloc-bench", type=int, nargs="?", const=16, metavar="THREADS", help="benchmark best-slot allocation at 10 000 slots with THREADS requesters per kiosk (default: 16)")
+    args = parser.parse_args()
+    logging.basicConfig(format="%(asctime)s %(name)s %(levelname)s %(message)s")
+    Metrics.enabled = Metrics.enabled or args.metrics or bool(args.metrics_file)
+    if args.slow_ms is not None: Metrics.slow_ms = args.slow_ms
+    if args.metrics_file: Metrics.export_path = args.metrics_file
+
+    if args.loadtest:
+        result = LoadTest.run(args.kiosks, args.users, args.seconds, args.peak_rate, args.db)
+        if args.compare:
+            with open(args.compare) as f: result["diff"] = LoadTest.compare(result, json.load(f))
+        if args.out:
+            with open(args.out, "w") as f: json.dump(result, f, indent=2)
+        else: print(json.dumps(result, indent=2))
+        sys.exit()
+
+    if args.layout: Layout.path = args.layout
+    if args.layout_bench:
+        result = Layout.bench(args.db)
+        print(json.dumps(result, indent=2))
+        sys.exit(0 if result["ok"] else 1)
+    if args.apply_layout:
+        if args.db: Database.DB_NAME = args.db
+        Layout.path = None
+        Database.initialize()
+        try: print(json.dumps(Layout.apply(Layout.load(args.apply_layout)), indent=2))
+        except ValueError as e: parser.error(f"{args.apply_layout}: {e}")
+        sys.exit()
+    if args.conn_bench:
+        print(json.dumps(Database.bench(args.conn_bench), indent=2))
+        sys.exit()
+    if args.overstay_bench:
+        print(json.dumps(OverstayScheduler.bench(args.overstay_bench, args.db), indent=2))
+        sys.exit()
+    if args.archive_bench:
+        print(json.dumps(Archiver.bench(args.archive_bench, db=args.db), indent=2))
+        sys.exit()
+    if args.epoch_bench:
+        print(json.dumps(Database.epoch_bench(args.epoch_bench, args.db), indent=2))
+        sys.exit()
+    if args.alloc_bench:
+        print(json.dumps(AllocBench.run(args.kiosks, args.alloc_bench, args.seconds, db=args.db), indent=2))
+        sys.exit()
+    if args.import_users:
+        if args.db: Database.DB_NAME = args.db
+        Database.initialize()
+        try: print(json.dumps(Accounts.import_csv(args.import_users), indent=2))
+        except ValueError as e: parser.error(f"{args.import_users}: {e}")
+        sys.exit()
+    if args.auth_bench:
+        print(json.dumps(Accounts.bench(args.auth_bench, args.db), indent=2))
+        sys.exit()
+    if args.ingest_bench:
+        print(json.dumps(GateIngest.bench(args.ingest_bench, args.db), indent=2))
+        sys.exit()
+    if args.ingest or args.ingest_replay:
+        if args.db: Database.DB_NAME = args.db
+        Database.initialize()
+        try: print(json.dumps(GateIngest.run(args.ingest or args.ingest_replay, follow=bool(args.ingest)), indent=2))
+        except OSError as e: parser.error(str(e))
+        sys.exit()
+    if args.api_bench:
+        print(json.dumps(ApiBench.run(args.api_bench, args.seconds, args.db), indent=2))
+        sys.exit()
+    if args.serve:
+        host, _, port = args.serve.rpartition(":")
+        ApiServer.serve(host or "127.0.0.1", int(port))
+        sys.exit()
+
+    if args.render_bench:
+        try: print(json.dumps(SlotMap.bench(runs=args.render_bench), indent=2))
+        except tk.TclError as e: parser.error(f"--render-bench: {e}")
+        sys.exit()
+    if args.startup_bench:
+        print(json.dumps(Startup.bench(args.startup_bench), indent=2))
+        sys.exit()
+
+    if args.analytics_bench:
+        print(json.dumps(Analytics.bench(args.analytics_bench, args.db), indent=2))
+        sys.exit()
+    if args.export_analytics:
+        Database.initialize()
+        print(Analytics.export_csv(Analytics.report(args.days), args.export_analytics))
+        sys.exit()
+    Startup.splash = Startup.splash and not args.no_splash
+    Startup.probe = args.startup_probe
+    AuthWindow().mainloop()
\ No newline at end of file
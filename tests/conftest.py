@@ -0,0 +1,109 @@
+import importlib.util
+import os
+import sys
+import time
+import types
+from concurrent import futures
+
+import pytest
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "BU smart parking system.py")
+
+
+def load_app():
+    # The app is a single script with a space in its name; import it once under a module name that forked
+    # worker processes (multiprocessing) can resolve.
+    if "bu_parking" not in sys.modules:
+        spec = importlib.util.spec_from_file_location("bu_parking", APP)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules["bu_parking"] = module
+        spec.loader.exec_module(module)
+    return sys.modules["bu_parking"]
+
+
+@pytest.fixture(scope="session")
+def app():
+    return load_app()
+
+
+@pytest.fixture
+def db(app, tmp_path, monkeypatch):
+    # A fresh scratch database with the default layout, indexes and schedulers loaded, as a kiosk has after startup.
+    monkeypatch.setattr(app.Database, "DB_NAME", str(tmp_path / "parking.db"))
+    monkeypatch.setattr(app.Accounts, "ITERATIONS", app.Accounts.BENCH_ITERATIONS)
+    monkeypatch.setattr(app.Layout, "path", None)
+    app.Database.initialize()
+    app.OCCUPANCY.load()
+    app.SCHEDULER.load()
+    yield app.Database.DB_NAME
+    app.Database.close()
+
+
+class Widget:
+    # Stands in for every CTk widget a view builds: accepts any constructor arguments and method calls.
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+
+@pytest.fixture
+def kiosk(app, db, monkeypatch):
+    # A dashboard without a display: the real pump (BackgroundTasks), watcher, per-view subscriptions and Gate Control
+    # view of Dashboard, with CTk widgets stubbed and Tk's after()/after_cancel() replaced by timers on a fake
+    # millisecond clock that run() advances.
+    monkeypatch.setattr(app, "ctk", types.SimpleNamespace(**{name: Widget for name in dir(app.ctk) if name.startswith("CTk")}))
+
+    class Kiosk(app.BackgroundTasks):
+        POLL_MS = 0  # poll the watcher on every pump
+        on_pump, listen, clear = app.Dashboard.on_pump, app.Dashboard.listen, app.Dashboard.clear
+        show_admin_gate, sync_gate, render_gate, drop_gate_row = (app.Dashboard.show_admin_gate, app.Dashboard.sync_gate,
+                                                                  app.Dashboard.render_gate, app.Dashboard.drop_gate_row)
+
+        def __init__(self):
+            self.clock, self.timers, self.seq, self.slowest = 0, {}, 0, 0
+            self.main = types.SimpleNamespace(winfo_children=list)
+            self.view_subs, self.watcher = [], app.ChangeWatcher()
+            self.watch_job, self.next_watch, self.tick_job = None, 0, None
+            self.archive_job, self.next_archive = None, 0
+            self.metrics_job, self.next_metrics = None, 0
+            self.init_background()
+
+        def bg_failed(self, err):
+            raise err  # instead of a message box
+
+        def after(self, ms, fn):
+            self.seq += 1
+            self.timers[self.seq] = (self.clock + ms, fn)
+            return self.seq
+
+        def after_cancel(self, job):
+            self.timers.pop(job, None)
+
+        def run(self, ms):
+            # Fires every timer due within the next `ms`, in order; slowest is the longest a callback held the "Tk thread".
+            end = self.clock + ms
+            while self.timers:
+                job, (at, fn) = min(self.timers.items(), key=lambda t: t[1][0])
+                if at > end: break
+                del self.timers[job]
+                self.clock = at
+                t = time.perf_counter()
+                fn()
+                self.slowest = max(self.slowest, time.perf_counter() - t)
+            self.clock = end
+
+        def settle(self):
+            # Pumps until the background work (and whatever its callbacks started) is done and delivered.
+            while True:
+                futures.wait([f for f in (self.watch_job, self.tick_job, self.archive_job, *self.view_jobs) if f])
+                if self.ui_queue.empty(): return
+                self.run(self.PUMP_MS)
+
+    k = Kiosk()
+    yield k
+    k.clear()
+    k.stop_background()
+    futures.wait([f for f in (k.watch_job, k.tick_job, k.archive_job) if f])
+    k.watcher.close()
@@ -0,0 +1,20 @@
+def test_report_counts_cars_parked_before_the_range(app, db):
+    uid = app.Accounts.register("stu", "pw", "Stu", "s@x.in", "9", "Student", 1)
+    sid, block = app.Database.get_connection().execute("SELECT id, block FROM parking_slots ORDER BY id LIMIT 1").fetchone()
+    until = 1_700_000_000 - 1_700_000_000 % 3600
+    since = until - 86400
+    conn = app.Database.get_connection()
+    with conn:
+        conn.executemany("""INSERT INTO reservations (user_id, slot_id, vehicle_number, start_ts, end_ts, duration, fare, payment_method, status)
+                            VALUES (?, ?, 'X', ?, ?, ?, ?, 'UPI', 'completed')""",
+                         [(uid, sid, since - 7200, since + 3 * 3600, 5, 100.0),         # parked before the range opens
+                          (uid, sid, since + 10 * 3600, since + 12 * 3600, 2, 40.0),  # within it
+                          (uid, sid, since - 9 * 3600, since - 3600, 8, 160.0)])      # over before it opens
+    rep = app.Analytics.report(1, until)
+    occ = rep["occupancy"][rep["blocks"].index(block)]
+    assert list(occ[:4]) == [1, 1, 1, 0]  # in from the first hour, not from 0
+    assert list(occ[10:13]) == [1, 1, 0]
+    assert occ.sum() == 5
+    # Bookings, revenue and the heatmap cover only the booking made within the range.
+    assert rep["bookings"].sum() == 1 and rep["heatmap"].sum() == 1
+    assert rep["revenue"].sum() == 40.0
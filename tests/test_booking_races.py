@@ -0,0 +1,57 @@
+import multiprocessing
+import random
+import sys
+import time
+
+PROCESSES = 6
+
+
+def kiosk(uid, sids, best, start, results):
+    # One kiosk process: tries every slot in `sids` (in its own order) and reports the reservation ids it won.
+    app = sys.modules["bu_parking"]  # inherited through fork
+    sids = random.Random(uid).sample(sids, len(sids))
+    app.OCCUPANCY.load()
+    start.wait()
+    won = []
+    for sid in sids:
+        if best: rid = app.ParkingEngine.book_best(uid, "Student", 0, "Car", f"HR26AB{uid:04d}", 1)[0]
+        else: rid = app.ParkingEngine.book(uid, sid, f"HR26AB{uid:04d}", 1, 20.0)
+        if rid: won.append(rid)
+        time.sleep(0.001)  # lets the others interleave even on a single core
+    app.Database.close()
+    results.put(won)
+
+
+def race(app, best):
+    # ({slot_id: active reservations}, per-process reservation ids won, active reservation ids in the DB)
+    ctx = multiprocessing.get_context("fork")
+    sids = sorted(app.OCCUPANCY.slots)
+    uids = [app.Accounts.register(f"kiosk{i}", "pw", "K", "k@x.in", "9", "Student", 1) for i in range(PROCESSES)]
+    app.Database.close()  # the children open their own connections
+    start, results = ctx.Barrier(PROCESSES), ctx.Queue()
+    procs = [ctx.Process(target=kiosk, args=(uid, sids, best, start, results)) for uid in uids]
+    for p in procs: p.start()
+    won = [results.get(timeout=60) for _ in procs]
+    for p in procs: p.join()
+    assert all(p.exitcode == 0 for p in procs)
+    conn = app.Database.get_connection()
+    per_slot = dict(conn.execute("SELECT slot_id, count(*) FROM reservations WHERE status='active' GROUP BY slot_id"))
+    return per_slot, won, [r[0] for r in conn.execute("SELECT id FROM reservations WHERE status='active' ORDER BY id")]
+
+
+def test_same_slots_from_many_processes(app, db):
+    per_slot, won, active = race(app, best=False)
+    assert set(per_slot.values()) == {1}
+    assert sorted(per_slot) == sorted(app.OCCUPANCY.slots)  # every slot went to exactly one kiosk
+    assert sorted(r for w in won for r in w) == active
+    assert sum(1 for w in won if w) > 1  # the kiosks really did contend
+
+
+def test_best_slot_from_many_processes(app, db):
+    # Each kiosk's index goes stale as soon as another one books; the conditional UPDATE must still settle every race.
+    per_slot, won, active = race(app, best=True)
+    cars = {sid for b in app.OCCUPANCY.type_blocks("Car") for sid in app.OCCUPANCY.blocks[b]}
+    assert set(per_slot.values()) == {1}
+    assert set(per_slot) == cars
+    assert sorted(r for w in won for r in w) == active
+    assert sum(1 for w in won if w) > 1
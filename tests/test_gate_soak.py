@@ -0,0 +1,60 @@
+import random
+import sqlite3
+import threading
+import time
+
+HOURS = 6
+MINUTES = 60  # one burst of gate activity per simulated minute
+
+
+def other_kiosk(path):
+    # Books and checks out through its own connection under another writer name, as a second kiosk process would.
+    conn = sqlite3.connect(path, isolation_level=None)
+
+    def write(*statements):
+        conn.execute("BEGIN IMMEDIATE")
+        for sql, params in statements: conn.execute(sql, params)
+        conn.execute("INSERT INTO commit_counts VALUES ('other-kiosk', 1) ON CONFLICT(writer) DO UPDATE SET commits=commits+1")
+        conn.execute("COMMIT")
+    return conn, write
+
+
+def test_gate_control_soak(app, kiosk, db):
+    rnd = random.Random(1)
+    uid = app.Accounts.register("stu", "pw", "Stu", "s@x.in", "9", "Student", 1)
+    conn, write = other_kiosk(db)
+    kiosk.show_admin_gate()
+    kiosk.settle()
+    handlers = sum(len(h) for h in app.BUS.handlers.values())
+    threads = threading.active_count()
+    cpu = []
+    for hour in range(HOURS):
+        start = time.process_time()
+        for minute in range(MINUTES):
+            rid, sid = app.ParkingEngine.book_best(uid, "Student", 0, rnd.choice(("Car", "Bike")), "HR26DK0001", 1)
+            app.ParkingEngine.request_cash(rid, 20.0, 0)
+            pending = [r for r, in conn.execute("SELECT id FROM reservations WHERE payment_status='Cash_Pending' AND status='active'")]
+            if len(pending) > 5: app.ParkingEngine.collect_cash(rnd.choice(pending))
+            if minute % 3 == 0:
+                # A cash booking made at another kiosk, and one of the waiting cars let out there.
+                free = rnd.choice(sorted(app.OCCUPANCY.free_slots("A") or app.OCCUPANCY.free_slots("B")))
+                write(("UPDATE parking_slots SET status='occupied' WHERE id=?", (free,)),
+                      ("INSERT INTO reservations (user_id, slot_id, vehicle_number, start_ts, end_ts, fare, payment_method, payment_status) "
+                       "VALUES (?, ?, 'X', 0, 3600, 20, 'Cash', 'Cash_Pending')", (uid, free)))
+                gone = rnd.choice(pending or [rid])
+                write(("UPDATE reservations SET status='completed', payment_status='Paid' WHERE id=?", (gone,)),
+                      ("UPDATE parking_slots SET status='available' WHERE id=(SELECT slot_id FROM reservations WHERE id=?)", (gone,)))
+            active = [r for r, in conn.execute("SELECT id FROM reservations WHERE status='active' AND payment_status!='Cash_Pending'")]
+            for r in active: app.ParkingEngine.pay_upi(r, 20.0, 0)
+            kiosk.settle()
+            assert len(kiosk.timers) == 1  # only the pump, however much happened
+            assert kiosk.gate_rows.keys() == set(r for r, in conn.execute("SELECT id FROM reservations WHERE payment_status='Cash_Pending' AND status='active'"))
+        cpu.append(time.process_time() - start)
+        assert sum(len(h) for h in app.BUS.handlers.values()) == handlers
+        assert threading.active_count() <= threads + app.WORKER._max_workers
+        kiosk.show_admin_gate()  # switching views must not leave subscriptions behind either
+        kiosk.settle()
+    conn.close()
+    # Flat after the first (warm-up) hour, not growing with the hours already simulated, as the old per-collect
+    # refresh loops made it.
+    assert max(cpu[1:]) < 2 * min(cpu[1:]) + 0.05, cpu
@@ -0,0 +1,75 @@
+import threading
+import time
+
+
+def seed(app, uid, n, first_id):
+    # n finished bookings for uid, one a day going back, the older half already archived.
+    conn = app.Database.get_connection()
+    now, half = int(time.time()), n // 2
+    rows = [(first_id + i, uid, 1 + i % 30, "HR26DK0001", now - i * 86400, now - i * 86400 + 3600, 1, 20.0, "completed", "Paid") for i in range(n)]
+    cols = "(id, user_id, slot_id, vehicle_number, start_ts, end_ts, duration, fare, status, payment_status) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+    with conn:
+        conn.executemany("INSERT INTO reservations " + cols, rows[:half])
+        conn.executemany("INSERT INTO reservations_archive " + cols, rows[half:])
+
+
+def open_history(app, uid):
+    # Builds the pager show_history builds and loads its first page: (rows, SQLite VM steps / 10, seconds).
+    pager = app.KeysetPager("""r.id, r.vehicle_number, ps.block, ps.slot_number, r.end_ts, r.fare, r.status, r.payment_status,
+                               r.status='active' AND r.end_ts + ? < CAST(strftime('%s', 'now') AS INTEGER)""",
+                            "FROM {table} r JOIN parking_slots ps ON r.slot_id = ps.id", "r.user_id=?",
+                            (app.FINE_THRESHOLD_MINUTES * 60, uid), key="r.start_ts", tables=("reservations", "reservations_archive"))
+    steps = [0]
+    conn = app.Database.get_connection()
+    conn.set_progress_handler(lambda: steps.__setitem__(0, steps[0] + 1), 10)
+    t = time.perf_counter()
+    try: page = pager.next_page()
+    finally: conn.set_progress_handler(None, 0)
+    return page, steps[0], time.perf_counter() - t
+
+
+def test_history_costs_the_same_at_10_and_100000_rows(app, db):
+    users, cost = {}, {}
+    for n, first_id in ((10, 1), (100, 1_001), (100_000, 10_001)):
+        users[n] = app.Accounts.register(f"user{n}", "pw", "U", "u@x.in", "9", "Faculty", 1), first_id
+        seed(app, users[n][0], n, first_id)
+    app.Database.get_connection().execute("ANALYZE")
+    for uid, _ in users.values(): open_history(app, uid)  # warm the page cache
+    for n, (uid, first_id) in users.items():
+        page, steps, seconds = min((open_history(app, uid) for _ in range(5)), key=lambda r: r[2])
+        assert len(page) == min(n, 50) and page[0][0] == first_id  # newest first
+        cost[n] = steps, seconds
+    # A page reads at most page_size rows per table through idx_res_user_start_ts / idx_arch_user_start_ts,
+    # so 100 000 rows cost what 100 do, and 10 rows (a partial page) less.
+    assert cost[100_000][0] <= 1.2 * cost[100][0], cost
+    assert cost[10][0] <= cost[100][0], cost
+    assert cost[100_000][1] < 3 * cost[100][1] + 0.002, cost
+
+
+class ArchivingMidRead:
+    # The pooled connection, except that right after the hot table is read an Archiver batch commits from another thread.
+    def __init__(self, app, conn):
+        self.app, self.conn = app, conn
+
+    def __getattr__(self, name):
+        return getattr(self.conn, name)
+
+    def execute(self, sql, *args):
+        cur = self.conn.execute(sql, *args)
+        if "FROM reservations r" not in sql: return cur
+        rows = cur.fetchall()
+        worker = threading.Thread(target=self.app.Archiver.run_batch)
+        worker.start()
+        worker.join()
+        return iter(rows)
+
+
+def test_history_page_reads_one_snapshot_while_archiving(app, db, monkeypatch):
+    uid = app.Accounts.register("stu", "pw", "Stu", "s@x.in", "9", "Student", 1)
+    seed(app, uid, 120, 1)  # 60 hot, 60 archived
+    pager = app.KeysetPager("r.id", "FROM {table} r", "r.user_id=?", (uid,), tables=("reservations", "reservations_archive"))
+    conn, pooled, here = app.Database.get_connection(), app.Database.get_connection, threading.current_thread()
+    monkeypatch.setattr(app.Database, "get_connection", staticmethod(lambda: ArchivingMidRead(app, conn) if threading.current_thread() is here else pooled()))
+    page = [rid for rid, in pager.next_page()]
+    assert page == list(range(1, 51))  # newest first, each once
+    assert conn.execute("SELECT count(*) FROM reservations_archive").fetchone()[0] == 120  # the batch did commit mid-read
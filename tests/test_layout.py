@@ -0,0 +1,39 @@
+import time
+
+
+def slot(app, block, n):
+    return app.Database.get_connection().execute("SELECT id, type, active FROM parking_slots WHERE block=? AND slot_number=?", (block, n)).fetchone()
+
+
+def test_campus_seed_is_fast_and_reapply_is_a_no_op(app, db):
+    spec = app.Layout.campus()
+    t = time.perf_counter()
+    seed = app.Layout.apply(spec)
+    seconds = time.perf_counter() - t
+    assert seed["added"] == seed["slots"] == 50_000
+    assert seconds < 1.0, f"50 000-slot seed took {seconds:.2f} s"
+    again = app.Layout.apply(spec)
+    assert (again["added"], again["updated"], again["retired"], again["deferred"]) == (0, 0, 0, 0)
+
+
+def test_shrink_retires_and_occupied_slots_are_deferred(app, db):
+    spec = {"blocks": [{"block": "X", "type": "Car", "slots": 5}, {"block": "Y", "type": "Car", "slots": 3}]}
+    app.Layout.apply(spec)
+    app.OCCUPANCY.load()
+    uid = app.Accounts.register("stu", "pw", "Stu", "s@x.in", "9", "Student", 1)
+    parked = [app.ParkingEngine.book(uid, slot(app, b, n)[0], "HR26DK0001", 1, 20) for b, n in (("X", 5), ("Y", 1))]
+
+    # X shrinks to 3 slots and Y turns into a bike block while X-5 and Y-1 are occupied.
+    spec["blocks"][0]["slots"], spec["blocks"][1]["type"] = 3, "Bike"
+    edit = app.Layout.apply(spec)
+    assert (edit["retired"], edit["updated"], edit["deferred"]) == (1, 2, 2)
+    assert slot(app, "X", 4)[2] == 0  # free, so retired
+    assert slot(app, "X", 5)[2] == 1  # occupied: neither retired...
+    assert slot(app, "Y", 1)[1:] == ("Car", 1)  # ...nor retyped
+    assert slot(app, "Y", 2)[1] == "Bike"
+
+    # Once the vehicles have left, the next apply catches up.
+    for rid in parked: app.ParkingEngine.pay_upi(rid, 20.0, 0)
+    later = app.Layout.apply(spec)
+    assert (later["retired"], later["updated"], later["deferred"]) == (1, 1, 0)
+    assert slot(app, "X", 5)[2] == 0 and slot(app, "Y", 1)[1] == "Bike"
@@ -0,0 +1,57 @@
+import sqlite3
+import time
+
+
+class View:
+    # A dashboard view for timed_view whose refresh adds `new` widgets to the screen.
+    def __init__(self, widget=None, new=0):
+        self.widget, self.new = widget, new
+
+    def refresh(self):
+        for _ in range(self.new): self.widget()
+        return 1
+
+
+def per_call(fn, n=200_000):
+    t = time.perf_counter()
+    for _ in range(n): fn()
+    return (time.perf_counter() - t) / n
+
+
+def test_overhead_when_disabled(app, db, monkeypatch):
+    monkeypatch.setattr(app.Metrics, "enabled", False)
+    monkeypatch.setattr(app.Metrics, "timings", {})
+    monkeypatch.setattr(app.Metrics, "counters", {})
+    app.Database.close()
+    # Plain connections: statements run exactly as without the instrumentation layer.
+    assert type(app.Database.get_connection()) is sqlite3.Connection
+    uid = app.Accounts.register("stu", "pw", "Stu", "s@x.in", "9", "Student", 1)
+    for _ in range(20):
+        rid, _ = app.ParkingEngine.book_best(uid, "Student", 0, "Car", "HR26DK0001", 1)
+        app.ParkingEngine.pay_upi(rid, 20.0, 0)
+    assert app.Metrics.timings == {} and app.Metrics.counters == {}
+    # A disabled timed_view is one attribute check on top of the call.
+    view, timed = View(), app.timed_view(View.refresh)
+    plain = min(per_call(lambda: View.refresh(view)) for _ in range(3))
+    wrapped = min(per_call(lambda: timed(view)) for _ in range(3))
+    assert wrapped - plain < 2e-6, (plain, wrapped)  # views take milliseconds
+
+
+def test_widget_counter_counts_only_new_widgets(app, monkeypatch):
+    monkeypatch.setattr(app.Metrics, "enabled", True)
+    monkeypatch.setattr(app.Metrics, "timings", {})
+    monkeypatch.setattr(app.Metrics, "counters", {})
+    monkeypatch.setattr(app.Metrics, "widgets_built", None)
+    # Widgets without a display: the hook wraps this stub, and both are undone after the test.
+    monkeypatch.setattr(app.tk.BaseWidget, "__init__", lambda self, *args, **kw: None)
+    widget = type("Widget", (app.tk.BaseWidget,), {})
+    timed = app.timed_view(View.refresh)
+    assert timed(View(widget, 7)) == 1
+    assert app.Metrics.counters["widgets_created_total"] == 7
+    for _ in range(20): widget()  # built outside a timed view
+    # A refresh that adds nothing counts nothing, however many widgets are already on screen; one that adds 3 counts 3.
+    timed(View(widget, 0))
+    assert app.Metrics.counters["widgets_created_total"] == 7
+    timed(View(widget, 3))
+    assert app.Metrics.counters["widgets_created_total"] == 10
+    assert app.Metrics.timings[("view", "refresh")][0] == 3
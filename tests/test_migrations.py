@@ -0,0 +1,41 @@
+import sqlite3
+import threading
+
+
+def test_password_hashing_migration_leaves_the_write_lock_free(app, tmp_path, monkeypatch):
+    # A database from before salted hashes: 12 users with plaintext passwords.
+    path = str(tmp_path / "old.db")
+    old = sqlite3.connect(path)
+    old.execute("""CREATE TABLE users (id INTEGER PRIMARY KEY AUTOINCREMENT, username TEXT UNIQUE, password TEXT, full_name TEXT,
+                   email TEXT, phone TEXT, role TEXT, is_member INTEGER DEFAULT 0)""")
+    old.executemany("INSERT INTO users (username, password, full_name, role) VALUES (?, ?, 'U', 'Student')", [(f"u{i}", f"pw{i}") for i in range(12)])
+    old.commit()
+    old.close()
+    monkeypatch.setattr(app.Database, "DB_NAME", path)
+    monkeypatch.setattr(app.Accounts, "ITERATIONS", app.Accounts.BENCH_ITERATIONS)
+    monkeypatch.setattr(app.Layout, "path", None)
+
+    # While each password is hashed, another kiosk writes without waiting (timeout=0 fails on a held lock).
+    full_hash, lock, hashed = app.Accounts.hash, threading.Lock(), []
+
+    def hash(password, iterations=None):
+        with lock:
+            other = sqlite3.connect(path, timeout=0, isolation_level=None)
+            other.execute("BEGIN IMMEDIATE")
+            other.execute("UPDATE users SET phone='1' WHERE username='u0'")
+            other.execute("COMMIT")
+            other.close()
+            hashed.append(password)
+        return full_hash(password, iterations)
+
+    monkeypatch.setattr(app.Accounts, "hash", staticmethod(hash))
+    try:
+        app.Database.initialize()
+        conn = app.Database.get_connection()
+        assert sorted(hashed) == sorted(f"pw{i}" for i in range(12))
+        assert all(pw.startswith("pbkdf2_sha256$") for pw, in conn.execute("SELECT password FROM users"))
+        assert conn.execute("SELECT 1 FROM schema_version WHERE version=7").fetchone()
+        assert app.Accounts.login("u3", "pw3")[1] == "u3"
+        assert app.Accounts.login("u3", "pw4") is None
+    finally:
+        app.Database.close()
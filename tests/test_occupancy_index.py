@@ -0,0 +1,74 @@
+import random
+import sqlite3
+
+import pytest
+
+
+def state(idx):
+    with idx.lock:
+        return {b: set(f) for b, f in idx.free.items()}, dict(idx.owner)
+
+
+def check(app):
+    # The live index against a fresh read of the DB, which is what reconcile() would install.
+    _, _, free, owner, _, _ = app.OCCUPANCY.read()
+    live_free, live_owner = state(app.OCCUPANCY)
+    assert live_free == free
+    assert live_owner == owner
+    for b, heap in app.OCCUPANCY.heaps.items():
+        assert {sid for _, sid in heap if sid not in app.OCCUPANCY.owner} == free[b]  # every free slot is claimable
+
+
+class Foreign:
+    # Another kiosk: writes through its own connection, so this process's index only learns of it via reconcile().
+    def __init__(self, path, uid):
+        self.conn, self.uid = sqlite3.connect(path, isolation_level=None), uid
+
+    def book(self, sid):
+        self.conn.execute("BEGIN IMMEDIATE")
+        if self.conn.execute("UPDATE parking_slots SET status='occupied' WHERE id=? AND status='available'", (sid,)).rowcount:
+            self.conn.execute("INSERT INTO reservations (user_id, slot_id, vehicle_number, start_ts, end_ts, fare) VALUES (?, ?, 'X', 0, 3600, 1)",
+                              (self.uid, sid))
+        self.conn.execute("COMMIT")
+
+    def release(self, rid):
+        self.conn.execute("BEGIN IMMEDIATE")
+        sid = self.conn.execute("SELECT slot_id FROM reservations WHERE id=?", (rid,)).fetchone()[0]
+        self.conn.execute("UPDATE reservations SET status='completed' WHERE id=?", (rid,))
+        self.conn.execute("UPDATE parking_slots SET status='available' WHERE id=?", (sid,))
+        self.conn.execute("COMMIT")
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_index_matches_db_after_random_operations(app, db, seed):
+    rnd = random.Random(seed)
+    uids = [app.Accounts.register(f"u{i}", "pw", "U", "u@x.in", "9", rnd.choice(("Student", "Faculty", "Staff")), 1) for i in range(8)]
+    other = Foreign(db, uids[0])
+    conn = app.Database.get_connection()
+    sids = sorted(app.OCCUPANCY.slots)
+    dirty = False
+    for _ in range(400):
+        active = [r for r, in conn.execute("SELECT id FROM reservations WHERE status='active'")]
+        op = rnd.random()
+        uid = rnd.choice(uids)
+        if op < 0.25: app.ParkingEngine.book(uid, rnd.choice(sids), "HR26DK0001", 1, 20.0)
+        elif op < 0.45: app.ParkingEngine.book_best(uid, "Student", 0, rnd.choice(("Car", "Bike")), "HR26DK0002", 1)
+        elif op < 0.6 and active: app.ParkingEngine.pay_upi(rnd.choice(active), 20.0, 0)
+        elif op < 0.7 and active:
+            rid = rnd.choice(active)
+            app.ParkingEngine.request_cash(rid, 20.0, 0)
+            app.ParkingEngine.collect_cash(rid)
+        elif op < 0.8:
+            other.book(rnd.choice(sids))
+            dirty = True
+        elif op < 0.9 and active:
+            other.release(rnd.choice(active))
+            dirty = True
+        else:
+            drift = app.OCCUPANCY.reconcile()
+            assert dirty or not drift  # nothing to pick up unless another kiosk wrote
+            dirty = False
+        if not dirty: check(app)
+    app.OCCUPANCY.reconcile()
+    check(app)
+    other.conn.close()
@@ -0,0 +1,115 @@
+import asyncio
+import re
+import sqlite3
+
+import pytest
+
+# Every statement a kiosk day issues (booking, payment, cash desk, overstay fines, archiving, gate ingest, imports,
+# analytics and the API's history/patrol pages, which share their SQL with the dashboard) is traced and run through
+# EXPLAIN QUERY PLAN. A table may only be scanned through a partial index, whose WHERE bounds the scan to live rows.
+HOT = ("reservations", "reservations_archive", "users", "gate_events", "daily_rollups")
+# The only statements allowed to read every row of the small tables (slots, per-process commit counters), by design.
+SMALL = ("parking_slots", "commit_counts")
+WHOLE_TABLE = {
+    "FROM parking_slots ps LEFT JOIN reservations r": "OccupancyIndex.read loads the whole slot grid",
+    "SELECT id, block FROM parking_slots": "Analytics.report maps every slot to its block",
+    "FROM commit_counts WHERE writer": "ChangeWatcher.poll sums the other writers' commits (one row per kiosk process)",
+}
+ALIAS = re.compile(r"\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(?!(?:WHERE|JOIN|LEFT|ON|ORDER|GROUP|LIMIT)\b)(\w+))?", re.I)
+
+
+@pytest.fixture
+def traced(app, db, monkeypatch):
+    statements = []
+    connect = sqlite3.connect
+
+    def tracing(*args, **kwargs):
+        conn = connect(*args, **kwargs)
+        conn.set_trace_callback(statements.append)
+        return conn
+
+    app.Database.close()
+    monkeypatch.setattr(sqlite3, "connect", tracing)
+    yield statements
+
+
+def workload(app, tmp_path):
+    uid = app.Accounts.register("stu1", "pw", "Student One", "s1@x.in", "9000000001", "Student")
+    app.Accounts.register("staff1", "pw", "Staff One", "st@bennett.edu.in", "9000000002", "Staff")
+    assert app.Accounts.login("stu1", "pw")[0] == uid
+    assert app.Accounts.login("stu1", "wrong") is None
+    assert app.Accounts.login("nobody", "pw") is None
+    app.Accounts.profile(uid)
+    users = tmp_path / "users.csv"
+    users.write_text("username,password,full_name,email,phone,role\nimp1,pw,Imp One,i@x.in,9000000003,student\n")
+    app.Accounts.import_csv(str(users))
+
+    rids = [app.ParkingEngine.book_best(uid, "Student", 0, "Car", f"HR26DK{i:04d}", 1)[0] for i in range(4)]
+    conn = app.Database.get_connection()
+    with conn: conn.execute("UPDATE reservations SET end_ts=end_ts-7200 WHERE id=?", (rids[0],))
+    app.SCHEDULER.load()
+    app.SCHEDULER.tick()
+    app.SCHEDULER.sync()
+    total, fine = app.ParkingEngine.bill(rids[0])
+    assert app.ParkingEngine.pay_upi(rids[0], total, fine)
+    assert app.ParkingEngine.request_cash(rids[1], *app.ParkingEngine.bill(rids[1]))
+    assert app.ParkingEngine.collect_cash(rids[1])
+    app.GateIngest.commit([(1, "G1", "entry", "HR26DK0002", ), (2, "G1", "exit", "HR26DK0003"), (3, "G1", "ping", None)])
+    app.Archiver.run()
+    app.OCCUPANCY.reconcile()
+    app.Analytics.report(7)
+    watcher = app.ChangeWatcher()
+    watcher.poll()
+    watcher.close()
+    asyncio.run(api_session(app))
+
+
+async def api_session(app):
+    server = app.ApiServer()
+    port = await server.start(port=0)
+    try:
+        student, staff = app.ApiClient(port), app.ApiClient(port)
+        assert (await student.login("stu1", "pw"))[0] == 200
+        assert (await staff.login("staff1", "pw"))[0] == 200
+        status, booked = await student.request("POST", "/bookings/best", {"vehicle": "HR26DK9999", "hours": 1})
+        assert status == 201
+        assert (await student.request("GET", f"/bookings/{booked['id']}/bill"))[0] == 200
+        assert (await student.request("POST", f"/bookings/{booked['id']}/pay", {"method": "cash"}))[0] == 200
+        _, page = await student.request("GET", "/bookings")
+        await student.request("GET", "/bookings?cursor=" + "%d:%d" % (page["bookings"][-1]["start_ts"], page["bookings"][-1]["id"]))
+        await staff.request("GET", "/cash-pending")
+        _, page = await staff.request("GET", "/patrol")
+        await staff.request("GET", "/patrol?cursor=%d:%d" % (2 ** 40, page["active"][-1]["id"]))
+        assert (await staff.request("POST", f"/cash-pending/{booked['id']}/collect"))[0] == 200
+        await student.logout()
+        for c in (student, staff): await c.close()
+    finally:
+        await server.close()
+
+
+def full_scans(conn, sql, partial):
+    checked = HOT if any(k in sql for k in WHOLE_TABLE) else HOT + SMALL
+    aliases = {}
+    for table, alias in ALIAS.findall(sql): aliases[alias or table] = aliases[table] = table
+    bad = []
+    for *_, detail in conn.execute("EXPLAIN QUERY PLAN " + sql):
+        m = re.match(r"SCAN (\w+)(?: USING (?:COVERING )?INDEX (\w+))?", detail)
+        if not m or aliases.get(m.group(1), m.group(1)) not in checked: continue
+        if m.group(2) in partial: continue
+        bad.append(detail)
+    return bad
+
+
+def test_no_full_table_scans(app, db, traced, tmp_path):
+    workload(app, tmp_path)
+    seen = {}
+    for sql in traced:
+        if sql.lstrip().split(None, 1)[0].upper() in ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH"):
+            seen.setdefault(re.sub(r"\b\d+\b|'[^']*'", "?", sql), sql)
+    assert len(seen) > 30
+    conn = sqlite3.connect(db)
+    partial = {name for name, ddl in conn.execute("SELECT name, sql FROM sqlite_master WHERE type='index' AND sql IS NOT NULL")
+               if " WHERE " in ddl.upper()}
+    problems = {sql: bad for sql in seen.values() for bad in [full_scans(conn, sql, partial)] if bad}
+    conn.close()
+    assert not problems, "\n\n".join(f"{sql}\n  -> {bad}" for sql, bad in problems.items())
@@ -0,0 +1,72 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+DELAY = 0.05  # s added to every SQL statement
+LOCK_S = 1.0  # another kiosk holds the write lock this long
+
+
+@pytest.fixture
+def slow_db(app, db, monkeypatch):
+    # Latency injected into SQLite itself: every statement on every connection opened from here on sleeps first.
+    connect = sqlite3.connect
+
+    def slow(*args, **kwargs):
+        conn = connect(*args, **kwargs)
+        conn.set_trace_callback(lambda sql: time.sleep(DELAY))
+        return conn
+
+    app.Database.close()
+    monkeypatch.setattr(sqlite3, "connect", slow)
+    yield
+
+
+def frames(kiosk, done, timeout=30):
+    # The Tk main loop in real time: pump timers every PUMP_MS until done() holds.
+    deadline = time.monotonic() + timeout
+    while not done():
+        assert time.monotonic() < deadline, "background work never delivered"
+        kiosk.run(kiosk.PUMP_MS)
+        time.sleep(kiosk.PUMP_MS / 1000)
+
+
+def test_main_loop_stays_within_frame_budget(app, slow_db, kiosk, db):
+    uid = app.Accounts.register("stu", "pw", "Stu", "s@x.in", "9", "Student", 1)
+    t = time.perf_counter()
+    app.Accounts.login("stu", "pw")
+    assert time.perf_counter() - t >= DELAY  # the same call on the Tk thread would have frozen it
+
+    # Another kiosk sits on the write lock, so bookings and payments wait on busy_timeout as well.
+    other = sqlite3.connect(db, isolation_level=None, check_same_thread=False)
+    other.execute("BEGIN IMMEDIATE")
+    threading.Timer(LOCK_S, other.execute, ("COMMIT",)).start()
+
+    # What do_login, book, show_history, show_admin_patrol and the payment dialog hand to run_bg.
+    got = {}
+    history = app.KeysetPager("r.id, r.vehicle_number, ps.block, ps.slot_number", "FROM {table} r JOIN parking_slots ps ON r.slot_id = ps.id",
+                              "r.user_id=?", (uid,), tables=("reservations", "reservations_archive"))
+    patrol = app.KeysetPager("r.id, r.vehicle_number", "FROM reservations r JOIN users u ON r.user_id=u.id", "r.status='active'", key="r.end_ts", desc=False)
+    kiosk.run_bg(app.Accounts.login, "stu", "pw", on_done=lambda user: got.update(login=user))
+    kiosk.run_bg(app.ParkingEngine.book_best, uid, "Student", 0, "Car", "HR26DK0001", 1, on_done=lambda r: got.update(book=r))
+    kiosk.run_bg(history.next_page, on_done=lambda rows: got.update(history=rows))
+    kiosk.run_bg(patrol.next_page, on_done=lambda rows: got.update(patrol=rows))
+    started = time.perf_counter()
+    frames(kiosk, lambda: len(got) == 4)
+    assert time.perf_counter() - started >= LOCK_S  # the booking really did wait for the lock
+    assert got["login"][0] == uid and got["book"][0]
+
+    # The user navigates away while a payment and a history page are in flight: the page belonged to the old view
+    # and is dropped, but the payment dialog (show_payment runs it with keep=True) still gets its result.
+    rid = got["book"][0]
+    page = kiosk.run_bg(history.next_page, on_done=lambda rows: got.update(stale=rows))
+    fut = kiosk.run_bg(app.ParkingEngine.pay_upi, rid, 20.0, 0, on_done=lambda ok: got.update(paid=ok), keep=True)
+    kiosk.clear()
+    assert not fut.cancelled()
+    frames(kiosk, lambda: "paid" in got and page.done())
+    kiosk.run(kiosk.PUMP_MS)
+    assert got["paid"] is True and "stale" not in got
+
+    other.close()
+    assert kiosk.slowest < kiosk.FRAME_BUDGET + 0.02, f"main loop blocked for {kiosk.slowest * 1000:.0f} ms"